@@ -2,11 +2,17 @@ import streamlit as st
 from datetime import datetime
 import json
 import logging
-from typing import Optional, Tuple
-from config import APP_NAME, APP_TAGLINE, MODES, AVATAR_STYLES
+from typing import Any, Dict, Optional, Tuple, List
+from config import APP_NAME, APP_TAGLINE, MODES, AVATAR_STYLES, RESPONSE_CACHE_ENABLED, SEMANTIC_CACHE_ENABLED
 from database import NuvexaDB
 from assistant import NuvexaAssistant
+from cache import ResponseCache
+from history import estimate_tokens, get_history_token_budget, select_history
+from semantic_cache import SemanticCache
+from summarizer import ConversationSummarizer, build_summarized_history, mode_uses_summary
 from shopping import ShoppingEngine
+from shopping_tools import ShoppingTools
+from speculative import interleave
 
 logger = logging.getLogger(__name__)
 
@@ -70,11 +76,34 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_semantic_cache() -> SemanticCache:
+    """Semantic cache shared by all sessions in this server process."""
+    return SemanticCache()
+
+@st.cache_resource
+def get_summarizer() -> ConversationSummarizer:
+    """Background conversation summarizer shared by all sessions in this server process."""
+    return ConversationSummarizer(NuvexaDB(), NuvexaAssistant())
+
+@st.cache_resource
+def prewarm_llm_connection() -> bool:
+    """Open the process-wide LLM connection once, ahead of the first session's first message."""
+    NuvexaAssistant().prewarm()
+    return True
+
+prewarm_llm_connection()
+
 # Initialize session state
 if 'db' not in st.session_state:
     st.session_state.db = NuvexaDB()
     st.session_state.user_id = st.session_state.db.get_or_create_user("User")
-    st.session_state.ai_assistant = NuvexaAssistant()
+    # A light per-session view; the LLM client and its connections are shared process-wide
+    st.session_state.ai_assistant = NuvexaAssistant(
+        response_cache=ResponseCache(st.session_state.db) if RESPONSE_CACHE_ENABLED else None,
+        semantic_cache=get_semantic_cache() if SEMANTIC_CACHE_ENABLED else None,
+        user_id=st.session_state.user_id
+    )
     st.session_state.shopping_engine = ShoppingEngine()
     st.session_state.current_mode = 'assistant'
     st.session_state.messages = []
@@ -93,16 +122,33 @@ if 'db' not in st.session_state:
             st.info("💡 Make sure your .env file contains: `OPENAI_API_KEY=sk-your-key-here`")
 
 def load_conversation_history():
-    """Load conversation history from database."""
-    history = st.session_state.db.get_conversation_history(
+    """Load the conversation window that fits the mode's token budget from database."""
+    history = st.session_state.db.get_conversation_window(
         st.session_state.user_id, 
-        st.session_state.current_mode
+        st.session_state.current_mode,
+        get_history_token_budget(st.session_state.current_mode)
     )
     st.session_state.messages = [
-        {"role": role, "content": content} 
-        for role, content in history
+        {"role": role, "content": content, "tokens": tokens} 
+        for role, content, tokens in history
     ]
 
+def append_message(role: str, content: str):
+    """Add a message to the session, caching its token count."""
+    st.session_state.messages.append({"role": role, "content": content, "tokens": estimate_tokens(content)})
+
+def build_conversation_history() -> List[Tuple[str, str]]:
+    """Build history for the next prompt within the mode's token budget."""
+    mode = st.session_state.current_mode
+    budget = get_history_token_budget(mode)
+    if mode_uses_summary(mode):
+        # Rolling summary plus the turns it does not cover yet
+        return build_summarized_history(st.session_state.db, st.session_state.user_id, mode, budget)
+    return select_history(
+        [(msg["role"], msg["content"], msg.get("tokens")) for msg in st.session_state.messages],
+        budget
+    )
+
 def save_message(role: str, content: str):
     """Save message to database."""
     st.session_state.db.save_message(
@@ -134,24 +180,18 @@ def add_to_cart(product: dict):
     else:
         st.error("❌ Failed to add item to cart. Please try again.")
 
-def get_cart_total() -> float:
-    """Calculate total cart value."""
-    items = st.session_state.db.get_cart_items(st.session_state.user_id)
-    return sum(item[2] * item[5] for item in items)
-
-def get_cart_item_count() -> int:
-    """Get total number of items in cart."""
-    items = st.session_state.db.get_cart_items(st.session_state.user_id)
-    return sum(item[5] for item in items)
+def get_cart_summary() -> Dict[str, Any]:
+    """Get the cart's items, item count and total in one query."""
+    return st.session_state.db.get_cart_summary(st.session_state.user_id)
 
 def checkout() -> Tuple[Optional[int], float]:
     """Process checkout."""
-    items = st.session_state.db.get_cart_items(st.session_state.user_id)
-    if items:
-        total = get_cart_total()
+    cart = get_cart_summary()
+    if cart['items']:
+        total = cart['total']
         order_items = [
             {"name": item[1], "price": item[2], "qty": item[5]} 
-            for item in items
+            for item in cart['items']
         ]
         order_id = st.session_state.db.create_order(
             st.session_state.user_id, 
@@ -163,6 +203,29 @@ def checkout() -> Tuple[Optional[int], float]:
             return order_id, total
     return None, 0
 
+def render_products(products: List[dict], with_add_buttons: bool = True):
+    """Render the products panel."""
+    st.subheader("🛍️ Products")
+    st.caption(f"Found {len(products)} result(s)")
+    
+    for idx, product in enumerate(products):
+        with st.container():
+            st.markdown(f"### {product.get('image', '📦')} {product['name']}")
+            st.write(f"{product.get('description', 'No description available')}")
+            
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.write(f"**${product['price']:.2f}**")
+                st.caption(f"{product.get('rating', 0)} ⭐ | {product.get('source', 'Unknown')}")
+            if with_add_buttons:
+                with col2:
+                    if st.button("➕ Add", key=f"add_{idx}", use_container_width=True):
+                        add_to_cart(product)
+                        st.rerun()
+            
+            if idx < len(products) - 1:
+                st.divider()
+
 # Main header
 st.markdown(f'<h1 class="main-header">{APP_NAME}</h1>', unsafe_allow_html=True)
 st.caption(f"*{APP_TAGLINE}*")
@@ -210,12 +273,12 @@ with st.sidebar:
     st.divider()
     
     # Cart section
-    cart_items = st.session_state.db.get_cart_items(st.session_state.user_id)
-    cart_count = get_cart_item_count()
-    st.subheader(f"🛒 Cart ({cart_count} items)")
+    cart = get_cart_summary()
+    cart_items = cart['items']
+    st.subheader(f"🛒 Cart ({cart['item_count']} items)")
     
     if cart_items:
-        st.metric("Total", f"${get_cart_total():.2f}")
+        st.metric("Total", f"${cart['total']:.2f}")
         
         # Expandable cart view
         with st.expander("View Cart", expanded=st.session_state.cart_open):
@@ -301,42 +364,64 @@ with col1:
     prompt = st.chat_input("Message NUVEXA...")
     
     if prompt:
+        # Newest turns that fit the mode's token budget, not the whole session
+        conversation_history = build_conversation_history()
+        
         # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        append_message("user", prompt)
         save_message("user", prompt)
         
-        # Check for shopping intent in shopping mode
-        if (st.session_state.current_mode == 'shopping' and 
-            st.session_state.ai_assistant.analyze_shopping_intent(prompt)):
-            product_query = st.session_state.ai_assistant.extract_product_query(prompt)
-            st.session_state.search_results = st.session_state.shopping_engine.search_products(product_query)
-            st.session_state.show_products = True
+        # In shopping mode the model searches the catalog and manages the cart through tools
+        shopping_tools = None
+        if st.session_state.current_mode == 'shopping':
+            shopping_tools = ShoppingTools(st.session_state.shopping_engine, st.session_state.db, st.session_state.user_id)
+            reply_stream = st.session_state.ai_assistant.chat_stream_with_tools(prompt, conversation_history, shopping_tools)
+            
+            # Search speculatively while the model works; the model's own search reuses it
+            is_shopping, product_query = st.session_state.ai_assistant.analyze_shopping_query(prompt)
+            if is_shopping:
+                products_placeholder = col2.empty()
+                
+                def show_products(products: List[dict]):
+                    """Show the speculative results as soon as they are ready."""
+                    st.session_state.search_results = products
+                    st.session_state.show_products = bool(products)
+                    if products:
+                        with products_placeholder.container():
+                            # Add buttons appear once the answer is done and the page reruns
+                            render_products(products, with_add_buttons=False)
+                
+                reply_stream = interleave(reply_stream, {shopping_tools.prefetch(product_query): show_products})
+        else:
+            reply_stream = st.session_state.ai_assistant.chat_stream(prompt, conversation_history)
         
-        # Get AI response - this will be displayed on next rerun
-        conversation_history = [
-            (msg["role"], msg["content"]) 
-            for msg in st.session_state.messages[:-1]
-        ]
+        # Show the user message right away; the answer streams in below it
+        with st.chat_message("user"):
+            st.write(prompt)
         
-        # Show spinner and get response
-        with st.spinner("🤔 NUVEXA is thinking..."):
+        # Stream the response token by token
+        with st.chat_message("assistant"):
             try:
-                response = st.session_state.ai_assistant.chat(prompt, conversation_history)
+                response = st.write_stream(reply_stream)
+                
+                if shopping_tools and shopping_tools.search_results:
+                    st.session_state.search_results = shopping_tools.search_results
+                    st.session_state.show_products = True
                 
-                if not response:
+                if not response or not isinstance(response, str):
                     response = "Error: No response received. Please check your API key in .env file."
-                elif response.startswith("Error:"):
-                    # Keep error message as-is but ensure it's added to chat
-                    pass
                 
                 # Always add response to messages (even errors) so user sees what happened
-                st.session_state.messages.append({"role": "assistant", "content": response})
+                append_message("assistant", response)
                 save_message("assistant", response)
                 
+                # Fold older turns into the summary off the request path
+                get_summarizer().schedule(st.session_state.user_id, st.session_state.current_mode)
+                
             except Exception as e:
                 # Catch any unexpected errors during the API call
                 error_msg = f"Error: {str(e)}. Please check your API key in .env file and ensure it's valid."
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                append_message("assistant", error_msg)
                 save_message("assistant", error_msg)
                 logger.error(f"Unexpected error in chat: {str(e)}")
         
@@ -345,25 +430,7 @@ with col1:
 
 with col2:
     if st.session_state.show_products and st.session_state.search_results:
-        st.subheader("🛍️ Products")
-        st.caption(f"Found {len(st.session_state.search_results)} result(s)")
-        
-        for idx, product in enumerate(st.session_state.search_results):
-            with st.container():
-                st.markdown(f"### {product.get('image', '📦')} {product['name']}")
-                st.write(f"{product.get('description', 'No description available')}")
-                
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    st.write(f"**${product['price']:.2f}**")
-                    st.caption(f"{product.get('rating', 0)} ⭐ | {product.get('source', 'Unknown')}")
-                with col2:
-                    if st.button("➕ Add", key=f"add_{idx}", use_container_width=True):
-                        add_to_cart(product)
-                        st.rerun()
-                
-                if idx < len(st.session_state.search_results) - 1:
-                    st.divider()
+        render_products(st.session_state.search_results)
     else:
         st.subheader("💡 Tips")
         mode_tips = {
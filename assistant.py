@@ -1,16 +1,47 @@
-from openai import OpenAI
-from typing import Optional, List, Tuple
-from config import OPENAI_API_KEY, MODES
+from typing import Optional, List, Tuple, Dict, Any, Iterator
+from config import OPENAI_API_KEY, MODES, SUMMARY_MAX_TOKENS, SHOPPING_TOOL_ROUNDS, HEDGING_ENABLED
+from cache import ResponseCache, make_cache_key
+from semantic_cache import SemanticCache
+from model_health import model_health
+from rate_limiter import rate_limiter
+from single_flight import single_flight
+from history import estimate_tokens
+from hedging import hedged_stream
+from llm_backend import LLMBackend, default_backend, shared_clients
+from routing import RoutingProfile, routing_table
+from query_understanding import analyze_query
+from shopping_tools import ShoppingTools, TOOL_DEFINITIONS, TOOLS_SYSTEM_PROMPT
+from usage import CompletionTracker, ERROR, OK
 import logging
+import time
+import openai
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# History entries with this role carry a rolling summary of earlier turns
+SUMMARY_ROLE = "summary"
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a user and NUVEXA. "
+    "Keep facts, decisions, preferences, open questions and emotional context the "
+    "assistant needs to continue naturally. Be concise and write in the third person."
+)
+
 class NuvexaAssistant:
-    """AI Assistant with multiple operational modes."""
+    """AI Assistant with multiple operational modes.
+    
+    Assistants are cheap per-session views: the LLM client and its connection
+    pool are shared by every assistant in the process.
+    """
     
-    def __init__(self, api_key: Optional[str] = None):
-        """Initialize the assistant with OpenAI API key."""
+    def __init__(self, api_key: Optional[str] = None, response_cache: Optional[ResponseCache] = None,
+                 semantic_cache: Optional[SemanticCache] = None, backend: Optional[LLMBackend] = None,
+                 user_id: Optional[int] = None):
+        """Initialize the assistant with OpenAI API key, LLM backend and optional response caches."""
+        self.backend = backend or default_backend()
+        # Usage is accounted to this user
+        self.user_id = user_id
+        
         # Get API key from parameter or config
         raw_key = api_key or OPENAI_API_KEY
         
@@ -21,19 +52,32 @@ class NuvexaAssistant:
             self.api_key = None
         
         # Check if key is valid
-        if not self.api_key or self.api_key == 'your-openai-api-key-here' or len(self.api_key) < 10:
+        if self.backend.requires_api_key and (not self.api_key or self.api_key == 'your-openai-api-key-here' or len(self.api_key) < 10):
             logger.warning(f"OpenAI API key not configured properly. Key length: {len(self.api_key) if self.api_key else 0}")
             logger.warning(f"Key value (first 20 chars): {self.api_key[:20] if self.api_key else 'None'}")
             self.client = None
         else:
             try:
-                # Initialize client - this doesn't make an API call, just creates the client object
-                self.client = OpenAI(api_key=self.api_key)
-                logger.info(f"OpenAI client initialized successfully. Key starts with: {self.api_key[:10]}...")
+                # Reuses the process-wide client; creating it doesn't make an API call
+                self.client = self._create_client()
+                if self.backend.requires_api_key:
+                    logger.info(f"OpenAI client initialized successfully. Key starts with: {self.api_key[:10]}...")
             except Exception as e:
                 logger.error(f"Failed to initialize OpenAI client: {str(e)}")
                 self.client = None
         self.current_mode = 'assistant'
+        self.response_cache = response_cache
+        self.semantic_cache = semantic_cache
+        self.hedging = HEDGING_ENABLED
+    
+    def _create_client(self) -> Any:
+        """Get the shared client used for completions."""
+        return shared_clients.get(self.backend, self.api_key)
+    
+    def prewarm(self) -> None:
+        """Open the client's connection in the background, ahead of the first message."""
+        if self.client:
+            shared_clients.prewarm(self.client)
     
     def set_mode(self, mode: str) -> bool:
         """Set the current operational mode."""
@@ -48,6 +92,186 @@ class NuvexaAssistant:
         """Get the system prompt for the current mode."""
         return MODES[self.current_mode]['system_prompt']
     
+    def _build_messages(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> List[Dict[str, str]]:
+        """Build the chat messages list for the current mode."""
+        messages = [{"role": "system", "content": self.get_system_prompt()}]
+        
+        if conversation_history:
+            for role, content in conversation_history:
+                if role in ["user", "assistant"] and content:
+                    messages.append({"role": role, "content": content})
+                elif role == SUMMARY_ROLE and content:
+                    messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{content}"})
+        
+        messages.append({"role": "user", "content": user_message.strip()})
+        return messages
+    
+    def get_routing_profile(self) -> RoutingProfile:
+        """Get the models and generation settings of the current mode."""
+        return routing_table.profile(self.current_mode)
+    
+    def build_request_body(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> Dict[str, Any]:
+        """Build the /v1/chat/completions request body chat() would send first."""
+        profile = self.get_routing_profile()
+        return {
+            "model": profile.models[0],
+            "messages": self._build_messages(user_message, conversation_history),
+            "temperature": profile.temperature,
+            "max_tokens": profile.max_tokens
+        }
+    
+    def _request_key(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Key identifying a chat request, for the response cache and request coalescing."""
+        profile = self.get_routing_profile()
+        return make_cache_key(
+            profile.models[0], self.current_mode, user_message,
+            conversation_history, profile.temperature
+        )
+    
+    def _uses_semantic_cache(self, conversation_history: Optional[List[Tuple[str, str]]] = None) -> bool:
+        """Check if the semantic cache applies to the current mode and conversation."""
+        # Follow-ups ("why?", "cheaper ones?") only make sense with their history
+        return bool(self.semantic_cache) and MODES[self.current_mode].get('stateless', False) and not conversation_history
+    
+    def _get_cached_response(self, request_key: str, user_message: str,
+                             conversation_history: Optional[List[Tuple[str, str]]] = None) -> Optional[str]:
+        """Look up an exact, then a near-duplicate cached response."""
+        if self.response_cache:
+            cached = self.response_cache.get(request_key)
+            if cached is not None:
+                return cached
+        if self._uses_semantic_cache(conversation_history):
+            return self.semantic_cache.get(self.current_mode, user_message)
+        return None
+    
+    def _store_response(self, request_key: str, user_message: str, model: str, content: str,
+                        conversation_history: Optional[List[Tuple[str, str]]] = None) -> None:
+        """Store a successful response in the configured caches."""
+        if self.response_cache:
+            self.response_cache.put(request_key, self.current_mode, model, content)
+        if self._uses_semantic_cache(conversation_history):
+            self.semantic_cache.put(self.current_mode, user_message, content)
+    
+    @staticmethod
+    def _is_model_error(error: Exception) -> bool:
+        """Check if an error is model-specific, so the next model may be tried."""
+        error_str = str(error).lower()
+        return "model" in error_str or "not found" in error_str or "does not exist" in error_str
+    
+    @staticmethod
+    def _is_model_unavailable(error: Exception) -> bool:
+        """Check if an error says the model itself can't be used, which counts towards its circuit breaker.
+        
+        Bad requests that merely mention the model, such as exceeding its
+        context length, come from the caller and don't count. Errors replayed
+        from a cassette are classified by their recorded status and code.
+        """
+        if isinstance(error, openai.BadRequestError) or getattr(error, 'status_code', None) == 400:
+            return False
+        if isinstance(error, (openai.NotFoundError, openai.PermissionDeniedError)):
+            return True
+        return getattr(error, 'status_code', None) in (403, 404) or getattr(error, 'code', None) == 'model_not_found'
+    
+    def _record_error(self, model: str, error: Exception) -> None:
+        """Record a failed request in the model's health stats."""
+        if self._is_model_unavailable(error):
+            model_health.record_model_error(model, error)
+        else:
+            model_health.record_other_error(model, error)
+    
+    def _uses_hedging(self, profile: RoutingProfile) -> bool:
+        """Check if requests with this profile are hedged to the next model when the first token is late."""
+        return self.hedging and profile.hedge_after is not None and len(profile.models) > 1
+    
+    def _create_completion(self, messages: List[Dict[str, Any]], stream: bool = False,
+                           profile: Optional[RoutingProfile] = None, **request_options: Any) -> Any:
+        """Create a completion, trying the profile's models in order of preference.
+        
+        Streams are hedged to the next model when the profile sets a first
+        token deadline. Extra request options, such as tools, are passed
+        through to the API.
+        """
+        profile = profile or self.get_routing_profile()
+        last_error = None
+        # Prompt plus the output cap is what counts against the TPM budget
+        estimated_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages) + profile.max_tokens
+        if stream:
+            # The last chunk then carries token usage
+            request_options.setdefault("stream_options", {"include_usage": True})
+        
+        # Models with an open circuit breaker are skipped without a round-trip
+        models = model_health.iter_models(list(profile.models))
+        if stream and self._uses_hedging(profile):
+            return hedged_stream(
+                lambda model: self._send_completion(model, messages, stream, profile, estimated_tokens, request_options),
+                models, profile.hedge_after, self._is_model_error, self.current_mode
+            )
+        
+        for model in models:
+            try:
+                return self._send_completion(model, messages, stream, profile, estimated_tokens, request_options)
+            except Exception as e:
+                last_error = e
+                # Only try next model if it's a model-specific error
+                if not self._is_model_error(e):
+                    # This is likely an auth/quota issue, don't try other models
+                    raise
+                logger.warning(f"Model {model} failed: {str(e)}, trying next...")
+                continue
+        
+        if last_error:
+            raise last_error
+        raise Exception("No models available")
+    
+    def _send_completion(self, model: str, messages: List[Dict[str, Any]], stream: bool, profile: RoutingProfile,
+                         estimated_tokens: int, request_options: Dict[str, Any]) -> Any:
+        """Send a completion request to one model, recording its health and usage."""
+        start = time.monotonic()
+        tracker = CompletionTracker(self.user_id, self.current_mode, model, estimated_tokens - profile.max_tokens)
+        try:
+            # Queues near the RPM/TPM budget and retries 429/5xx with backoff
+            response = rate_limiter.call(model, estimated_tokens, lambda: self.client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=messages,
+                temperature=profile.temperature,
+                max_tokens=profile.max_tokens,
+                stream=stream,
+                timeout=profile.timeout,
+                **request_options
+            ))
+        except Exception as e:
+            tracker.finish(ERROR)
+            self._record_error(model, e)
+            raise
+        model_health.record_success(model, time.monotonic() - start)
+        logger.info(f"Successfully used model: {model}")
+        if stream:
+            return tracker.track(response)
+        tracker.finish(OK, getattr(response, 'usage', None))
+        return response
+    
+    @staticmethod
+    def _format_error(error: Exception) -> str:
+        """Map an API exception to a user-facing error message."""
+        error_str = str(error)
+        error_msg = error_str.lower()
+        
+        # Show the actual error message from OpenAI for debugging
+        full_error = f"Error: {error_str}"
+        
+        # More specific error messages
+        if "api key" in error_msg or "authentication" in error_msg or "invalid_api_key" in error_msg or "incorrect api key" in error_msg:
+            return f"{full_error}\n\nYour API key format looks correct, but OpenAI rejected it. Please:\n1. Check if the key is still valid at https://platform.openai.com/api-keys\n2. Make sure there are no extra spaces in your .env file\n3. Try generating a new API key if this one was revoked"
+        elif "rate limit" in error_msg or "rate_limit_exceeded" in error_msg:
+            return "Error: Rate limit exceeded. Please wait a moment and try again."
+        elif "insufficient_quota" in error_msg or "quota" in error_msg or "billing" in error_msg:
+            return "Error: Insufficient API quota or billing issue. Please check your OpenAI account billing at https://platform.openai.com/account/billing"
+        elif "connection" in error_msg or "timeout" in error_msg or "network" in error_msg:
+            return f"Error: Connection issue. Please check your internet connection and try again.\n\nDetails: {error_str[:200]}"
+        else:
+            # Return the full error for debugging
+            return f"{full_error}\n\nIf this persists, check:\n- Your API key is valid at https://platform.openai.com/api-keys\n- You have available credits/quota\n- Your internet connection is working"
+    
     def chat(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> str:
         """Generate a chat response using OpenAI API."""
         if not self.client:
@@ -57,103 +281,218 @@ class NuvexaAssistant:
             return "Please provide a message."
         
         try:
-            messages = [{"role": "system", "content": self.get_system_prompt()}]
-            
-            if conversation_history:
-                for role, content in conversation_history:
-                    if role in ["user", "assistant"] and content:
-                        messages.append({"role": role, "content": content})
-            
-            messages.append({"role": "user", "content": user_message.strip()})
+            request_key = self._request_key(user_message, conversation_history)
+            # Identical concurrent requests share one upstream call
+            return single_flight.do(
+                request_key, lambda: self._generate(request_key, user_message, conversation_history)
+            )
+        except Exception as e:
+            logger.error(f"Chat error: {str(e)}")
+            return self._format_error(e)
+    
+    def _generate(self, request_key: str, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Produce a response from cache or the API, raising on API errors."""
+        cached = self._get_cached_response(request_key, user_message, conversation_history)
+        if cached is not None:
+            return cached
+        
+        messages = self._build_messages(user_message, conversation_history)
+        profile = self.get_routing_profile()
+        if self._uses_hedging(profile):
+            # The first token decides a hedged race, so the response is streamed and joined
+            parts = []
+            model = None
+            for chunk in self._create_completion(messages, stream=True, profile=profile):
+                model = model or getattr(chunk, 'model', None)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+            if not parts:
+                return "Error: Empty response from API. Please try again."
+            content = "".join(parts)
+            self._store_response(request_key, user_message, model or profile.models[0], content, conversation_history)
+            return content
+        
+        response = self._create_completion(messages, profile=profile)
+        
+        content = response.choices[0].message.content if response and response.choices else None
+        if not content:
+            return "Error: Empty response from API. Please try again."
+        self._store_response(request_key, user_message, response.model, content, conversation_history)
+        return content
+    
+    def chat_stream(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> Iterator[str]:
+        """Generate a chat response as a stream of text deltas."""
+        if not self.client:
+            yield "Error: OpenAI API key not configured. Please check your .env file."
+            return
+        
+        if not user_message or not user_message.strip():
+            yield "Please provide a message."
+            return
+        
+        request_key = self._request_key(user_message, conversation_history)
+        is_leader, call = single_flight.begin(request_key)
+        if not is_leader:
+            # An identical request is already streaming; share its final answer
+            try:
+                yield call.wait()
+            except Exception as e:
+                yield self._format_error(e)
+            return
+        
+        received = False
+        result = None
+        error = None
+        try:
+            cached = self._get_cached_response(request_key, user_message, conversation_history)
+            if cached is not None:
+                result = cached
+                yield cached
+                return
             
-            # Try models in order of preference
-            models = ["gpt-4o", "gpt-4", "gpt-3.5-turbo"]
-            response = None
-            last_error = None
+            messages = self._build_messages(user_message, conversation_history)
+            # Model errors surface when the stream is opened, so fallback still applies
+            stream = self._create_completion(messages, stream=True)
             
-            for model in models:
-                try:
-                    response = self.client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        temperature=0.7,
-                        max_tokens=800
-                    )
-                    logger.info(f"Successfully used model: {model}")
-                    break
-                except Exception as e:
-                    last_error = e
-                    error_str = str(e).lower()
-                    # Only try next model if it's a model-specific error
-                    if "model" not in error_str and "not found" not in error_str and "does not exist" not in error_str:
-                        # This is likely an auth/quota issue, don't try other models
-                        raise
-                    logger.warning(f"Model {model} failed: {str(e)}, trying next...")
+            parts = []
+            model = None
+            for chunk in stream:
+                model = model or getattr(chunk, 'model', None)
+                if not chunk.choices:
                     continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    received = True
+                    parts.append(delta)
+                    yield delta
             
-            if not response:
-                if last_error:
-                    raise last_error
-                else:
-                    raise Exception("No models available")
-            
-            if response and response.choices and len(response.choices) > 0:
-                return response.choices[0].message.content
+            if not received:
+                result = "Error: Empty response from API. Please try again."
+                yield result
             else:
-                return "Error: Empty response from API. Please try again."
+                result = "".join(parts)
+                # Only complete streams are cached
+                self._store_response(request_key, user_message, model or self.get_routing_profile().models[0], result,
+                                     conversation_history)
                 
         except Exception as e:
-            logger.error(f"Chat error: {str(e)}")
-            error_str = str(e)
-            error_msg = error_str.lower()
-            
-            # Show the actual error message from OpenAI for debugging
-            full_error = f"Error: {error_str}"
+            error = e
+            logger.error(f"Chat stream error: {str(e)}")
+            # Keep any partial answer readable before the error text
+            yield ("\n\n" if received else "") + self._format_error(e)
+        finally:
+            if result is None and error is None:
+                # The consumer stopped reading before the stream finished
+                error = Exception("Request was cancelled before completing")
+            single_flight.finish(request_key, call, result=result, error=error)
+    
+    def chat_stream_with_tools(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]],
+                               tools: ShoppingTools) -> Iterator[str]:
+        """Generate a response that can search products and manage the cart, streaming its text.
+        
+        Each round streams the model's text and collects its tool calls; the
+        calls run (independent ones concurrently) and their results go back to
+        the model, until it answers without calling tools. Answers given without
+        calling tools are cached like chat_stream's; tool-grounded ones depend
+        on the catalog and cart, so they aren't.
+        """
+        if not self.client:
+            yield "Error: OpenAI API key not configured. Please check your .env file."
+            return
+        
+        if not user_message or not user_message.strip():
+            yield "Please provide a message."
+            return
+        
+        received = False
+        try:
+            request_key = self._request_key(user_message, conversation_history)
+            cached = self._get_cached_response(request_key, user_message, conversation_history)
+            if cached is not None:
+                yield cached
+                return
             
-            # More specific error messages
-            if "api key" in error_msg or "authentication" in error_msg or "invalid_api_key" in error_msg or "incorrect api key" in error_msg:
-                return f"{full_error}\n\nYour API key format looks correct, but OpenAI rejected it. Please:\n1. Check if the key is still valid at https://platform.openai.com/api-keys\n2. Make sure there are no extra spaces in your .env file\n3. Try generating a new API key if this one was revoked"
-            elif "rate limit" in error_msg or "rate_limit_exceeded" in error_msg:
-                return "Error: Rate limit exceeded. Please wait a moment and try again."
-            elif "insufficient_quota" in error_msg or "quota" in error_msg or "billing" in error_msg:
-                return "Error: Insufficient API quota or billing issue. Please check your OpenAI account billing at https://platform.openai.com/account/billing"
-            elif "connection" in error_msg or "timeout" in error_msg or "network" in error_msg:
-                return f"Error: Connection issue. Please check your internet connection and try again.\n\nDetails: {error_str[:200]}"
-            else:
-                # Return the full error for debugging
-                return f"{full_error}\n\nIf this persists, check:\n- Your API key is valid at https://platform.openai.com/api-keys\n- You have available credits/quota\n- Your internet connection is working"
+            messages: List[Dict[str, Any]] = self._build_messages(user_message, conversation_history)
+            messages.insert(1, {"role": "system", "content": TOOLS_SYSTEM_PROMPT})
+            for round_number in range(SHOPPING_TOOL_ROUNDS + 1):
+                # The last round has to answer with what the tools returned
+                tool_choice = "auto" if round_number < SHOPPING_TOOL_ROUNDS else "none"
+                stream = self._create_completion(messages, stream=True, tools=TOOL_DEFINITIONS, tool_choice=tool_choice)
+                
+                calls: Dict[int, Dict[str, Any]] = {}
+                parts: List[str] = []
+                model = None
+                for chunk in stream:
+                    model = model or getattr(chunk, 'model', None)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.content:
+                        received = True
+                        parts.append(delta.content)
+                        yield delta.content
+                    for call in delta.tool_calls or ():
+                        # Tool calls arrive in fragments, keyed by their index
+                        tool_call = calls.setdefault(call.index, {"id": "", "type": "function",
+                                                                  "function": {"name": "", "arguments": ""}})
+                        tool_call["id"] = call.id or tool_call["id"]
+                        if call.function:
+                            tool_call["function"]["name"] += call.function.name or ""
+                            tool_call["function"]["arguments"] += call.function.arguments or ""
+                
+                if not calls:
+                    if not received:
+                        yield "Error: Empty response from API. Please try again."
+                    elif round_number == 0:
+                        self._store_response(request_key, user_message, model or self.get_routing_profile().models[0],
+                                             "".join(parts), conversation_history)
+                    return
+                
+                tool_calls = [calls[index] for index in sorted(calls)]
+                logger.info(f"Running tools: {', '.join(call['function']['name'] for call in tool_calls)}")
+                # Text streamed alongside the calls stays in the transcript, so the model doesn't repeat it
+                messages.append({"role": "assistant", "content": "".join(parts) or None, "tool_calls": tool_calls})
+                messages.extend(tools.run(tool_calls))
+                if received:
+                    # Keep text from before and after the tool calls apart
+                    yield "\n\n"
+        except Exception as e:
+            logger.error(f"Chat with tools error: {str(e)}")
+            yield ("\n\n" if received else "") + self._format_error(e)
     
-    def analyze_shopping_intent(self, message: str) -> bool:
-        """Analyze if the message contains shopping intent."""
-        if not message:
-            return False
+    def summarize_conversation(self, previous_summary: Optional[str], turns: List[Tuple[str, str]]) -> Optional[str]:
+        """Fold conversation turns into a running summary, or None if it fails."""
+        if not self.client or not turns:
+            return None
         
-        shopping_keywords = [
-            'buy', 'purchase', 'shop', 'find', 'look for', 'need', 'want', 
-            'get me', 'search for', 'looking for', 'shopping', 'order'
+        transcript = "\n".join(f"{role.capitalize()}: {content}" for role, content in turns)
+        prompt = (
+            f"Existing summary:\n{previous_summary or '(none)'}\n\n"
+            f"New conversation turns:\n{transcript}\n\n"
+            "Write an updated summary of the whole conversation so far."
+        )
+        messages = [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
         ]
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in shopping_keywords)
+        try:
+            profile = self.get_routing_profile()._replace(temperature=0.3, max_tokens=SUMMARY_MAX_TOKENS)
+            response = self._create_completion(messages, profile=profile)
+            if response and response.choices and response.choices[0].message.content:
+                return response.choices[0].message.content.strip()
+            return None
+        except Exception as e:
+            logger.error(f"Summarization error: {str(e)}")
+            return None
+    
+    def analyze_shopping_query(self, message: str) -> Tuple[bool, str]:
+        """Detect shopping intent and extract the product query in one pass."""
+        return analyze_query(message)
+    
+    def analyze_shopping_intent(self, message: str) -> bool:
+        """Analyze if the message contains shopping intent."""
+        return analyze_query(message)[0]
     
     def extract_product_query(self, message: str) -> str:
         """Extract product search query from user message."""
-        if not message:
-            return ""
-        
-        shopping_keywords = [
-            'buy', 'purchase', 'shop for', 'find', 'look for', 'need', 
-            'want', 'get me', 'search for', 'looking for'
-        ]
-        message_lower = message.lower()
-        
-        for keyword in shopping_keywords:
-            if keyword in message_lower:
-                parts = message_lower.split(keyword, 1)
-                if len(parts) > 1:
-                    query = parts[1].strip()
-                    # Clean up common words
-                    for word in ['some', 'a', 'an', 'the']:
-                        query = query.replace(word, '').strip()
-                    return query if query else message
-        
-        return message
+        return analyze_query(message)[1]
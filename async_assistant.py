@@ -0,0 +1,340 @@
+import asyncio
+import threading
+import time
+import weakref
+from typing import Optional, List, Tuple, Dict, Any, AsyncIterator, Iterator
+from config import LLM_MAX_CONCURRENCY
+from model_health import model_health
+from rate_limiter import rate_limiter
+from single_flight import AsyncSingleFlight
+from history import estimate_tokens
+from llm_backend import LLMBackend
+from routing import RoutingProfile
+from assistant import NuvexaAssistant
+from cache import ResponseCache
+from semantic_cache import SemanticCache
+from usage import CompletionTracker, CANCELLED, ERROR, OK
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Limit on in-flight LLM calls per event loop, shared by every async assistant on it
+_concurrency_limit = LLM_MAX_CONCURRENCY
+
+# asyncio primitives belong to the event loop that first uses them, so each running
+# loop gets its own semaphore and single-flight table; they go away with the loop
+_semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+_single_flights: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSingleFlight]' = weakref.WeakKeyDictionary()
+
+def configure_concurrency(limit: int) -> None:
+    """Set the maximum number of in-flight LLM calls per event loop."""
+    global _concurrency_limit
+    if limit < 1:
+        raise ValueError("Concurrency limit must be at least 1")
+    _concurrency_limit = limit
+    # Calls holding a slot of a replaced semaphore release it there
+    _semaphores.clear()
+    logger.info(f"Async engine concurrency limit set to: {limit}")
+
+def _semaphore() -> asyncio.Semaphore:
+    """Get the running loop's LLM call semaphore, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(_concurrency_limit)
+    return semaphore
+
+def _single_flight() -> AsyncSingleFlight:
+    """Get the running loop's table of coalesced in-flight requests, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    single_flight = _single_flights.get(loop)
+    if single_flight is None:
+        single_flight = _single_flights[loop] = AsyncSingleFlight()
+    return single_flight
+
+def _remaining(expires_at: float) -> float:
+    """Seconds left until a loop-time deadline."""
+    return max(0.0, expires_at - asyncio.get_running_loop().time())
+
+class AsyncNuvexaAssistant(NuvexaAssistant):
+    """Async AI assistant on AsyncOpenAI with bounded concurrency and deadlines."""
+    
+    def _create_client(self) -> Any:
+        """Create the async client used for completions."""
+        # Async connection pools belong to the event loop they were opened on, so they aren't shared
+        return self.backend.create_async_client(self.api_key)
+    
+    def prewarm(self) -> None:
+        """Async clients connect on first use, on their own event loop."""
+    
+    async def _acreate_completion(self, messages: List[Dict[str, str]], stream: bool = False,
+                                  profile: Optional[RoutingProfile] = None) -> Any:
+        """Create a completion, trying the profile's models in order of preference."""
+        profile = profile or self.get_routing_profile()
+        last_error = None
+        estimated_tokens = sum(estimate_tokens(message["content"]) for message in messages) + profile.max_tokens
+        # The last streamed chunk then carries token usage
+        request_options = {"stream_options": {"include_usage": True}} if stream else {}
+        
+        # Models with an open circuit breaker are skipped without a round-trip
+        for model in model_health.iter_models(list(profile.models)):
+            start = time.monotonic()
+            tracker = CompletionTracker(self.user_id, self.current_mode, model, estimated_tokens - profile.max_tokens)
+            try:
+                # Queues near the RPM/TPM budget and retries 429/5xx with backoff
+                response = await rate_limiter.acall(model, estimated_tokens, lambda: self.client.chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    temperature=profile.temperature,
+                    max_tokens=profile.max_tokens,
+                    stream=stream,
+                    timeout=profile.timeout,
+                    **request_options
+                ))
+                model_health.record_success(model, time.monotonic() - start)
+                logger.info(f"Successfully used model: {model}")
+                if stream:
+                    return tracker.atrack(response)
+                tracker.finish(OK, getattr(response, 'usage', None))
+                return response
+            except asyncio.CancelledError:
+                # Deadline exceeded or the caller went away
+                tracker.finish(CANCELLED)
+                raise
+            except Exception as e:
+                tracker.finish(ERROR)
+                last_error = e
+                self._record_error(model, e)
+                # Only try next model if it's a model-specific error
+                if not self._is_model_error(e):
+                    raise
+                logger.warning(f"Model {model} failed: {str(e)}, trying next...")
+                continue
+        
+        if last_error:
+            raise last_error
+        raise Exception("No models available")
+    
+    async def _limited_completion(self, messages: List[Dict[str, str]]) -> Any:
+        """Create a completion while holding a slot of the loop's semaphore."""
+        async with _semaphore():
+            return await self._acreate_completion(messages)
+    
+    async def _generate(self, request_key: str, user_message: str,
+                        conversation_history: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Produce a response from cache or the API, raising on API errors."""
+        cached = await asyncio.to_thread(self._get_cached_response, request_key, user_message, conversation_history)
+        if cached is not None:
+            return cached
+        
+        messages = self._build_messages(user_message, conversation_history)
+        response = await self._limited_completion(messages)
+        
+        content = response.choices[0].message.content if response and response.choices else None
+        if not content:
+            return "Error: Empty response from API. Please try again."
+        await asyncio.to_thread(self._store_response, request_key, user_message, response.model, content,
+                                conversation_history)
+        return content
+    
+    async def chat(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None,
+                   deadline: Optional[float] = None) -> str:
+        """Generate a chat response, giving up after `deadline` seconds."""
+        if not self.client:
+            return "Error: OpenAI API key not configured. Please check your .env file."
+        
+        if not user_message or not user_message.strip():
+            return "Please provide a message."
+        
+        timeout = deadline if deadline is not None else self.get_routing_profile().timeout
+        try:
+            request_key = self._request_key(user_message, conversation_history)
+            # Identical concurrent requests share one upstream call. It runs as its own
+            # task, so one caller's deadline doesn't cancel it for the others.
+            shared = asyncio.ensure_future(_single_flight().do(
+                request_key, lambda: self._generate(request_key, user_message, conversation_history)
+            ))
+            # The deadline covers both queueing for a slot and the API round-trip
+            return await asyncio.wait_for(asyncio.shield(shared), timeout)
+        
+        except asyncio.TimeoutError:
+            logger.error(f"Chat deadline of {timeout}s exceeded")
+            return self._format_error(TimeoutError(f"Request timeout: no response within {timeout}s"))
+        except Exception as e:
+            logger.error(f"Chat error: {str(e)}")
+            return self._format_error(e)
+    
+    async def chat_stream(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None,
+                          deadline: Optional[float] = None) -> AsyncIterator[str]:
+        """Generate a chat response as an async stream of text deltas."""
+        if not self.client:
+            yield "Error: OpenAI API key not configured. Please check your .env file."
+            return
+        
+        if not user_message or not user_message.strip():
+            yield "Please provide a message."
+            return
+        
+        timeout = deadline if deadline is not None else self.get_routing_profile().timeout
+        expires_at = asyncio.get_running_loop().time() + timeout
+        request_key = self._request_key(user_message, conversation_history)
+        single_flight = _single_flight()
+        is_leader, shared = single_flight.begin(request_key)
+        if not is_leader:
+            # An identical request is already in flight; share its final answer
+            try:
+                yield await asyncio.wait_for(asyncio.shield(shared), _remaining(expires_at))
+            except asyncio.TimeoutError:
+                yield self._format_error(TimeoutError(f"Request timeout: no response within {timeout}s"))
+            except Exception as e:
+                yield self._format_error(e)
+            return
+        
+        received = False
+        result = None
+        error = None
+        stream = None
+        # Hold on to the semaphore acquired here even if it is reconfigured meanwhile
+        semaphore = _semaphore()
+        acquired = False
+        try:
+            cached = await asyncio.to_thread(self._get_cached_response, request_key, user_message, conversation_history)
+            if cached is not None:
+                result = cached
+                yield cached
+                return
+            
+            messages = self._build_messages(user_message, conversation_history)
+            await asyncio.wait_for(semaphore.acquire(), _remaining(expires_at))
+            acquired = True
+            stream = await asyncio.wait_for(
+                self._acreate_completion(messages, stream=True), _remaining(expires_at)
+            )
+            
+            parts = []
+            model = None
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), _remaining(expires_at))
+                except StopAsyncIteration:
+                    break
+                model = model or getattr(chunk, 'model', None)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    received = True
+                    parts.append(delta)
+                    yield delta
+            
+            if not received:
+                result = "Error: Empty response from API. Please try again."
+                yield result
+            else:
+                result = "".join(parts)
+                await asyncio.to_thread(
+                    self._store_response, request_key, user_message,
+                    model or self.get_routing_profile().models[0], result, conversation_history
+                )
+        
+        except asyncio.TimeoutError:
+            logger.error(f"Chat stream deadline of {timeout}s exceeded")
+            error = TimeoutError(f"Request timeout: no response within {timeout}s")
+            yield ("\n\n" if received else "") + self._format_error(error)
+        except Exception as e:
+            error = e
+            logger.error(f"Chat stream error: {str(e)}")
+            yield ("\n\n" if received else "") + self._format_error(e)
+        finally:
+            if result is None and error is None:
+                # The consumer stopped reading before the stream finished
+                error = Exception("Request was cancelled before completing")
+            single_flight.finish(request_key, shared, result=result, error=error)
+            if stream is not None and hasattr(stream, 'close'):
+                try:
+                    await stream.close()
+                except Exception:
+                    pass
+            if acquired:
+                semaphore.release()
+
+class _EventLoopThread:
+    """Background event loop that runs async assistant calls for sync callers."""
+    
+    def __init__(self):
+        """Start the event loop on a daemon thread."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="nuvexa-async-engine", daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        """Run the event loop forever."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+    
+    def run(self, coro) -> Any:
+        """Run a coroutine on the loop and block until it completes."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+_loop_thread: Optional[_EventLoopThread] = None
+_loop_lock = threading.Lock()
+
+def _get_loop_thread() -> _EventLoopThread:
+    """Get the shared background event loop, starting it on first use."""
+    global _loop_thread
+    with _loop_lock:
+        if _loop_thread is None:
+            _loop_thread = _EventLoopThread()
+        return _loop_thread
+
+# Attributes and helpers the facade passes through to its async assistant. Everything
+# else on NuvexaAssistant (tool-calling streams, summaries, ...) calls the client
+# synchronously, which an async client can't serve, so it isn't available here.
+_DELEGATED_ATTRIBUTES = frozenset({
+    'api_key', 'backend', 'client', 'current_mode', 'user_id', 'response_cache', 'semantic_cache',
+    'set_mode', 'get_system_prompt', 'get_routing_profile', 'prewarm',
+    'analyze_shopping_query', 'analyze_shopping_intent', 'extract_product_query'
+})
+
+class SyncNuvexaAssistant:
+    """Blocking facade over AsyncNuvexaAssistant with NuvexaAssistant's chat API.
+    
+    Covers chat(), chat_stream() and the mode and intent helpers; other
+    NuvexaAssistant methods raise AttributeError. All facades in a process
+    share one background event loop, so in-flight calls are multiplexed on a
+    single thread and bounded by that loop's semaphore.
+    """
+    
+    def __init__(self, api_key: Optional[str] = None, deadline: Optional[float] = None,
+                 backend: Optional[LLMBackend] = None, user_id: Optional[int] = None,
+                 response_cache: Optional[ResponseCache] = None, semantic_cache: Optional[SemanticCache] = None):
+        """Initialize the facade and its async assistant."""
+        self._assistant = AsyncNuvexaAssistant(api_key, response_cache, semantic_cache, backend=backend, user_id=user_id)
+        self.deadline = deadline
+    
+    def __getattr__(self, name: str) -> Any:
+        """Delegate mode handling and intent helpers to the async assistant."""
+        if name in _DELEGATED_ATTRIBUTES:
+            return getattr(self._assistant, name)
+        raise AttributeError(f"{type(self).__name__} has no attribute {name!r}; use NuvexaAssistant for it")
+    
+    def chat(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> str:
+        """Generate a chat response, blocking until it is available."""
+        return _get_loop_thread().run(
+            self._assistant.chat(user_message, conversation_history, self.deadline)
+        )
+    
+    def chat_stream(self, user_message: str, conversation_history: Optional[List[Tuple[str, str]]] = None) -> Iterator[str]:
+        """Generate a chat response as a blocking stream of text deltas."""
+        loop_thread = _get_loop_thread()
+        agen = self._assistant.chat_stream(user_message, conversation_history, self.deadline)
+        try:
+            while True:
+                try:
+                    yield loop_thread.run(agen.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            # Release the stream and semaphore slot if the consumer stops early
+            loop_thread.run(agen.aclose())
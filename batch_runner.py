@@ -0,0 +1,256 @@
+"""Run large prompt sets through NUVEXA modes offline.
+
+Input is JSONL, one record per line:
+    {"id": "q1", "mode": "builder", "history": [["user", "..."], ["assistant", "..."]], "message": "..."}
+"id" is optional (the line number is used) and "history" may also be a list
+of {"role": ..., "content": ...} objects.
+
+Commands:
+    python batch_runner.py build prompts.jsonl -o batch_input.jsonl
+    python batch_runner.py submit prompts.jsonl -o results.jsonl
+    python batch_runner.py resume batch_abc123 -o results.jsonl
+    python batch_runner.py direct prompts.jsonl -o results.jsonl --workers 8
+
+"submit" uses the OpenAI Batch API (about half the per-token price, results
+within 24h). "direct" runs the same records through NuvexaAssistant.chat
+with a bounded worker pool when the Batch API is not an option.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+from config import MODES
+from assistant import NuvexaAssistant
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_MAX_REQUESTS = 50000
+BATCH_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Read and validate prompt records from a JSONL file."""
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('mode') not in MODES:
+                raise ValueError(f"Line {line_number}: unknown mode {record.get('mode')!r}")
+            if not record.get('message'):
+                raise ValueError(f"Line {line_number}: missing message")
+            record.setdefault('id', f"line-{line_number}")
+            record['history'] = _normalize_history(record.get('history'))
+            yield record
+
+def _normalize_history(history: Optional[List[Any]]) -> List[Tuple[str, str]]:
+    """Accept [role, content] pairs or {"role", "content"} objects."""
+    normalized = []
+    for entry in history or []:
+        if isinstance(entry, dict):
+            normalized.append((entry.get('role'), entry.get('content')))
+        else:
+            normalized.append((entry[0], entry[1]))
+    return normalized
+
+def build_batch_lines(records: Iterator[Dict[str, Any]], assistant: NuvexaAssistant) -> Iterator[Dict[str, Any]]:
+    """Turn prompt records into Batch API request lines with the assistant's message construction."""
+    for record in records:
+        assistant.set_mode(record['mode'])
+        yield {
+            "custom_id": str(record['id']),
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": assistant.build_request_body(record['message'], record['history'])
+        }
+
+def write_batch_files(records: Iterator[Dict[str, Any]], assistant: NuvexaAssistant, output_path: str,
+                      max_requests: int = BATCH_MAX_REQUESTS) -> List[str]:
+    """Write batch input files of at most `max_requests` lines each and return their paths."""
+    paths = []
+    f = None
+    count = 0
+    try:
+        for line in build_batch_lines(records, assistant):
+            if f is None or count >= max_requests:
+                if f:
+                    f.close()
+                path = output_path if not paths else f"{output_path}.{len(paths)}"
+                paths.append(path)
+                f = open(path, 'w', encoding='utf-8')
+                count = 0
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    finally:
+        if f:
+            f.close()
+    return paths
+
+def submit_batch(client: Any, input_path: str) -> str:
+    """Upload a batch input file and create the batch, returning its id."""
+    with open(input_path, 'rb') as f:
+        uploaded = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h"
+    )
+    logger.info(f"Submitted batch {batch.id} from {input_path}")
+    return batch.id
+
+def wait_for_batch(client: Any, batch_id: str, poll_interval: float) -> Any:
+    """Poll a batch until it reaches a terminal state."""
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        logger.info(
+            f"Batch {batch_id}: {batch.status}"
+            + (f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else "")
+        )
+        if batch.status in BATCH_TERMINAL_STATES:
+            return batch
+        time.sleep(poll_interval)
+
+def _result_from_batch_line(line: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert one Batch API output or error line into a result record."""
+    result = {"id": line.get('custom_id'), "response": None, "model": None, "error": None}
+    response = line.get('response') or {}
+    body = response.get('body') or {}
+    if line.get('error'):
+        result['error'] = line['error'].get('message') if isinstance(line['error'], dict) else str(line['error'])
+    elif response.get('status_code') != 200:
+        result['error'] = (body.get('error') or {}).get('message') or f"HTTP {response.get('status_code')}"
+    else:
+        choices = body.get('choices') or []
+        result['response'] = choices[0]['message']['content'] if choices else None
+        result['model'] = body.get('model')
+        result['usage'] = body.get('usage')
+    return result
+
+def stream_batch_results(client: Any, batch: Any, out: TextIO) -> int:
+    """Stream a finished batch's output and error files to the results JSONL, returning the line count."""
+    written = 0
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        content = client.files.content(file_id)
+        for raw_line in content.iter_lines():
+            if not raw_line.strip():
+                continue
+            out.write(json.dumps(_result_from_batch_line(json.loads(raw_line)), ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+def run_batch(input_path: str, output_path: str, poll_interval: float, max_requests: int) -> int:
+    """Build, submit and poll batches for a prompt file, then write all results."""
+    assistant = NuvexaAssistant()
+    if not assistant.client:
+        raise RuntimeError("OpenAI API key not configured")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_batch_files(read_records(input_path), assistant, os.path.join(tmp, "batch_input.jsonl"), max_requests)
+        batch_ids = [submit_batch(assistant.client, path) for path in paths]
+    
+    return _collect_batches(assistant.client, batch_ids, output_path, poll_interval)
+
+def _collect_batches(client: Any, batch_ids: List[str], output_path: str, poll_interval: float) -> int:
+    """Wait for batches and write their results."""
+    written = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        for batch_id in batch_ids:
+            batch = wait_for_batch(client, batch_id, poll_interval)
+            if batch.status != "completed":
+                logger.error(f"Batch {batch_id} ended as {batch.status}; writing partial results")
+            written += stream_batch_results(client, batch, out)
+    return written
+
+def run_direct(input_path: str, output_path: str, workers: int) -> int:
+    """Run prompt records through NuvexaAssistant.chat with a bounded worker pool."""
+    local = threading.local()
+    
+    def run_one(record: Dict[str, Any]) -> Dict[str, Any]:
+        # One assistant per worker, since the mode is per-assistant state
+        if not hasattr(local, 'assistant'):
+            local.assistant = NuvexaAssistant()
+        local.assistant.set_mode(record['mode'])
+        start = time.monotonic()
+        response = local.assistant.chat(record['message'], record['history'])
+        failed = response.startswith("Error:")
+        return {
+            "id": record['id'],
+            "response": None if failed else response,
+            "error": response if failed else None,
+            "latency": round(time.monotonic() - start, 3)
+        }
+    
+    written = 0
+    with open(output_path, 'w', encoding='utf-8') as out, ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for record in read_records(input_path):
+            pending.add(executor.submit(run_one, record))
+            # Keep a bounded number of records in memory however large the input is
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    out.write(json.dumps(future.result(), ensure_ascii=False) + "\n")
+                    written += 1
+        for future in pending:
+            out.write(json.dumps(future.result(), ensure_ascii=False) + "\n")
+            written += 1
+    return written
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Run NUVEXA prompt sets offline via the Batch API or a worker pool.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    build = commands.add_parser('build', help="Write Batch API input file(s) without submitting")
+    build.add_argument('input')
+    build.add_argument('-o', '--output', required=True)
+    build.add_argument('--max-requests', type=int, default=BATCH_MAX_REQUESTS)
+    
+    submit = commands.add_parser('submit', help="Submit to the Batch API, poll, and write results")
+    submit.add_argument('input')
+    submit.add_argument('-o', '--output', required=True)
+    submit.add_argument('--poll-interval', type=float, default=30.0)
+    submit.add_argument('--max-requests', type=int, default=BATCH_MAX_REQUESTS)
+    
+    resume = commands.add_parser('resume', help="Poll existing batch ids and write results")
+    resume.add_argument('batch_ids', nargs='+')
+    resume.add_argument('-o', '--output', required=True)
+    resume.add_argument('--poll-interval', type=float, default=30.0)
+    
+    direct = commands.add_parser('direct', help="Run locally through NuvexaAssistant.chat")
+    direct.add_argument('input')
+    direct.add_argument('-o', '--output', required=True)
+    direct.add_argument('--workers', type=int, default=8)
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == 'build':
+        paths = write_batch_files(read_records(args.input), NuvexaAssistant(), args.output, args.max_requests)
+        print(f"Wrote {len(paths)} batch file(s): {', '.join(paths)}")
+    elif args.command == 'submit':
+        written = run_batch(args.input, args.output, args.poll_interval, args.max_requests)
+        print(f"Wrote {written} result(s) to {args.output}")
+    elif args.command == 'resume':
+        client = NuvexaAssistant().client
+        if not client:
+            raise RuntimeError("OpenAI API key not configured")
+        written = _collect_batches(client, args.batch_ids, args.output, args.poll_interval)
+        print(f"Wrote {written} result(s) to {args.output}")
+    else:
+        written = run_direct(args.input, args.output, args.workers)
+        print(f"Wrote {written} result(s) to {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Reproducible end-to-end benchmark of the shopping flow using LLM cassettes.
+
+Usage:
+    python benchmarks/bench_app_flow.py --record flow.jsonl.gz [--backend stub|openai]
+    python benchmarks/bench_app_flow.py --replay flow.jsonl.gz [--speed 0]
+
+Each iteration runs chat -> shopping search -> add to cart -> checkout on a
+scratch database. Recording talks to a real backend (an in-process stub
+server by default); replaying answers from the cassette, and with --speed 0
+the timings are pure Python-side overhead.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assistant import NuvexaAssistant
+from cassette import RecordingBackend, ReplayBackend
+from database import NuvexaDB
+from llm_backend import get_backend, StubBackend
+from rate_limiter import rate_limiter
+from shopping import ShoppingEngine
+from stub_server import StubSettings, start_stub_server
+from usage import usage_recorder
+
+PROMPTS = [
+    "Find me wireless headphones with noise cancellation",
+    "I want to buy a laptop for programming",
+    "Show me running shoes under $150",
+    "Looking for a coffee maker for a small kitchen",
+    "Search for a 4K monitor for photo editing",
+]
+
+STEPS = ['chat', 'search', 'add_to_cart', 'checkout']
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_flow(assistant: NuvexaAssistant, shopping: ShoppingEngine, db: NuvexaDB, user_id: int,
+             prompt: str, timings: Dict[str, List[float]]):
+    """Run one chat -> search -> add to cart -> checkout flow, timing each step."""
+    start = time.perf_counter()
+    response = "".join(assistant.chat_stream(prompt, []))
+    timings['chat'].append(time.perf_counter() - start)
+    if response.startswith("Error:"):
+        raise RuntimeError(response)
+    
+    start = time.perf_counter()
+    products = []
+    is_shopping, product_query = assistant.analyze_shopping_query(prompt)
+    if is_shopping:
+        products = shopping.search_products(product_query)
+    timings['search'].append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    for product in products[:2]:
+        db.add_to_cart(user_id, product['name'], product['price'], product.get('image', ''), product.get('description', ''))
+    timings['add_to_cart'].append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    cart = db.get_cart_summary(user_id)
+    if cart['items']:
+        order_items = [{"name": item[1], "price": item[2], "qty": item[5]} for item in cart['items']]
+        if db.create_order(user_id, order_items, cart['total']):
+            db.clear_cart(user_id)
+    timings['checkout'].append(time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--record', metavar='CASSETTE')
+    group.add_argument('--replay', metavar='CASSETTE')
+    parser.add_argument('--backend', choices=['stub', 'openai'], default='stub', help="Backend to record from")
+    parser.add_argument('--speed', type=float, default=1.0, help="Replay speed factor (0 = no delays)")
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    
+    server = None
+    if args.record:
+        if args.backend == 'stub':
+            server = start_stub_server(StubSettings(ttft="lognormal:0.3:0.3", tokens_per_second=80, seed=0))
+            inner = StubBackend(server.url)
+        else:
+            inner = get_backend('openai')
+        backend = RecordingBackend(args.record, inner)
+    else:
+        backend = ReplayBackend(args.replay, args.speed)
+    # Keep the client-side scheduler out of the measurements
+    rate_limiter.rpm = 10_000
+    rate_limiter.tpm = 10_000_000
+    # Keep benchmark traffic out of the app's usage table
+    usage_recorder.enabled = False
+    
+    assistant = NuvexaAssistant(backend=backend)
+    assistant.set_mode('shopping')
+    shopping = ShoppingEngine()
+    timings = {step: [] for step in STEPS}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = NuvexaDB(os.path.join(tmp, 'bench.db'))
+        user_id = db.get_or_create_user("Bench")
+        start = time.perf_counter()
+        for i in range(args.iterations):
+            run_flow(assistant, shopping, db, user_id, PROMPTS[i % len(PROMPTS)], timings)
+        elapsed = time.perf_counter() - start
+        db.close()
+    
+    mode = f"record ({args.backend})" if args.record else f"replay (speed {args.speed:g})"
+    print(f"{mode}: {args.iterations} flows in {elapsed:.2f}s")
+    for step in STEPS:
+        print(f"  {step:<12} p50 {percentile(timings[step], 0.5) * 1000:8.2f} ms   "
+              f"p95 {percentile(timings[step], 0.95) * 1000:8.2f} ms")
+    if args.replay:
+        print(f"  cassette hits {backend.player.hits}, misses {backend.player.misses}")
+    if server:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Throughput of loading messages, cart items and orders one row per commit vs through the bulk methods.
+
+Usage: python benchmarks/bench_bulk_writes.py [--rows 100000] [--chunk-size 5000]
+
+Each table is loaded on a fresh database, first with save_message,
+add_to_cart and create_order (one transaction per row) and then with
+save_messages, add_to_cart_many and import_orders (one transaction per
+chunk). Cart rows are spread over users holding 100 products each. Row
+counts are checked after each load.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import NuvexaDB
+
+ITEMS_PER_CART = 100
+
+TABLES = {'messages': 'conversations', 'cart': 'cart', 'orders': 'orders'}
+
+def message_rows(user_ids: List[int], rows: int) -> List[tuple]:
+    """Alternating user and assistant messages spread over the users."""
+    return [
+        (user_ids[i % len(user_ids)], 'assistant', f"message {i}: " + "words " * 30, 'user' if i % 2 == 0 else 'assistant')
+        for i in range(rows)
+    ]
+
+def cart_items(rows: int) -> List[Dict]:
+    """Product dicts, ITEMS_PER_CART distinct products per cart."""
+    return [
+        {'name': f"Product {i % ITEMS_PER_CART}", 'price': 19.99, 'image': '', 'description': 'A product'}
+        for i in range(rows)
+    ]
+
+def order_rows(user_ids: List[int], rows: int) -> List[Dict]:
+    """Two-item orders spread over the users."""
+    return [
+        {'user_id': user_ids[i % len(user_ids)], 'total_amount': 59.97,
+         'items': [{"name": "Product 1", "price": 19.99, "qty": 1}, {"name": "Product 2", "price": 19.99, "qty": 2}]}
+        for i in range(rows)
+    ]
+
+def single_row(db: NuvexaDB, table: str, user_ids: List[int], rows: int):
+    """Load a table one row per commit."""
+    if table == 'messages':
+        for user_id, mode, message, role in message_rows(user_ids, rows):
+            db.save_message(user_id, mode, message, role)
+    elif table == 'cart':
+        for i, item in enumerate(cart_items(rows)):
+            db.add_to_cart(user_ids[i // ITEMS_PER_CART % len(user_ids)], item['name'], item['price'],
+                           item['image'], item['description'])
+    else:
+        for order in order_rows(user_ids, rows):
+            db.create_order(order['user_id'], order['items'], order['total_amount'])
+
+def bulk(db: NuvexaDB, table: str, user_ids: List[int], rows: int, chunk_size: int):
+    """Load a table through the bulk methods."""
+    if table == 'messages':
+        db.save_messages(message_rows(user_ids, rows), chunk_size)
+    elif table == 'cart':
+        items = cart_items(rows)
+        for start in range(0, rows, ITEMS_PER_CART):
+            user_id = user_ids[start // ITEMS_PER_CART % len(user_ids)]
+            db.add_to_cart_many(user_id, items[start:start + ITEMS_PER_CART], chunk_size)
+    else:
+        db.import_orders(order_rows(user_ids, rows), chunk_size)
+
+def run(table: str, rows: int, load: Callable[[NuvexaDB, str, List[int], int], None]) -> float:
+    """Load one table on a fresh database and return the elapsed seconds."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Inline writes, so save_message commits each row itself
+        db = NuvexaDB(os.path.join(tmp, 'bench.db'), write_behind=False)
+        user_ids = [db.get_or_create_user(f"User {i}") for i in range(max(1, rows // ITEMS_PER_CART))]
+        began = time.perf_counter()
+        load(db, table, user_ids, rows)
+        elapsed = time.perf_counter() - began
+        with db.get_cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {TABLES[table]}')
+            stored = cursor.fetchone()[0]
+        db.close()
+    expected = rows if table != 'cart' else min(rows, len(user_ids) * ITEMS_PER_CART)
+    if stored != expected:
+        raise RuntimeError(f"{table}: expected {expected} rows, found {stored}")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), default=list(TABLES))
+    args = parser.parse_args()
+    
+    print(f"{args.rows} rows per table, bulk chunk size {args.chunk_size}")
+    for table in args.tables:
+        single = run(table, args.rows, single_row)
+        batched = run(table, args.rows, lambda db, table, user_ids, rows: bulk(db, table, user_ids, rows, args.chunk_size))
+        print(f"{table:<9} single-row {single:6.2f}s ({args.rows / single:9.0f} rows/s)   "
+              f"bulk {batched:6.2f}s ({args.rows / batched:9.0f} rows/s)   {single / batched:5.1f}x")
+
+if __name__ == '__main__':
+    main()
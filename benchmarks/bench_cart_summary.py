@@ -0,0 +1,103 @@
+"""Queries and time per sidebar rerun and checkout, three get_cart_items scans vs one cart summary.
+
+Usage: python benchmarks/bench_cart_summary.py [--items 20] [--reruns 2000]
+
+"legacy" reads the cart the way app.py used to: get_cart_items for the list
+plus one more scan each for the item count and the total, and two scans at
+checkout. "summary" reads it with get_cart_summary. Statements are counted
+with SQLite's trace callback on the session's connection.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import NuvexaDB
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def legacy_sidebar(db: NuvexaDB, user_id: int) -> Dict[str, Any]:
+    """The cart data of one sidebar render, as app.py used to read it."""
+    items = db.get_cart_items(user_id)
+    count = sum(item[5] for item in db.get_cart_items(user_id))
+    total = sum(item[2] * item[5] for item in db.get_cart_items(user_id))
+    return {'items': items, 'item_count': count, 'total': total}
+
+def legacy_checkout(db: NuvexaDB, user_id: int):
+    """Checkout as app.py used to run it."""
+    items = db.get_cart_items(user_id)
+    total = sum(item[2] * item[5] for item in db.get_cart_items(user_id))
+    order_items = [{"name": item[1], "price": item[2], "qty": item[5]} for item in items]
+    if db.create_order(user_id, order_items, total):
+        db.clear_cart(user_id)
+
+def summary_checkout(db: NuvexaDB, user_id: int):
+    """Checkout as app.py runs it now."""
+    cart = db.get_cart_summary(user_id)
+    order_items = [{"name": item[1], "price": item[2], "qty": item[5]} for item in cart['items']]
+    if db.create_order(user_id, order_items, cart['total']):
+        db.clear_cart(user_id)
+
+class StatementCounter:
+    """Counts the SQL statements a connection runs, leaving out transaction control."""
+    
+    def __init__(self):
+        """Start at zero."""
+        self.count = 0
+    
+    def __call__(self, statement: str):
+        """Trace callback for sqlite3.Connection.set_trace_callback."""
+        if statement.split(None, 1)[0].upper() not in ('BEGIN', 'COMMIT', 'ROLLBACK'):
+            self.count += 1
+
+def fill_cart(db: NuvexaDB, user_id: int, items: int):
+    """Put `items` distinct products in the cart."""
+    db.add_to_cart_many(user_id, [{'name': f"Product {i}", 'price': 9.99 + i, 'quantity': 1 + i % 3}
+                                  for i in range(items)])
+
+def run(label: str, sidebar: Callable, checkout: Callable, items: int, reruns: int) -> Dict[str, Any]:
+    """Time sidebar reruns and checkouts on a fresh database and count their statements."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = NuvexaDB(os.path.join(tmp, 'bench.db'), write_behind=False)
+        user_id = db.get_or_create_user("Bench")
+        fill_cart(db, user_id, items)
+        counter = StatementCounter()
+        db.conn.set_trace_callback(counter)
+        
+        latencies = []
+        for _ in range(reruns):
+            began = time.perf_counter()
+            cart = sidebar(db, user_id)
+            latencies.append(time.perf_counter() - began)
+        per_rerun = counter.count / reruns
+        
+        counter.count = 0
+        checkout(db, user_id)
+        per_checkout = counter.count
+        db.conn.set_trace_callback(None)
+        db.close()
+    print(f"{label:<8} queries per rerun {per_rerun:4.1f}   per checkout {per_checkout:2d}   "
+          f"rerun p50 {percentile(latencies, 0.5) * 1000:6.3f} ms   p95 {percentile(latencies, 0.95) * 1000:6.3f} ms")
+    return cart
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=20, help="Products in the cart")
+    parser.add_argument('--reruns', type=int, default=2000)
+    args = parser.parse_args()
+    
+    print(f"{args.items} products in the cart, {args.reruns} reruns")
+    legacy = run('legacy', legacy_sidebar, legacy_checkout, args.items, args.reruns)
+    summary = run('summary', lambda db, user_id: db.get_cart_summary(user_id), summary_checkout, args.items, args.reruns)
+    if (legacy['item_count'], round(legacy['total'], 2)) != (summary['item_count'], round(summary['total'], 2)):
+        raise RuntimeError(f"Cart summaries differ: {legacy} vs {summary}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Load-test the full chat path against the local stub server.
+
+Usage: python benchmarks/bench_chat_path.py [--engine sync|async] [--sessions 50] [--requests 4] [--stream]
+
+Starts stub_server in-process (or uses --url), then runs concurrent sessions
+through the assistant and reports time to first token, total latency and
+throughput. Stub latency, token rate and error injection are configurable.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assistant import NuvexaAssistant
+from async_assistant import SyncNuvexaAssistant
+from llm_backend import StubBackend
+from rate_limiter import rate_limiter
+from stub_server import StubSettings, start_stub_server
+from usage import usage_recorder
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_session(assistant, session: int, requests: int, stream: bool, results: Dict[str, list], lock: threading.Lock):
+    """Send a session's requests one after another, as a user would."""
+    history = []
+    for turn in range(requests):
+        message = f"session {session} turn {turn}: suggest a laptop under ${500 + turn * 100}"
+        start = time.perf_counter()
+        first = None
+        if stream:
+            parts = []
+            for delta in assistant.chat_stream(message, history):
+                if first is None:
+                    first = time.perf_counter() - start
+                parts.append(delta)
+            response = "".join(parts)
+        else:
+            response = assistant.chat(message, history)
+        total = time.perf_counter() - start
+        with lock:
+            if response.startswith("Error:"):
+                results['errors'].append(response)
+            else:
+                results['latency'].append(total)
+                if first is not None:
+                    results['ttft'].append(first)
+        history.extend([("user", message), ("assistant", response)])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync')
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=4, help="Requests per session")
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--url', help="Use a running stub server instead of starting one")
+    parser.add_argument('--ttft', default="lognormal:0.3:0.3")
+    parser.add_argument('--tokens-per-second', type=float, default=80.0)
+    parser.add_argument('--output-tokens', default="uniform:40:120")
+    parser.add_argument('--error-429', type=float, default=0.0)
+    parser.add_argument('--error-500', type=float, default=0.0)
+    parser.add_argument('--rpm', type=int, default=0, help="Stub server requests per minute limit")
+    parser.add_argument('--tpm', type=int, default=0, help="Stub server tokens per minute limit")
+    parser.add_argument('--client-rpm', type=float, default=10_000, help="Client-side scheduler budget")
+    parser.add_argument('--client-tpm', type=float, default=10_000_000, help="Client-side scheduler budget")
+    args = parser.parse_args()
+    
+    server = None
+    url = args.url
+    if not url:
+        server = start_stub_server(StubSettings(
+            ttft=args.ttft, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens,
+            error_429_rate=args.error_429, error_500_rate=args.error_500, rpm=args.rpm, tpm=args.tpm, seed=0
+        ))
+        url = server.url
+    backend = StubBackend(url)
+    # The default client budgets match a low OpenAI tier; lift them so the stub is the bottleneck
+    rate_limiter.rpm = args.client_rpm
+    rate_limiter.tpm = args.client_tpm
+    # Keep benchmark traffic out of the app's usage table
+    usage_recorder.enabled = False
+    
+    results = {'latency': [], 'ttft': [], 'errors': []}
+    lock = threading.Lock()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        futures = []
+        for session in range(args.sessions):
+            if args.engine == 'async':
+                assistant = SyncNuvexaAssistant(backend=backend)
+            else:
+                assistant = NuvexaAssistant(backend=backend)
+            assistant.set_mode('shopping')
+            futures.append(executor.submit(run_session, assistant, session, args.requests, args.stream, results, lock))
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+    
+    done = len(results['latency'])
+    print(f"engine={args.engine} sessions={args.sessions} requests={args.sessions * args.requests} stream={args.stream}")
+    print(f"completed {done}, errors {len(results['errors'])}, {done / elapsed:.1f} req/s over {elapsed:.1f}s")
+    if results['latency']:
+        print(f"latency p50 {percentile(results['latency'], 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(results['latency'], 0.95) * 1000:.0f} ms")
+    if results['ttft']:
+        print(f"first token p50 {percentile(results['ttft'], 0.5) * 1000:.0f} ms, "
+              f"p95 {percentile(results['ttft'], 0.95) * 1000:.0f} ms")
+    if server:
+        print(f"stub stats: {server.state.snapshot()}")
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Concurrent database reads and writes from simulated sessions, pooled WAL vs the old per-session setup.
+
+Usage: python benchmarks/bench_db_concurrency.py [--sessions 50] [--turns 40] [--profile default]
+
+Every session runs on its own thread like a Streamlit session and, per turn,
+saves a user and an assistant message, reads its history window and cart,
+and adds to its cart. "legacy" gives each session one connection in
+rollback-journal mode, as NuvexaDB used to; "pooled" uses NuvexaDB's
+per-thread WAL connections. Wall time and the write tail show how much the
+sessions serialize on the database lock.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import DB_PRAGMA_PROFILES
+from database import NuvexaDB
+
+class LegacyDB(NuvexaDB):
+    """NuvexaDB on a single connection in the default rollback-journal mode, as before pooling."""
+    
+    def __init__(self, db_name: str):
+        """Open one connection for this handler."""
+        self._conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self.message_writer = None
+        self.create_tables()
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The handler's only connection."""
+        return self._conn
+    
+    def close(self):
+        """Close the connection."""
+        self._conn.close()
+    
+    @contextmanager
+    def get_cursor(self):
+        """Cursor on the handler's connection, committed on success."""
+        cursor = self._conn.cursor()
+        try:
+            yield cursor
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_session(db: NuvexaDB, user_id: int, turns: int, start: threading.Event,
+                timings: Dict[str, List[float]], lock: threading.Lock):
+    """Run one session's turns, timing reads and writes."""
+    reads = []
+    writes = []
+    errors = 0
+    start.wait()
+    for turn in range(turns):
+        try:
+            began = time.perf_counter()
+            saved = (db.save_message(user_id, 'assistant', f"turn {turn}: what laptop should I buy?", 'user'),
+                     db.save_message(user_id, 'assistant', f"turn {turn}: here are three options " + "x" * 400, 'assistant'),
+                     db.add_to_cart(user_id, f"Product {turn % 5}", 19.99) is not None)
+            writes.append(time.perf_counter() - began)
+            # Write helpers log and return a failure instead of raising
+            errors += saved.count(False)
+            
+            began = time.perf_counter()
+            db.get_conversation_window(user_id, 'assistant', 2000)
+            db.get_cart_summary(user_id)
+            reads.append(time.perf_counter() - began)
+        except sqlite3.Error:
+            errors += 1
+    with lock:
+        timings['read'].extend(reads)
+        timings['write'].extend(writes)
+        timings['errors'].append(errors)
+
+def run(setup: str, sessions: int, turns: int, profile: str) -> None:
+    """Run every session concurrently against a fresh database and print the results."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        handlers = []
+        for session in range(sessions):
+            # Messages are written inline in both setups; bench_message_writes.py covers write-behind
+            db = LegacyDB(path) if setup == 'legacy' else NuvexaDB(path, profile, write_behind=False)
+            handlers.append((db, db.get_or_create_user(f"Session {session}")))
+        
+        timings: Dict[str, List[float]] = {'read': [], 'write': [], 'errors': []}
+        lock = threading.Lock()
+        start = threading.Event()
+        threads = [
+            threading.Thread(target=run_session, args=(db, user_id, turns, start, timings, lock))
+            for db, user_id in handlers
+        ]
+        for thread in threads:
+            thread.start()
+        began = time.perf_counter()
+        start.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        
+        operations = len(timings['write']) * 3 + len(timings['read']) * 2
+        print(f"{setup:<7} {elapsed:6.2f}s  {operations / elapsed:8.0f} ops/s  failed queries {sum(timings['errors'])}")
+        for kind in ('read', 'write'):
+            values = timings[kind]
+            print(f"        {kind:<6} p50 {percentile(values, 0.5) * 1000:7.2f} ms   "
+                  f"p95 {percentile(values, 0.95) * 1000:7.2f} ms   p99 {percentile(values, 0.99) * 1000:7.2f} ms")
+        if setup == 'pooled':
+            print(f"        pool {handlers[0][0].pool.stats()}")
+            # Every pooled handler shares the pool
+            handlers[0][0].close()
+        else:
+            for db, _ in handlers:
+                db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--turns', type=int, default=40)
+    parser.add_argument('--profile', choices=list(DB_PRAGMA_PROFILES), default='default')
+    parser.add_argument('--setup', choices=['legacy', 'pooled', 'both'], default='both')
+    args = parser.parse_args()
+    
+    print(f"{args.sessions} sessions x {args.turns} turns (5 queries each)")
+    for setup in (['legacy', 'pooled'] if args.setup == 'both' else [args.setup]):
+        run(setup, args.sessions, args.turns, args.profile)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Compare chat latency with and without hedged requests against a heavy-tailed stub server.
+
+Usage: python benchmarks/bench_hedging.py [--requests 300] [--concurrency 16] [--hedge-after 0.8]
+
+Each run sends the same prompts through NuvexaAssistant.chat() in shopping
+mode, first without and then with hedging to the fallback model, and reports
+latency percentiles, hedge and win rates, and the extra upstream requests
+hedging cost.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assistant import NuvexaAssistant
+from hedging import hedge_stats
+from llm_backend import StubBackend
+from rate_limiter import rate_limiter
+from routing import routing_table
+from stub_server import StubSettings, start_stub_server
+from usage import usage_recorder
+
+MODE = 'shopping'
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run(assistant: NuvexaAssistant, requests: int, concurrency: int, label: str) -> List[float]:
+    """Send every prompt through chat() and return the latencies of the successful ones."""
+    def one(i: int) -> float:
+        start = time.perf_counter()
+        response = assistant.chat(f"{label} request {i}: compare two budget laptops")
+        if response.startswith("Error:"):
+            raise RuntimeError(response)
+        return time.perf_counter() - start
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--hedge-after', type=float, default=0.8, help="Seconds without a first token before hedging")
+    parser.add_argument('--ttft', default="lognormal:0.3:1.2", help="Stub time-to-first-token distribution")
+    args = parser.parse_args()
+    
+    server = start_stub_server(StubSettings(ttft=args.ttft, tokens_per_second=400,
+                                            output_tokens="uniform:20:60", seed=0))
+    # Keep the client-side scheduler out of the measurements
+    rate_limiter.rpm = 10_000
+    rate_limiter.tpm = 10_000_000
+    # Keep benchmark traffic out of the app's usage table
+    usage_recorder.enabled = False
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        overrides = os.path.join(tmp, 'routing.json')
+        with open(overrides, 'w', encoding='utf-8') as f:
+            json.dump({MODE: {'hedge_after': args.hedge_after}}, f)
+        routing_table.overrides_path = overrides
+        routing_table.reload()
+        
+        assistant = NuvexaAssistant(backend=StubBackend(server.url))
+        assistant.set_mode(MODE)
+        profile = assistant.get_routing_profile()
+        print(f"{args.requests} requests, concurrency {args.concurrency}, stub ttft {args.ttft}, "
+              f"models {' -> '.join(profile.models)}, hedge after {profile.hedge_after:g}s")
+        
+        for hedging in (False, True):
+            assistant.hedging = hedging
+            hedge_stats.reset()
+            upstream_before = server.state.snapshot()['requests']
+            latencies = run(assistant, args.requests, args.concurrency, 'hedged' if hedging else 'plain')
+            upstream = server.state.snapshot()['requests'] - upstream_before
+            print(f"{'hedged' if hedging else 'plain':<7} p50 {percentile(latencies, 0.5) * 1000:7.0f} ms   "
+                  f"p95 {percentile(latencies, 0.95) * 1000:7.0f} ms   p99 {percentile(latencies, 0.99) * 1000:7.0f} ms   "
+                  f"upstream requests {upstream}")
+            if hedging:
+                stats = hedge_stats.snapshot().get(MODE, {})
+                print(f"        hedge rate {stats.get('hedge_rate') or 0:.1%}, "
+                      f"win rate {stats.get('win_rate') or 0:.1%} ({stats.get('hedge_wins', 0)}/{stats.get('hedged', 0)})")
+    server.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Microbenchmark the compiled shopping intent matcher against the old keyword scans.
+
+Usage: python benchmarks/bench_intent_matcher.py [--rounds 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_understanding import analyze_query, compile_phrases
+
+MESSAGES = [
+    "I want to buy a laptop for programming",
+    "Can you find me some wireless headphones with noise cancellation?",
+    "Looking for a smartphone under $800",
+    "I need to find an iPad for drawing",
+    "Search for coconut water",
+    "What's the weather like today?",
+    "Help me plan a trip to Japan in the spring with a tight budget and a lot of hiking",
+    "Get me the best tablet you can find",
+]
+
+def legacy_analyze_shopping_intent(message: str) -> bool:
+    """The previous NuvexaAssistant.analyze_shopping_intent."""
+    if not message:
+        return False
+    shopping_keywords = [
+        'buy', 'purchase', 'shop', 'find', 'look for', 'need', 'want',
+        'get me', 'search for', 'looking for', 'shopping', 'order'
+    ]
+    message_lower = message.lower()
+    return any(keyword in message_lower for keyword in shopping_keywords)
+
+def legacy_extract_product_query(message: str) -> str:
+    """The previous NuvexaAssistant.extract_product_query."""
+    if not message:
+        return ""
+    shopping_keywords = [
+        'buy', 'purchase', 'shop for', 'find', 'look for', 'need',
+        'want', 'get me', 'search for', 'looking for'
+    ]
+    message_lower = message.lower()
+    for keyword in shopping_keywords:
+        if keyword in message_lower:
+            parts = message_lower.split(keyword, 1)
+            if len(parts) > 1:
+                query = parts[1].strip()
+                for word in ['some', 'a', 'an', 'the']:
+                    query = query.replace(word, '').strip()
+                return query if query else message
+    return message
+
+def legacy(message: str):
+    """Intent check followed by query extraction, as app.py did it."""
+    if legacy_analyze_shopping_intent(message):
+        return True, legacy_extract_product_query(message)
+    return False, message
+
+def time_per_call(fn, rounds: int) -> float:
+    """Microseconds per message."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            fn(message)
+    return (time.perf_counter() - start) / (rounds * len(MESSAGES)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=20000)
+    args = parser.parse_args()
+    
+    print(f"{'message':<45} {'legacy query':<30} {'compiled query'}")
+    for message in MESSAGES:
+        _, old_query = legacy(message)
+        _, new_query = analyze_query(message)
+        print(f"{message[:44]:<45} {old_query[:29]!r:<30} {new_query!r}")
+    
+    print()
+    print(f"legacy:   {time_per_call(legacy, args.rounds):.2f} us/message")
+    print(f"compiled: {time_per_call(analyze_query, args.rounds):.2f} us/message")
+    
+    # Intent detection only, as the vocabulary grows: substring scans cost one pass per phrase
+    print()
+    rounds = max(1, args.rounds // 10)
+    for size in (12, 100, 1000):
+        vocabulary = [f"{word}{i}" if i else word for i in range(size // 12 + 1)
+                      for word in ('buy', 'purchase', 'shop', 'find', 'look for', 'need', 'want',
+                                   'get me', 'search for', 'looking for', 'shopping', 'order')][:size]
+        pattern = compile_phrases(vocabulary)
+        substring = time_per_call(lambda message: any(phrase in message.lower() for phrase in vocabulary), rounds)
+        compiled = time_per_call(lambda message: pattern.search(message.lower()) is not None, rounds)
+        print(f"{size:>5} phrases: substring scans {substring:8.2f} us/message, compiled {compiled:6.2f} us/message")
+
+if __name__ == '__main__':
+    main()
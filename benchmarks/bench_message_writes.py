@@ -0,0 +1,86 @@
+"""Latency of saving conversation messages, written inline vs through the write-behind queue.
+
+Usage: python benchmarks/bench_message_writes.py [--sessions 20] [--turns 50]
+
+Each simulated session saves a user and an assistant message per turn and
+then, like the summarizer, reads its conversation back, checking that every
+message it saved is visible.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import NuvexaDB
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def run_session(db: NuvexaDB, user_id: int, turns: int, start: threading.Event,
+                results: Dict[str, list], lock: threading.Lock):
+    """Save and read back one session's messages."""
+    saves = []
+    reads = []
+    missing = 0
+    start.wait()
+    for turn in range(turns):
+        for role in ('user', 'assistant'):
+            began = time.perf_counter()
+            db.save_message(user_id, 'therapist', f"{role} turn {turn}: " + "words " * 40, role)
+            saves.append(time.perf_counter() - began)
+        if turn % 10 == 9:
+            began = time.perf_counter()
+            rows = db.get_messages_after(user_id, 'therapist', 0, limit=10_000)
+            reads.append(time.perf_counter() - began)
+            missing += 2 * (turn + 1) - len(rows)
+    with lock:
+        results['save'].extend(saves)
+        results['read'].extend(reads)
+        results['missing'].append(missing)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--turns', type=int, default=50)
+    args = parser.parse_args()
+    
+    print(f"{args.sessions} sessions x {args.turns} turns")
+    for write_behind in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_name = os.path.join(tmp, 'bench.db')
+            handlers = []
+            for session in range(args.sessions):
+                db = NuvexaDB(db_name, write_behind=write_behind)
+                handlers.append((db, db.get_or_create_user(f"Session {session}")))
+            results: Dict[str, list] = {'save': [], 'read': [], 'missing': []}
+            lock = threading.Lock()
+            start = threading.Event()
+            threads = [
+                threading.Thread(target=run_session, args=(db, user_id, args.turns, start, results, lock))
+                for db, user_id in handlers
+            ]
+            for thread in threads:
+                thread.start()
+            began = time.perf_counter()
+            start.set()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - began
+            handlers[0][0].close()
+        
+        label = 'write-behind' if write_behind else 'inline'
+        print(f"{label:<12} {elapsed:6.2f}s   missing on read-back {sum(results['missing'])}")
+        for kind in ('save', 'read'):
+            values = results[kind]
+            print(f"             {kind:<5} p50 {percentile(values, 0.5) * 1000:7.3f} ms   "
+                  f"p95 {percentile(values, 0.95) * 1000:7.3f} ms   p99 {percentile(values, 0.99) * 1000:7.3f} ms")
+
+if __name__ == '__main__':
+    main()
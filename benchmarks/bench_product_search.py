@@ -0,0 +1,79 @@
+"""Benchmark structured product queries on indexed filters against scanning the whole catalog.
+
+Usage: python benchmarks/bench_product_search.py [--copies 2000] [--rounds 200]
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shopping import ShoppingEngine
+
+QUERIES = [
+    "headphones under $300 from amazon",
+    "laptop between $1,000 and $1,500",
+    "phone 4.7+ stars at samsung",
+    "anything under $15",
+    "collagen from target",
+]
+
+def grow_catalog(engine: ShoppingEngine, copies: int):
+    """Replicate every product with varied names, prices and ratings, then reindex."""
+    for category, products in engine.products.items():
+        grown = []
+        for i in range(copies):
+            for product in products:
+                item = copy.copy(product)
+                item['name'] = f"{product['name']} #{i}"
+                item['price'] = round(product['price'] * (0.5 + (i % 100) / 100), 2)
+                item['rating'] = round(3.5 + (i % 16) / 10, 1)
+                grown.append(item)
+        engine.products[category] = grown
+    engine.build_indexes()
+
+def scan(engine: ShoppingEngine, text: str):
+    """The same query answered by checking every product against every constraint."""
+    query = engine.parse_query(text)
+    ids = engine._match_terms(query.terms) if query.terms else range(len(engine._catalog))
+    results = []
+    for i in ids:
+        product = engine._catalog[i]
+        if query.min_price is not None and product['price'] < query.min_price:
+            continue
+        if query.max_price is not None and product['price'] > query.max_price:
+            continue
+        if query.min_rating is not None and product['rating'] < query.min_rating:
+            continue
+        if query.sources and product['source'].lower() not in query.sources:
+            continue
+        results.append(product)
+    return results[:10]
+
+def time_per_query(fn, rounds: int) -> float:
+    """Microseconds per query."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in QUERIES:
+            fn(text)
+    return (time.perf_counter() - start) / (rounds * len(QUERIES)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--copies', type=int, default=2000, help="Copies of each catalog product")
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+    
+    engine = ShoppingEngine()
+    grow_catalog(engine, args.copies)
+    print(f"catalog: {len(engine._catalog)} products")
+    for text in QUERIES:
+        print(f"  {text!r}: {engine.parse_query(text)}")
+    
+    print(f"scan:    {time_per_query(lambda text: scan(engine, text), args.rounds):10.1f} us/query")
+    print(f"indexed: {time_per_query(engine.search_products, args.rounds):10.1f} us/query")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Benchmark SemanticCache lookup latency at different index sizes.
+
+Usage: python benchmarks/bench_semantic_cache.py [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache
+
+QUERIES = [
+    "find me some wireless headphones",
+    "I want to buy a laptop for programming",
+    "looking for coconut water",
+    "what's the best phone under $800",
+]
+
+def fill_index(cache: SemanticCache, mode: str, size: int) -> None:
+    """Fill a mode index with random unit vectors (embedding cost is measured separately)."""
+    index = cache._get_index(mode)
+    index.reserve(size)
+    rng = np.random.default_rng(0)
+    chunk = 100_000
+    for start in range(0, size, chunk):
+        block = rng.standard_normal((min(chunk, size - start), cache.vectorizer.dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        index.vectors[start:start + len(block)] = block
+    index.responses[:size] = ["cached answer"] * size
+    index.size = size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+    
+    probe = SemanticCache(max_entries=1)
+    start = time.perf_counter()
+    for i in range(args.lookups):
+        probe.vectorizer.embed(QUERIES[i % len(QUERIES)])
+    embed_ms = (time.perf_counter() - start) / args.lookups * 1000
+    print(f"embed: {embed_ms:.3f} ms/query (dim={probe.vectorizer.dim})")
+    
+    for size in args.sizes:
+        cache = SemanticCache(max_entries=size)
+        fill_index(cache, 'shopping', size)
+        timings = []
+        for i in range(args.lookups):
+            start = time.perf_counter()
+            cache.get('shopping', QUERIES[i % len(QUERIES)])
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"{size:>9,} entries: lookup p50 {p50:.3f} ms, p95 {p95:.3f} ms")
+        del cache
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Measure time-to-products with the product search run before the chat answer and alongside it.
+
+Usage: python benchmarks/bench_time_to_products.py [--requests 10] [--search-latency 0.15] [--ttft 0.8]
+
+The LLM is the in-process stub server; --search-latency simulates a remote
+catalog lookup. Sequentially, the products panel only renders after the whole
+answer; speculatively it renders when the search finishes.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from assistant import NuvexaAssistant
+from database import NuvexaDB
+from llm_backend import StubBackend
+from rate_limiter import rate_limiter
+from shopping import ShoppingEngine
+from shopping_tools import ShoppingTools
+from speculative import interleave
+from stub_server import StubSettings, start_stub_server
+from usage import usage_recorder
+
+PROMPTS = [
+    "Find me wireless headphones under $400",
+    "I want to buy a laptop for programming",
+    "Looking for the cheapest tablet",
+    "Search for coconut water from Amazon",
+]
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=10)
+    parser.add_argument('--search-latency', type=float, default=0.15, help="Simulated catalog lookup time, seconds")
+    parser.add_argument('--ttft', type=float, default=0.8, help="Stub time to first token, seconds")
+    args = parser.parse_args()
+    
+    server = start_stub_server(StubSettings(ttft=f"fixed:{args.ttft}", tokens_per_second=60,
+                                            output_tokens="fixed:60", seed=0))
+    rate_limiter.rpm = 10_000
+    rate_limiter.tpm = 10_000_000
+    # Keep benchmark traffic out of the app's usage table
+    usage_recorder.enabled = False
+    assistant = NuvexaAssistant(backend=StubBackend(server.url))
+    assistant.set_mode('shopping')
+    
+    engine = ShoppingEngine()
+    execute_query = engine.execute_query
+    
+    def remote_execute_query(*query_args, **query_kwargs):
+        time.sleep(args.search_latency)
+        return execute_query(*query_args, **query_kwargs)
+    engine.execute_query = remote_execute_query
+    
+    sequential, speculative, answers = [], [], []
+    with tempfile.TemporaryDirectory() as tmp:
+        db = NuvexaDB(os.path.join(tmp, 'bench.db'))
+        user_id = db.get_or_create_user("Bench")
+        for i in range(args.requests):
+            prompt = PROMPTS[i % len(PROMPTS)]
+            _, product_query = assistant.analyze_shopping_query(prompt)
+            
+            # Before: search, then the whole answer, then the page shows the products
+            start = time.perf_counter()
+            engine.search_products(product_query)
+            "".join(assistant.chat_stream_with_tools(prompt, [], ShoppingTools(engine, db, user_id)))
+            sequential.append(time.perf_counter() - start)
+            
+            # Now: the search runs alongside the answer and renders when it's ready
+            start = time.perf_counter()
+            shown = []
+            tools = ShoppingTools(engine, db, user_id)
+            stream = interleave(assistant.chat_stream_with_tools(prompt, [], tools),
+                                {tools.prefetch(product_query): lambda products: shown.append(time.perf_counter() - start)})
+            "".join(stream)
+            answers.append(time.perf_counter() - start)
+            speculative.append(shown[0])
+        db.close()
+    server.shutdown()
+    
+    print(f"{args.requests} shopping prompts, search {args.search_latency * 1000:.0f} ms, TTFT {args.ttft * 1000:.0f} ms")
+    for name, values in (("sequential time-to-products", sequential), ("speculative time-to-products", speculative),
+                         ("speculative full answer", answers)):
+        print(f"  {name:<30} p50 {percentile(values, 0.5) * 1000:8.1f} ms   p95 {percentile(values, 0.95) * 1000:8.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import threading
+from typing import Optional, List, Tuple, Dict, Any
+from config import MODES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES
+from database import NuvexaDB
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def _normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different prompts share a key."""
+    return " ".join(text.split())
+
+def make_cache_key(model: str, mode: str, user_message: str,
+                   conversation_history: Optional[List[Tuple[str, str]]] = None,
+                   temperature: float = 0.7) -> str:
+    """Hash a chat request into a stable cache key."""
+    history = [
+        [role, _normalize_text(content)]
+        for role, content in (conversation_history or [])
+        if role in ["user", "assistant", "summary"] and content
+    ]
+    payload = {
+        'model': model,
+        'system_prompt': MODES[mode]['system_prompt'],
+        'history': history,
+        'message': _normalize_text(user_message),
+        'temperature': temperature
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """Exact-match LLM response cache stored in the NUVEXA database."""
+    
+    def __init__(self, db: NuvexaDB, ttl_seconds: float = RESPONSE_CACHE_TTL,
+                 max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        """Initialize the cache on top of a database handler."""
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+    
+    def get(self, cache_key: str) -> Optional[str]:
+        """Get a cached response, counting the hit or miss."""
+        response = self.db.get_cached_response(cache_key, self.ttl_seconds)
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+    
+    def put(self, cache_key: str, mode: str, model: str, response: str) -> bool:
+        """Store a response under a cache key."""
+        return self.db.put_cached_response(
+            cache_key, mode, model, response, self.ttl_seconds, self.max_entries
+        )
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get this process's hit/miss counters plus shared table totals."""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        stats = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / lookups if lookups else 0.0
+        }
+        stats.update(self.db.get_response_cache_stats())
+        return stats
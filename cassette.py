@@ -0,0 +1,459 @@
+"""Record and replay chat completion calls for reproducible benchmarks.
+
+A cassette is a JSONL file (gzip-compressed if the name ends in .gz) with one
+entry per completion call: the request key, status, rate limit headers,
+timing, and either the response text, the streamed chunks with their
+offsets, or the error message and API error code. RecordingBackend wraps another backend and appends to a cassette;
+ReplayBackend answers from one at recorded speed, scaled, or instantly.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+from llm_backend import LLMBackend
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RECORDED_HEADER_PREFIXES = ('x-ratelimit-', 'retry-after')
+
+def request_key(kwargs: Dict[str, Any]) -> str:
+    """Key identifying a completion request by everything that affects its answer."""
+    payload = {name: kwargs.get(name) for name in ('model', 'messages', 'temperature', 'max_tokens', 'stream')}
+    payload['stream'] = bool(payload['stream'])
+    # Only present for tool-calling requests, so other keys are unchanged
+    for name in ('tools', 'tool_choice'):
+        if kwargs.get(name) is not None:
+            payload[name] = kwargs[name]
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:32]
+
+def _open_cassette(path: str, mode: str):
+    """Open a cassette for text reading or appending, gzip-compressed for .gz names."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def _recorded_headers(headers: Any) -> Dict[str, str]:
+    """Keep only the headers the rate limit scheduler reads."""
+    return {name.lower(): value for name, value in (headers or {}).items()
+            if name.lower().startswith(RECORDED_HEADER_PREFIXES)}
+
+def _request_summary(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Short, human-readable description of a request for browsing cassettes."""
+    messages = kwargs.get('messages') or []
+    return {
+        'key': request_key(kwargs),
+        'model': kwargs.get('model'),
+        'stream': bool(kwargs.get('stream')),
+        'prompt': str(messages[-1].get('content', ''))[:80] if messages else ''
+    }
+
+class CassetteMiss(Exception):
+    """Raised during replay when a request has no recorded response."""
+
+class ReplayedAPIError(Exception):
+    """API error replayed from a cassette, with the attributes retry and fallback logic read."""
+    
+    def __init__(self, status_code: int, message: str, headers: Dict[str, str], code: Optional[str] = None):
+        """Initialize the error like an openai.APIStatusError; `message` is the recorded str(error)."""
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.response = SimpleNamespace(headers=headers)
+
+class _RawResponse:
+    """Stand-in for the SDK's raw response: headers plus parse()."""
+    
+    def __init__(self, headers: Any, parsed: Any):
+        """Wrap headers and the parsed result."""
+        self.headers = headers
+        self._parsed = parsed
+    
+    def parse(self) -> Any:
+        """Return the parsed completion or stream."""
+        return self._parsed
+
+def _tool_call_dicts(tool_calls: Any) -> Optional[List[Dict[str, Any]]]:
+    """Plain dicts for a message's tool calls, or None if it has none."""
+    if not tool_calls:
+        return None
+    return [{'id': call.id, 'type': 'function',
+             'function': {'name': call.function.name, 'arguments': call.function.arguments}}
+            for call in tool_calls]
+
+def _client(completions: Any) -> Any:
+    """Build a client exposing `chat.completions.with_raw_response.create`."""
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(with_raw_response=completions)))
+
+class CassetteWriter:
+    """Appends entries to a cassette file; safe to share between threads."""
+    
+    def __init__(self, path: str):
+        """Initialize the writer for a cassette path."""
+        self.path = path
+        self.entries = 0
+        self._lock = threading.Lock()
+    
+    def write(self, entry: Dict[str, Any]):
+        """Append one entry."""
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n"
+        with self._lock:
+            with _open_cassette(self.path, 'a') as f:
+                f.write(line)
+            self.entries += 1
+
+class _StreamRecorder:
+    """Collects streamed chunks with their offsets from the request start."""
+    
+    def __init__(self, writer: CassetteWriter, kwargs: Dict[str, Any], headers: Dict[str, str], start: float):
+        """Initialize an empty recording."""
+        self.writer = writer
+        self.entry = dict(_request_summary(kwargs), status=200, headers=headers, chunks=[])
+        self.start = start
+        self.finish_reason = None
+        self.tool_calls: Dict[int, Dict[str, Any]] = {}
+        self.written = False
+    
+    def add(self, chunk: Any):
+        """Record one chunk."""
+        self.entry.setdefault('response_model', getattr(chunk, 'model', None))
+        usage = getattr(chunk, 'usage', None)
+        if usage is not None and hasattr(usage, 'model_dump'):
+            self.entry['usage'] = usage.model_dump()
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        if choice.delta.content:
+            self.entry['chunks'].append([round(time.monotonic() - self.start, 4), choice.delta.content])
+        for call in choice.delta.tool_calls or ():
+            # Tool calls arrive in fragments; they are replayed whole
+            recorded = self.tool_calls.setdefault(call.index, {'id': '', 'type': 'function',
+                                                               'function': {'name': '', 'arguments': ''}})
+            recorded['id'] = call.id or recorded['id']
+            if call.function:
+                recorded['function']['name'] += call.function.name or ''
+                recorded['function']['arguments'] += call.function.arguments or ''
+        self.finish_reason = choice.finish_reason or self.finish_reason
+    
+    def save(self):
+        """Write the recording once, complete or not."""
+        if self.written:
+            return
+        self.written = True
+        self.entry['elapsed'] = round(time.monotonic() - self.start, 4)
+        self.entry['finish_reason'] = self.finish_reason
+        if self.tool_calls:
+            self.entry['tool_calls'] = [self.tool_calls[index] for index in sorted(self.tool_calls)]
+        self.writer.write(self.entry)
+
+class _RecordedAsyncStream:
+    """Async stream wrapper that records chunks as they pass through."""
+    
+    def __init__(self, stream: Any, recorder: _StreamRecorder):
+        """Wrap an SDK async stream."""
+        self._stream = stream
+        self._recorder = recorder
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> Any:
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._recorder.save()
+            raise
+        self._recorder.add(chunk)
+        return chunk
+    
+    async def close(self):
+        """Save what was received and close the underlying stream."""
+        self._recorder.save()
+        if hasattr(self._stream, 'close'):
+            await self._stream.close()
+
+class _RecordingCompletions:
+    """`with_raw_response` proxy that records every call."""
+    
+    def __init__(self, inner: Any, writer: CassetteWriter, is_async: bool):
+        """Wrap the inner client's `chat.completions.with_raw_response`."""
+        self.inner = inner
+        self.writer = writer
+        self.is_async = is_async
+    
+    def _error_entry(self, kwargs: Dict[str, Any], error: Exception, start: float) -> Dict[str, Any]:
+        """Entry for a failed call; errors without a status are recorded as status 0."""
+        response = getattr(error, 'response', None)
+        return dict(
+            _request_summary(kwargs),
+            status=getattr(error, 'status_code', None) or 0,
+            headers=_recorded_headers(getattr(response, 'headers', None)),
+            error=str(error),
+            code=getattr(error, 'code', None),
+            elapsed=round(time.monotonic() - start, 4)
+        )
+    
+    def _completion_entry(self, kwargs: Dict[str, Any], completion: Any, headers: Dict[str, str], start: float) -> Dict[str, Any]:
+        """Entry for a non-streamed completion."""
+        choice = completion.choices[0] if completion.choices else None
+        usage = getattr(completion, 'usage', None)
+        return dict(
+            _request_summary(kwargs),
+            status=200,
+            headers=headers,
+            elapsed=round(time.monotonic() - start, 4),
+            response_model=completion.model,
+            content=choice.message.content if choice else None,
+            tool_calls=_tool_call_dicts(choice.message.tool_calls) if choice else None,
+            finish_reason=choice.finish_reason if choice else None,
+            usage=usage.model_dump() if usage is not None and hasattr(usage, 'model_dump') else None
+        )
+    
+    def _record_stream(self, stream: Any, recorder: _StreamRecorder) -> Iterator[Any]:
+        """Pass chunks through while recording them."""
+        try:
+            for chunk in stream:
+                recorder.add(chunk)
+                yield chunk
+        finally:
+            recorder.save()
+    
+    def create(self, **kwargs) -> Any:
+        """Send the request through the inner client and record the outcome."""
+        if self.is_async:
+            return self._acreate(**kwargs)
+        start = time.monotonic()
+        try:
+            raw = self.inner.create(**kwargs)
+        except Exception as e:
+            self.writer.write(self._error_entry(kwargs, e, start))
+            raise
+        headers = _recorded_headers(raw.headers)
+        if kwargs.get('stream'):
+            recorder = _StreamRecorder(self.writer, kwargs, headers, start)
+            return _RawResponse(raw.headers, self._record_stream(raw.parse(), recorder))
+        completion = raw.parse()
+        self.writer.write(self._completion_entry(kwargs, completion, headers, start))
+        return _RawResponse(raw.headers, completion)
+    
+    async def _acreate(self, **kwargs) -> Any:
+        """Async counterpart of create()."""
+        start = time.monotonic()
+        try:
+            raw = await self.inner.create(**kwargs)
+        except Exception as e:
+            self.writer.write(self._error_entry(kwargs, e, start))
+            raise
+        headers = _recorded_headers(raw.headers)
+        if kwargs.get('stream'):
+            recorder = _StreamRecorder(self.writer, kwargs, headers, start)
+            return _RawResponse(raw.headers, _RecordedAsyncStream(raw.parse(), recorder))
+        completion = raw.parse()
+        self.writer.write(self._completion_entry(kwargs, completion, headers, start))
+        return _RawResponse(raw.headers, completion)
+
+class RecordingBackend:
+    """Backend that records every completion call of another backend to a cassette."""
+    
+    name = 'record'
+    
+    def __init__(self, path: str, inner: LLMBackend):
+        """Initialize the backend around the backend whose calls are recorded."""
+        self.inner = inner
+        self.requires_api_key = inner.requires_api_key
+        self.writer = CassetteWriter(path)
+    
+    def create_client(self, api_key: Optional[str]) -> Any:
+        """Create a recording blocking client."""
+        inner = self.inner.create_client(api_key)
+        return _client(_RecordingCompletions(inner.chat.completions.with_raw_response, self.writer, False))
+    
+    def create_async_client(self, api_key: Optional[str]) -> Any:
+        """Create a recording async client."""
+        inner = self.inner.create_async_client(api_key)
+        return _client(_RecordingCompletions(inner.chat.completions.with_raw_response, self.writer, True))
+
+class CassettePlayer:
+    """Recorded entries indexed by request key, replayed in recording order."""
+    
+    def __init__(self, path: str, speed: float = 1.0):
+        """Load a cassette; speed scales recorded delays (2.0 is twice as fast, 0 means no delays)."""
+        self.speed = speed
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._positions: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with _open_cassette(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry['key']].append(entry)
+        logger.info(f"Loaded {sum(len(e) for e in self._entries.values())} cassette entries from {path}")
+    
+    def delay(self, seconds: float) -> float:
+        """Scale a recorded delay by the replay speed."""
+        return seconds / self.speed if self.speed > 0 else 0.0
+    
+    def next_entry(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Next recorded entry for a request; the last one repeats once they run out."""
+        key = request_key(kwargs)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for {kwargs.get('model')} request {key}")
+            position = self._positions[key]
+            self._positions[key] = position + 1
+            self.hits += 1
+            return entries[min(position, len(entries) - 1)]
+
+def _completion_from_entry(entry: Dict[str, Any]) -> ChatCompletion:
+    """Rebuild a ChatCompletion from a recorded entry."""
+    return ChatCompletion.model_validate({
+        'id': f"chatcmpl-replay-{entry['key'][:12]}",
+        'object': 'chat.completion',
+        'created': 0,
+        'model': entry.get('response_model') or entry.get('model'),
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': entry.get('content'), 'tool_calls': entry.get('tool_calls')},
+            'finish_reason': entry.get('finish_reason') or 'stop'
+        }],
+        'usage': entry.get('usage')
+    })
+
+def _usage_chunk_from_entry(entry: Dict[str, Any]) -> ChatCompletionChunk:
+    """Rebuild the final streamed chunk carrying token usage."""
+    return ChatCompletionChunk.model_validate({
+        'id': f"chatcmpl-replay-{entry['key'][:12]}",
+        'object': 'chat.completion.chunk',
+        'created': 0,
+        'model': entry.get('response_model') or entry.get('model'),
+        'choices': [],
+        'usage': entry['usage']
+    })
+
+def _chunk_from_entry(entry: Dict[str, Any], content: Optional[str], finish_reason: Optional[str] = None,
+                      tool_calls: Optional[List[Dict[str, Any]]] = None) -> ChatCompletionChunk:
+    """Rebuild one streamed chunk from a recorded entry."""
+    delta: Dict[str, Any] = {'content': content}
+    if tool_calls:
+        delta['tool_calls'] = [dict(call, index=index) for index, call in enumerate(tool_calls)]
+    return ChatCompletionChunk.model_validate({
+        'id': f"chatcmpl-replay-{entry['key'][:12]}",
+        'object': 'chat.completion.chunk',
+        'created': 0,
+        'model': entry.get('response_model') or entry.get('model'),
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+    })
+
+class _ReplayAsyncStream:
+    """Async stream of recorded chunks, paced by their offsets."""
+    
+    def __init__(self, player: CassettePlayer, entry: Dict[str, Any], start: float):
+        """Initialize the stream at the first chunk."""
+        self._player = player
+        self._entry = entry
+        self._start = start
+        self._index = 0
+        self._finished = False
+        self._usage_sent = False
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> Any:
+        chunks = self._entry['chunks']
+        if self._index < len(chunks):
+            offset, content = chunks[self._index]
+            self._index += 1
+            wait = self._start + self._player.delay(offset) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            return _chunk_from_entry(self._entry, content)
+        if self._index == len(chunks) and self._entry.get('tool_calls'):
+            self._index += 1
+            return _chunk_from_entry(self._entry, None, tool_calls=self._entry['tool_calls'])
+        if not self._finished and self._entry.get('finish_reason'):
+            self._finished = True
+            return _chunk_from_entry(self._entry, None, self._entry['finish_reason'])
+        if self._entry.get('usage') and not self._usage_sent:
+            self._usage_sent = True
+            return _usage_chunk_from_entry(self._entry)
+        raise StopAsyncIteration
+    
+    async def close(self):
+        """Nothing to release."""
+
+class _ReplayCompletions:
+    """`with_raw_response` stand-in that answers from a cassette."""
+    
+    def __init__(self, player: CassettePlayer, is_async: bool):
+        """Initialize with the shared player."""
+        self.player = player
+        self.is_async = is_async
+    
+    def _replay_stream(self, entry: Dict[str, Any], start: float) -> Iterator[Any]:
+        """Yield recorded chunks, paced by their offsets."""
+        for offset, content in entry['chunks']:
+            wait = start + self.player.delay(offset) - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            yield _chunk_from_entry(entry, content)
+        if entry.get('tool_calls'):
+            yield _chunk_from_entry(entry, None, tool_calls=entry['tool_calls'])
+        if entry.get('finish_reason'):
+            yield _chunk_from_entry(entry, None, entry['finish_reason'])
+        if entry.get('usage'):
+            yield _usage_chunk_from_entry(entry)
+    
+    def create(self, **kwargs) -> Any:
+        """Replay the next recorded response for the request."""
+        entry = self.player.next_entry(kwargs)
+        if self.is_async:
+            return self._acreate(entry)
+        start = time.monotonic()
+        if entry['status'] != 200:
+            time.sleep(self.player.delay(entry.get('elapsed', 0)))
+            raise ReplayedAPIError(entry['status'], entry.get('error', ''), entry.get('headers', {}), entry.get('code'))
+        if 'chunks' in entry:
+            return _RawResponse(entry.get('headers', {}), self._replay_stream(entry, start))
+        time.sleep(self.player.delay(entry.get('elapsed', 0)))
+        return _RawResponse(entry.get('headers', {}), _completion_from_entry(entry))
+    
+    async def _acreate(self, entry: Dict[str, Any]) -> Any:
+        """Async counterpart of create()."""
+        start = time.monotonic()
+        if entry['status'] != 200:
+            await asyncio.sleep(self.player.delay(entry.get('elapsed', 0)))
+            raise ReplayedAPIError(entry['status'], entry.get('error', ''), entry.get('headers', {}), entry.get('code'))
+        if 'chunks' in entry:
+            return _RawResponse(entry.get('headers', {}), _ReplayAsyncStream(self.player, entry, start))
+        await asyncio.sleep(self.player.delay(entry.get('elapsed', 0)))
+        return _RawResponse(entry.get('headers', {}), _completion_from_entry(entry))
+
+class ReplayBackend:
+    """Backend that answers completion calls from a recorded cassette."""
+    
+    name = 'replay'
+    requires_api_key = False
+    
+    def __init__(self, path: str, speed: float = 1.0):
+        """Initialize the backend from a cassette file."""
+        self.player = CassettePlayer(path, speed)
+    
+    def create_client(self, api_key: Optional[str]) -> Any:
+        """Create a replaying blocking client."""
+        return _client(_ReplayCompletions(self.player, False))
+    
+    def create_async_client(self, api_key: Optional[str]) -> Any:
+        """Create a replaying async client."""
+        return _client(_ReplayCompletions(self.player, True))
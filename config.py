@@ -79,24 +79,40 @@ MODES = {
         'name': 'Assistant',
         'icon': '🤖',
         'description': 'General help, planning, and research',
+        'stateless': False,
+        'history_token_budget': 2000,
+        'summarize': False,
+        'routing': {'models': ['gpt-4o', 'gpt-4', 'gpt-3.5-turbo'], 'max_tokens': 800, 'temperature': 0.7, 'timeout': 60, 'hedge_after': 3.0},
         'system_prompt': 'You are NUVEXA, a helpful living AI assistant. You help users with tasks, planning, research, and provide actionable advice. You can help users shop, plan projects, and complete tasks. Be friendly, engaging, and proactive.'
     },
     'shopping': {
         'name': 'Shopping',
         'icon': '🛒',
         'description': 'Product search and purchase execution',
+        'stateless': True,
+        'history_token_budget': 1000,
+        'summarize': False,
+        'routing': {'models': ['gpt-4o-mini', 'gpt-3.5-turbo'], 'max_tokens': 500, 'temperature': 0.5, 'timeout': 30, 'hedge_after': 2.0},
         'system_prompt': 'You are NUVEXA in Shopping Mode. Help users find products, compare options, and add items to their cart. Be detailed about product features, prices, and availability. Guide them through the purchase process seamlessly.'
     },
     'therapist': {
         'name': 'Therapist',
         'icon': '💭',
         'description': 'Emotional support and active listening',
+        'stateless': False,
+        'history_token_budget': 3000,
+        'summarize': True,
+        'routing': {'models': ['gpt-4o', 'gpt-4'], 'max_tokens': 700, 'temperature': 0.8, 'timeout': 60, 'hedge_after': 4.0},
         'system_prompt': 'You are NUVEXA in Therapist Mode. Listen actively, empathize deeply, and provide emotional support. Help users process their thoughts and feelings. Be warm, non-judgmental, and supportive. Ask thoughtful questions to help them explore their emotions.'
     },
     'builder': {
         'name': 'Builder',
         'icon': '🏗️',
         'description': 'Visual planning and project simulation',
+        'stateless': False,
+        'history_token_budget': 3000,
+        'summarize': True,
+        'routing': {'models': ['gpt-4o', 'gpt-4', 'gpt-4o-mini'], 'max_tokens': 1500, 'temperature': 0.4, 'timeout': 120, 'hedge_after': 5.0},
         'system_prompt': 'You are NUVEXA in Builder Mode. Help users visualize and plan projects like building a PC, home renovation, or any assembly project. Break down complex projects into steps, recommend parts/materials, and create actionable plans with pricing.'
     }
 }
@@ -110,3 +126,112 @@ AVATAR_STYLES = [
 ]
 
 DB_NAME = 'nuvexa.db'
+
+# SQLite connections are pooled per database file, one per thread, in WAL mode so
+# readers never wait for a writer. Profiles size the page cache (cache_size, negative
+# means KiB) and memory-mapped I/O (mmap_size, bytes) of each connection
+DB_PRAGMA_PROFILES = {
+    'small': {'cache_size': -2000, 'mmap_size': 0},
+    'default': {'cache_size': -16000, 'mmap_size': 64 * 1024 * 1024},
+    'large': {'cache_size': -128000, 'mmap_size': 1024 * 1024 * 1024}
+}
+DB_PRAGMA_PROFILE = os.getenv('NUVEXA_DB_PROFILE', 'default')
+DB_BUSY_TIMEOUT_MS = int(os.getenv('NUVEXA_DB_BUSY_TIMEOUT_MS', '5000'))
+# Connections of finished threads kept open for reuse
+DB_POOL_MAX_IDLE = int(os.getenv('NUVEXA_DB_POOL_MAX_IDLE', '8'))
+
+# Rows per transaction in NuvexaDB's bulk methods (save_messages, add_to_cart_many, import_orders)
+DB_BULK_CHUNK_SIZE = int(os.getenv('NUVEXA_DB_BULK_CHUNK_SIZE', '5000'))
+
+# Write-behind for conversation messages: saves are queued and written in batches of up
+# to N rows at least every interval (seconds); a full queue makes saves wait
+MESSAGE_WRITE_BEHIND = os.getenv('NUVEXA_MESSAGE_WRITE_BEHIND', '1') == '1'
+MESSAGE_BATCH_SIZE = int(os.getenv('NUVEXA_MESSAGE_BATCH_SIZE', '100'))
+MESSAGE_FLUSH_INTERVAL = float(os.getenv('NUVEXA_MESSAGE_FLUSH_INTERVAL', '0.2'))
+MESSAGE_QUEUE_SIZE = int(os.getenv('NUVEXA_MESSAGE_QUEUE_SIZE', '10000'))
+MESSAGE_WRITE_RETRIES = 3
+
+# Conversation history sent to the model, in estimated tokens, for modes without their own budget
+DEFAULT_HISTORY_TOKEN_BUDGET = 2000
+
+# Rolling summaries for modes with 'summarize': fold older turns once the
+# un-summarized tail exceeds the trigger, keeping the newest turns verbatim
+SUMMARY_TRIGGER_TOKENS = int(os.getenv('NUVEXA_SUMMARY_TRIGGER_TOKENS', '1500'))
+SUMMARY_KEEP_RECENT_TOKENS = int(os.getenv('NUVEXA_SUMMARY_KEEP_RECENT_TOKENS', '600'))
+SUMMARY_MAX_FOLD_TOKENS = 4000
+SUMMARY_MAX_TOKENS = 400
+
+# Async engine: max in-flight LLM calls per process and the per-request deadline (seconds)
+# for modes without a 'timeout' in their routing profile
+LLM_MAX_CONCURRENCY = int(os.getenv('NUVEXA_LLM_MAX_CONCURRENCY', '16'))
+LLM_REQUEST_TIMEOUT = float(os.getenv('NUVEXA_LLM_REQUEST_TIMEOUT', '60'))
+
+# HTTP connections to the LLM API, pooled and shared by every session in the process:
+# pool size, idle connections kept alive and for how long (seconds), connect timeout,
+# HTTP/2 (needs the h2 package) and the timeout of the startup pre-warm request
+LLM_MAX_CONNECTIONS = int(os.getenv('NUVEXA_LLM_MAX_CONNECTIONS', '200'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('NUVEXA_LLM_MAX_KEEPALIVE_CONNECTIONS', '50'))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('NUVEXA_LLM_KEEPALIVE_EXPIRY', '30'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('NUVEXA_LLM_CONNECT_TIMEOUT', '5'))
+LLM_HTTP2 = os.getenv('NUVEXA_LLM_HTTP2', '1') == '1'
+LLM_PREWARM_TIMEOUT = 10.0
+
+# Model circuit breaker: open after N consecutive model errors, probe again after cooldown (seconds)
+MODEL_BREAKER_FAILURE_THRESHOLD = int(os.getenv('NUVEXA_MODEL_BREAKER_THRESHOLD', '3'))
+MODEL_BREAKER_COOLDOWN = float(os.getenv('NUVEXA_MODEL_BREAKER_COOLDOWN', '300'))
+
+# Hedged requests: when the first model of a mode's routing profile hasn't sent a first
+# token within the profile's 'hedge_after' seconds, the request also goes to the next
+# model and the first to answer wins. Off by default since hedges cost extra tokens
+HEDGING_ENABLED = os.getenv('NUVEXA_HEDGING', '0') == '1'
+
+# Client-side rate limiting per model: default budgets until x-ratelimit-* headers arrive,
+# longest queue wait before giving up, and 429/5xx retry backoff (seconds)
+RATE_LIMIT_RPM = float(os.getenv('NUVEXA_RATE_LIMIT_RPM', '500'))
+RATE_LIMIT_TPM = float(os.getenv('NUVEXA_RATE_LIMIT_TPM', '30000'))
+RATE_LIMIT_MAX_QUEUE_DELAY = float(os.getenv('NUVEXA_RATE_LIMIT_MAX_QUEUE_DELAY', '20'))
+RATE_LIMIT_MAX_RETRIES = int(os.getenv('NUVEXA_RATE_LIMIT_MAX_RETRIES', '4'))
+RATE_LIMIT_BACKOFF_BASE = 0.5
+RATE_LIMIT_BACKOFF_MAX = 20.0
+
+# Exact-match LLM response cache (stored in DB_NAME, shared across processes)
+RESPONSE_CACHE_ENABLED = os.getenv('NUVEXA_RESPONSE_CACHE', '1') == '1'
+RESPONSE_CACHE_TTL = float(os.getenv('NUVEXA_RESPONSE_CACHE_TTL', str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('NUVEXA_RESPONSE_CACHE_MAX_ENTRIES', '5000'))
+
+# Opt-in semantic (near-duplicate) prompt cache for modes marked 'stateless'
+SEMANTIC_CACHE_ENABLED = os.getenv('NUVEXA_SEMANTIC_CACHE', '0') == '1'
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv('NUVEXA_SEMANTIC_CACHE_THRESHOLD', '0.9'))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('NUVEXA_SEMANTIC_CACHE_MAX_ENTRIES', '10000'))
+SEMANTIC_CACHE_DIM = 512
+
+# LLM backend: 'openai' (optionally any OpenAI-compatible base URL), 'stub' for the
+# local stub server in stub_server.py, or 'record'/'replay' with a cassette file
+LLM_BACKEND = os.getenv('NUVEXA_LLM_BACKEND', 'openai')
+LLM_BASE_URL = os.getenv('NUVEXA_LLM_BASE_URL') or None
+STUB_SERVER_URL = os.getenv('NUVEXA_STUB_SERVER_URL', 'http://127.0.0.1:8765/v1')
+
+# Cassette for the 'record' backend (wrapping NUVEXA_LLM_RECORD_BACKEND) and the 'replay'
+# backend; replay speed scales recorded delays (0 = no delays)
+LLM_CASSETTE = os.getenv('NUVEXA_LLM_CASSETTE', 'nuvexa_cassette.jsonl')
+LLM_RECORD_BACKEND = os.getenv('NUVEXA_LLM_RECORD_BACKEND', 'openai')
+LLM_REPLAY_SPEED = float(os.getenv('NUVEXA_LLM_REPLAY_SPEED', '1.0'))
+
+# Optional JSON file overriding the MODES routing profiles, e.g.
+# {"shopping": {"models": ["gpt-4o-mini"], "max_tokens": 400}}; re-read when it changes
+ROUTING_OVERRIDES_FILE = os.getenv('NUVEXA_ROUTING_FILE', str(BASE_DIR / 'routing.json'))
+ROUTING_RELOAD_INTERVAL = 2.0
+
+# Shopping mode tool calling: most tool-calling rounds per message, and threads
+# running one round's independent tool calls
+SHOPPING_TOOL_ROUNDS = int(os.getenv('NUVEXA_SHOPPING_TOOL_ROUNDS', '3'))
+SHOPPING_TOOL_WORKERS = int(os.getenv('NUVEXA_SHOPPING_TOOL_WORKERS', '4'))
+
+# Threads for lookups started alongside the LLM request, such as the product search
+SPECULATIVE_WORKERS = int(os.getenv('NUVEXA_SPECULATIVE_WORKERS', '4'))
+
+# Per-completion token and latency accounting, written in batches off the request path
+USAGE_TRACKING_ENABLED = os.getenv('NUVEXA_USAGE_TRACKING', '1') == '1'
+USAGE_BATCH_SIZE = int(os.getenv('NUVEXA_USAGE_BATCH_SIZE', '200'))
+USAGE_FLUSH_INTERVAL = float(os.getenv('NUVEXA_USAGE_FLUSH_INTERVAL', '1.0'))
+USAGE_QUEUE_SIZE = int(os.getenv('NUVEXA_USAGE_QUEUE_SIZE', '10000'))
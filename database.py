@@ -1,37 +1,351 @@
+import atexit
+import queue
 import sqlite3
 import json
+import os
+import threading
+import time
 from datetime import datetime
-from typing import List, Tuple, Optional, Dict, Any
+from typing import List, Tuple, Optional, Dict, Any, Iterable, Iterator
 from contextlib import contextmanager
-from config import DB_NAME
+from itertools import islice
+from config import (DB_NAME, DB_PRAGMA_PROFILES, DB_PRAGMA_PROFILE, DB_BUSY_TIMEOUT_MS, DB_POOL_MAX_IDLE,
+                    DB_BULK_CHUNK_SIZE,
+                    MESSAGE_WRITE_BEHIND, MESSAGE_BATCH_SIZE, MESSAGE_FLUSH_INTERVAL, MESSAGE_QUEUE_SIZE,
+                    MESSAGE_WRITE_RETRIES)
+from history import estimate_tokens
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upserts need SQLite 3.24; newer features are used when available, with fallbacks
+MIN_SQLITE_VERSION = (3, 24, 0)
+_HAS_WINDOW_FUNCTIONS = sqlite3.sqlite_version_info >= (3, 25, 0)
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+def _chunks(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Split rows into lists of at most `size`, consuming the iterable lazily."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def _utc_timestamp() -> str:
+    """The current UTC time in CURRENT_TIMESTAMP's format."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+class _Lease:
+    """A thread's hold on a pooled connection, handed back to the pool when the thread ends."""
+    
+    def __init__(self, pool: 'ConnectionPool', conn: sqlite3.Connection):
+        """Hold a connection for the current thread."""
+        self.pool = pool
+        self.conn = conn
+    
+    def __del__(self):
+        """Return the connection once the thread's local storage is cleared."""
+        self.pool._give_back(self.conn)
+
+class ConnectionPool:
+    """Per-thread SQLite connections to one database file, tuned for concurrent sessions.
+    
+    Each thread gets its own connection, so no connection is ever shared by
+    two threads at once. Connections are opened in WAL mode, where readers
+    don't wait for the writer, with a busy timeout instead of immediate
+    "database is locked" errors, synchronous=NORMAL (durable at checkpoints,
+    safe against corruption) and the page cache and mmap size of a pragma
+    profile. When a thread ends its connection goes back to the pool for the
+    next thread, as Streamlit starts a new thread for every script run.
+    """
+    
+    def __init__(self, db_name: str, profile: str = DB_PRAGMA_PROFILE,
+                 busy_timeout_ms: int = DB_BUSY_TIMEOUT_MS, max_idle: int = DB_POOL_MAX_IDLE):
+        """Initialize an empty pool for a database file."""
+        if profile not in DB_PRAGMA_PROFILES:
+            raise ValueError(f"Unknown database profile: {profile}. Available: {', '.join(DB_PRAGMA_PROFILES)}")
+        self.db_name = db_name
+        self.profile = profile
+        self.busy_timeout_ms = busy_timeout_ms
+        self.max_idle = max_idle
+        self.opened = 0
+        self._local = threading.local()
+        self._idle: List[sqlite3.Connection] = []
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self.closed = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection."""
+        conn = sqlite3.connect(self.db_name, check_same_thread=False, timeout=self.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row  # Enable column access by name
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        for pragma, value in DB_PRAGMA_PROFILES[self.profile].items():
+            conn.execute(f'PRAGMA {pragma} = {int(value)}')
+        with self._lock:
+            self.opened += 1
+            self._connections.append(conn)
+        return conn
+    
+    def connection(self) -> sqlite3.Connection:
+        """Get the calling thread's connection, reusing an idle one or opening one if needed."""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            return lease.conn
+        if self.closed:
+            raise sqlite3.ProgrammingError(f"Connection pool for {self.db_name} is closed")
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        self._local.lease = _Lease(self, conn)
+        return conn
+    
+    def _give_back(self, conn: sqlite3.Connection):
+        """Keep a connection no thread holds for reuse, or close it."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            return
+        with self._lock:
+            if not self.closed and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+    
+    def close(self):
+        """Close every connection, including ones threads still hold."""
+        with self._lock:
+            self.closed = True
+            connections, self._connections, self._idle = self._connections, [], []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of connections opened, open and idle."""
+        with self._lock:
+            return {'profile': self.profile, 'opened': self.opened,
+                    'open': len(self._connections), 'idle': len(self._idle)}
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_name: str = DB_NAME, profile: str = DB_PRAGMA_PROFILE) -> ConnectionPool:
+    """Get the process-wide connection pool of a database file."""
+    key = os.path.abspath(db_name)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(db_name, profile)
+            _pools[key] = pool
+        elif pool.profile != profile:
+            logger.warning(f"Database {db_name} already uses the {pool.profile} profile, ignoring {profile}")
+        return pool
+
+# Inserts a conversation message with its token count and the time it was saved
+_INSERT_MESSAGE = '''
+    INSERT INTO conversations (user_id, mode, message, role, token_count, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# Adds a product to a cart, or its quantity to the existing row for that product
+_UPSERT_CART = '''
+    INSERT INTO cart (user_id, product_name, product_price, product_image, product_description, quantity)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, product_name) DO UPDATE SET quantity = quantity + excluded.quantity
+'''
+
+class MessageWriter:
+    """Write-behind queue for the conversation messages of one database file.
+    
+    save() only queues a message, so saving costs no transaction or disk
+    sync on the request path. A background thread writes queued messages in
+    batched executemany transactions once a batch fills up or the flush
+    interval passes. Readers call wait_for() first, which writes any pending
+    messages of that conversation, so a conversation always reads its own
+    writes. On interpreter exit the queue is flushed and the WAL checkpointed.
+    """
+    
+    def __init__(self, pool: ConnectionPool, batch_size: int = MESSAGE_BATCH_SIZE,
+                 flush_interval: float = MESSAGE_FLUSH_INTERVAL, max_queue: int = MESSAGE_QUEUE_SIZE):
+        """Initialize the writer; its thread starts with the first message."""
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        # Queued but unwritten messages per (user_id, mode)
+        self._pending: Dict[Tuple[int, str], int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def save(self, user_id: int, mode: str, message: str, role: str):
+        """Queue a message, waiting only if the queue is full."""
+        self._ensure_started()
+        with self._lock:
+            self._pending[(user_id, mode)] = self._pending.get((user_id, mode), 0) + 1
+        # The time of the save rather than of the write
+        self._queue.put((user_id, mode, message, role, estimate_tokens(message), _utc_timestamp()))
+    
+    def has_pending(self, user_id: int, mode: str) -> bool:
+        """Check if a conversation has queued messages that aren't written yet."""
+        with self._lock:
+            return (user_id, mode) in self._pending
+    
+    def wait_for(self, user_id: int, mode: str, timeout: float = 10.0) -> bool:
+        """Write a conversation's queued messages now, so a read that follows sees them."""
+        if not self.has_pending(user_id, mode):
+            return True
+        return self.flush(timeout)
+    
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Wait until every message queued so far is written."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def close(self, timeout: float = 10.0) -> bool:
+        """Flush the queue and checkpoint the WAL, so every saved message is on disk."""
+        flushed = self.flush(timeout)
+        if self.pool.closed:
+            # NuvexaDB.close() already flushed before closing the pool
+            return flushed
+        try:
+            self.pool.connection().execute('PRAGMA wal_checkpoint(FULL)')
+        except sqlite3.Error as e:
+            logger.error(f"Failed to checkpoint messages: {str(e)}")
+            return False
+        return flushed
+    
+    def _ensure_started(self):
+        """Start the writer thread once."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="nuvexa-message-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+    
+    def _write(self, batch: List[Tuple]) -> bool:
+        """Insert a batch in one transaction, retrying if the database stays locked."""
+        for attempt in range(MESSAGE_WRITE_RETRIES):
+            conn = self.pool.connection()
+            try:
+                with conn:
+                    conn.executemany(_INSERT_MESSAGE, batch)
+                return True
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write {len(batch)} messages (attempt {attempt + 1}): {str(e)}")
+                time.sleep(0.1 * (attempt + 1))
+        return False
+    
+    def _run(self):
+        """Collect messages for up to one flush interval or batch, then write them in one transaction."""
+        while True:
+            batch = []
+            waiters = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    # A flush writes what's queued right away
+                    deadline = 0
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if batch:
+                if self._write(batch):
+                    self.written += len(batch)
+                else:
+                    self.failed += len(batch)
+                    logger.error(f"Lost {len(batch)} conversation messages after {MESSAGE_WRITE_RETRIES} attempts")
+                with self._lock:
+                    for row in batch:
+                        key = (row[0], row[1])
+                        self._pending[key] -= 1
+                        if not self._pending[key]:
+                            del self._pending[key]
+            for waiter in waiters:
+                waiter.set()
+
+_message_writers: Dict[str, MessageWriter] = {}
+
+def get_message_writer(pool: ConnectionPool) -> MessageWriter:
+    """Get the process-wide message writer of a pool's database file."""
+    key = os.path.abspath(pool.db_name)
+    with _pools_lock:
+        writer = _message_writers.get(key)
+        if writer is None or writer.pool is not pool:
+            writer = MessageWriter(pool)
+            _message_writers[key] = writer
+        return writer
+
 class NuvexaDB:
-    """Database handler for NUVEXA application."""
+    """Database handler for NUVEXA application.
+    
+    Handlers are cheap: every handler of the same file shares one connection
+    pool, and each thread works on its own pooled connection.
+    """
     
-    def __init__(self):
-        """Initialize database connection and create tables."""
-        self.conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row  # Enable column access by name
+    def __init__(self, db_name: str = DB_NAME, profile: str = DB_PRAGMA_PROFILE,
+                 write_behind: bool = MESSAGE_WRITE_BEHIND):
+        """Attach to the database file's connection pool and create tables."""
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"NUVEXA needs SQLite {'.'.join(map(str, MIN_SQLITE_VERSION))} or newer, but this Python "
+                f"comes with SQLite {sqlite3.sqlite_version}. Please install a newer Python (3.8 or later)."
+            )
+        self.pool = get_pool(db_name, profile)
+        # Queues conversation messages instead of writing them on the caller's thread
+        self.message_writer = get_message_writer(self.pool) if write_behind else None
         self.create_tables()
     
-    def __del__(self):
-        """Close database connection on deletion."""
-        if hasattr(self, 'conn'):
-            self.conn.close()
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection."""
+        return self.pool.connection()
+    
+    def close(self):
+        """Write queued messages, then close every pooled connection to this database file."""
+        if self.message_writer:
+            self.message_writer.flush()
+        self.pool.close()
     
     @contextmanager
     def get_cursor(self):
-        """Context manager for database cursor."""
-        cursor = self.conn.cursor()
+        """Context manager for database cursor on the calling thread's connection."""
+        conn = self.pool.connection()
+        cursor = conn.cursor()
         try:
             yield cursor
-            self.conn.commit()
+            conn.commit()
         except Exception as e:
-            self.conn.rollback()
+            conn.rollback()
             logger.error(f"Database error: {str(e)}")
             raise
         finally:
@@ -57,10 +371,19 @@ class NuvexaDB:
                     message TEXT NOT NULL,
                     role TEXT NOT NULL,
                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    token_count INTEGER,
                     FOREIGN KEY (user_id) REFERENCES users(id)
                 )
             ''')
             
+            # Migrate databases created before token counts were cached per message. Checked
+            # under the write lock, so workers starting together don't both add the column.
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('PRAGMA table_info(conversations)')
+            if 'token_count' not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute('ALTER TABLE conversations ADD COLUMN token_count INTEGER')
+            cursor.connection.commit()
+            
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS cart (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -93,9 +416,83 @@ class NuvexaDB:
                 ON conversations(user_id, mode, timestamp)
             ''')
             
+            # One cart row per product, so adds can be a single UPSERT. Databases
+            # from before the key may hold duplicates: merge them into the oldest row,
+            # under the write lock so workers starting together migrate only once.
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('PRAGMA index_list(cart)')
+            if 'idx_cart_user_product' not in [index[1] for index in cursor.fetchall()]:
+                cursor.execute('''
+                    UPDATE cart SET quantity = (
+                        SELECT SUM(duplicate.quantity) FROM cart AS duplicate
+                        WHERE duplicate.user_id IS cart.user_id AND duplicate.product_name = cart.product_name
+                    )
+                    WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_name HAVING COUNT(*) > 1)
+                ''')
+                cursor.execute('''
+                    DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_name)
+                ''')
+                if cursor.rowcount:
+                    logger.info(f"Merged {cursor.rowcount} duplicate cart rows")
+                cursor.execute('''
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_user_product
+                    ON cart(user_id, product_name)
+                ''')
+            # Lookups by user use the unique index's prefix
+            cursor.execute('DROP INDEX IF EXISTS idx_cart_user')
+            cursor.connection.commit()
+            
+            # Exact-match LLM response cache, shared by every process using this file
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_cart_user 
-                ON cart(user_id)
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    mode TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_accessed REAL NOT NULL,
+                    hit_count INTEGER DEFAULT 0
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_response_cache_accessed
+                ON response_cache(last_accessed)
+            ''')
+            
+            # Rolling summary of each conversation up to and including a message id
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    user_id INTEGER NOT NULL,
+                    mode TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    summarized_through_id INTEGER NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (user_id, mode),
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+            
+            # One row per LLM completion attempt; latencies in seconds, created_at is a Unix time
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    mode TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    cached_tokens INTEGER,
+                    ttft REAL,
+                    latency REAL NOT NULL,
+                    outcome TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_usage_created
+                ON usage(created_at)
             ''')
     
     def get_or_create_user(self, name: str = "User") -> int:
@@ -114,23 +511,61 @@ class NuvexaDB:
                 return cursor.lastrowid
     
     def save_message(self, user_id: int, mode: str, message: str, role: str) -> bool:
-        """Save a conversation message."""
+        """Save a conversation message, queued for a batched write when write-behind is on."""
         if not message or not message.strip() or role not in ["user", "assistant"]:
             return False
         
         try:
+            message = message.strip()
+            if self.message_writer:
+                self.message_writer.save(user_id, mode, message, role)
+                return True
             with self.get_cursor() as cursor:
                 cursor.execute('''
-                    INSERT INTO conversations (user_id, mode, message, role)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, mode, message.strip(), role))
+                    INSERT INTO conversations (user_id, mode, message, role, token_count)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (user_id, mode, message, role, estimate_tokens(message)))
             return True
         except Exception as e:
             logger.error(f"Failed to save message: {str(e)}")
             return False
     
+    def save_messages(self, messages: Iterable[Tuple], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+        """Insert (user_id, mode, message, role[, timestamp]) rows in one transaction per chunk.
+        
+        For imports and fixtures: rows save_message would reject are skipped,
+        timestamps (UTC, 'YYYY-MM-DD HH:MM:SS') default to now, and the number
+        of rows saved is returned, including chunks committed before a failure.
+        """
+        if self.message_writer:
+            # Queued messages go in ahead of the imported ones
+            self.message_writer.flush()
+        now = _utc_timestamp()
+        saved = 0
+        try:
+            for chunk in _chunks(messages, chunk_size):
+                rows = []
+                for row in chunk:
+                    user_id, mode, message, role = row[:4]
+                    if not message or not message.strip() or role not in ["user", "assistant"]:
+                        continue
+                    message = message.strip()
+                    rows.append((user_id, mode, message, role, estimate_tokens(message), row[4] if len(row) > 4 else now))
+                with self.get_cursor() as cursor:
+                    cursor.executemany(_INSERT_MESSAGE, rows)
+                saved += len(rows)
+        except Exception as e:
+            logger.error(f"Failed to save messages: {str(e)}")
+        return saved
+    
+    def _read_own_writes(self, user_id: int, mode: str):
+        """Write a conversation's queued messages before it is read."""
+        if self.message_writer and not self.message_writer.wait_for(user_id, mode):
+            logger.warning(f"Queued messages for user {user_id} in {mode} mode not written yet")
+    
     def get_conversation_history(self, user_id: int, mode: str, limit: int = 20) -> List[Tuple[str, str]]:
         """Get conversation history for a user in a specific mode."""
+        self._read_own_writes(user_id, mode)
         with self.get_cursor() as cursor:
             cursor.execute('''
                 SELECT role, message FROM conversations
@@ -141,39 +576,138 @@ class NuvexaDB:
             results = cursor.fetchall()
             return [(row[0], row[1]) for row in reversed(results)]
     
+    def get_conversation_window(self, user_id: int, mode: str, token_budget: int,
+                                after_id: int = 0, page_size: int = 50) -> List[Tuple[str, str, int]]:
+        """Get the newest (role, message, token_count) rows after `after_id` that fit in a token budget, oldest first."""
+        self._read_own_writes(user_id, mode)
+        window = []
+        backfill = []
+        used = 0
+        offset = 0
+        with self.get_cursor() as cursor:
+            while True:
+                cursor.execute('''
+                    SELECT id, role, message, token_count FROM conversations
+                    WHERE user_id = ? AND mode = ? AND id > ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ? OFFSET ?
+                ''', (user_id, mode, after_id, page_size, offset))
+                rows = cursor.fetchall()
+                full = False
+                for row_id, role, message, token_count in rows:
+                    if token_count is None:
+                        # Rows saved before token counts were cached are counted once
+                        token_count = estimate_tokens(message)
+                        backfill.append((token_count, row_id))
+                    if used + token_count > token_budget:
+                        full = True
+                        break
+                    used += token_count
+                    window.append((role, message, token_count))
+                if full or len(rows) < page_size:
+                    break
+                offset += page_size
+            
+            if backfill:
+                cursor.executemany('UPDATE conversations SET token_count = ? WHERE id = ?', backfill)
+        window.reverse()
+        return window
+    
+    def get_messages_after(self, user_id: int, mode: str, after_id: int = 0,
+                           limit: int = 500) -> List[Tuple[int, str, str, int]]:
+        """Get (id, role, message, token_count) rows newer than a message id, oldest first."""
+        self._read_own_writes(user_id, mode)
+        with self.get_cursor() as cursor:
+            cursor.execute('''
+                SELECT id, role, message, token_count FROM conversations
+                WHERE user_id = ? AND mode = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (user_id, mode, after_id, limit))
+            return [
+                (row[0], row[1], row[2], row[3] if row[3] is not None else estimate_tokens(row[2]))
+                for row in cursor.fetchall()
+            ]
+    
+    def get_conversation_summary(self, user_id: int, mode: str) -> Tuple[Optional[str], int]:
+        """Get the rolling summary of a conversation and the last message id it covers."""
+        with self.get_cursor() as cursor:
+            cursor.execute('''
+                SELECT summary, summarized_through_id FROM conversation_summaries
+                WHERE user_id = ? AND mode = ?
+            ''', (user_id, mode))
+            result = cursor.fetchone()
+            return (result[0], result[1]) if result else (None, 0)
+    
+    def save_conversation_summary(self, user_id: int, mode: str, summary: str, summarized_through_id: int) -> bool:
+        """Store the rolling summary of a conversation, never moving it backwards."""
+        if not summary or not summary.strip():
+            return False
+        
+        try:
+            with self.get_cursor() as cursor:
+                cursor.execute('''
+                    INSERT INTO conversation_summaries (user_id, mode, summary, summarized_through_id)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id, mode) DO UPDATE SET
+                        summary = excluded.summary,
+                        summarized_through_id = excluded.summarized_through_id,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE excluded.summarized_through_id > conversation_summaries.summarized_through_id
+                ''', (user_id, mode, summary.strip(), summarized_through_id))
+                return cursor.rowcount > 0
+        except Exception as e:
+            logger.error(f"Failed to save conversation summary: {str(e)}")
+            return False
+    
     def add_to_cart(self, user_id: int, product_name: str, product_price: float, 
                     product_image: str = "", product_description: str = "", quantity: int = 1) -> Optional[int]:
-        """Add item to cart or update quantity if already exists."""
-        if not product_name or product_price < 0 or quantity < 1:
+        """Add item to cart or update quantity if already exists, in one statement."""
+        # NULLs never conflict in the unique key, so a cart needs a user
+        if user_id is None or not product_name or product_price < 0 or quantity < 1:
             return None
         
         try:
             with self.get_cursor() as cursor:
-                # Check if item already exists in cart
-                cursor.execute('''
-                    SELECT id, quantity FROM cart 
-                    WHERE user_id = ? AND product_name = ?
-                ''', (user_id, product_name))
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update quantity
-                    new_quantity = existing[1] + quantity
-                    cursor.execute('''
-                        UPDATE cart SET quantity = ? WHERE id = ?
-                    ''', (new_quantity, existing[0]))
-                    return existing[0]
+                row = (user_id, product_name, product_price, product_image, product_description, quantity)
+                if _HAS_RETURNING:
+                    cursor.execute(_UPSERT_CART + ' RETURNING id', row)
                 else:
-                    # Insert new item
-                    cursor.execute('''
-                        INSERT INTO cart (user_id, product_name, product_price, product_image, product_description, quantity)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    ''', (user_id, product_name, product_price, product_image, product_description, quantity))
-                    return cursor.lastrowid
+                    # lastrowid isn't set when the upsert updates, so look the row up in the same transaction
+                    cursor.execute(_UPSERT_CART, row)
+                    cursor.execute('SELECT id FROM cart WHERE user_id = ? AND product_name = ?', (user_id, product_name))
+                return cursor.fetchone()[0]
         except Exception as e:
             logger.error(f"Failed to add to cart: {str(e)}")
             return None
     
+    def add_to_cart_many(self, user_id: int, items: Iterable[Dict[str, Any]], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+        """Add products to a cart in one transaction per chunk, as add_to_cart would one at a time.
+        
+        Items are product dicts with 'name' and 'price' and optionally 'image',
+        'description' and 'quantity'. Invalid items are skipped; returns the
+        number of items added.
+        """
+        added = 0
+        if user_id is None:
+            return added
+        try:
+            for chunk in _chunks(items, chunk_size):
+                rows = []
+                for item in chunk:
+                    name = item.get('name')
+                    price = item.get('price')
+                    quantity = int(item.get('quantity', 1))
+                    if not name or price is None or price < 0 or quantity < 1:
+                        continue
+                    rows.append((user_id, name, price, item.get('image', ''), item.get('description', ''), quantity))
+                with self.get_cursor() as cursor:
+                    cursor.executemany(_UPSERT_CART, rows)
+                added += len(rows)
+        except Exception as e:
+            logger.error(f"Failed to add items to cart: {str(e)}")
+        return added
+    
     def get_cart_items(self, user_id: int) -> List[Tuple]:
         """Get all items in user's cart."""
         with self.get_cursor() as cursor:
@@ -184,6 +718,31 @@ class NuvexaDB:
             ''', (user_id,))
             return cursor.fetchall()
     
+    def get_cart_summary(self, user_id: int) -> Dict[str, Any]:
+        """Get a cart's items (as get_cart_items returns them), item count and total in one query."""
+        if not _HAS_WINDOW_FUNCTIONS:
+            # SQLite < 3.25: the same rows, summed here
+            items = [tuple(row) for row in self.get_cart_items(user_id)]
+            return {
+                'items': items,
+                'item_count': sum(item[5] for item in items),
+                'total': sum(item[2] * item[5] for item in items) if items else 0.0
+            }
+        with self.get_cursor() as cursor:
+            cursor.execute('''
+                SELECT id, product_name, product_price, product_image, product_description, quantity,
+                       SUM(quantity) OVER () AS item_count,
+                       SUM(product_price * quantity) OVER () AS total
+                FROM cart WHERE user_id = ?
+                ORDER BY added_at DESC
+            ''', (user_id,))
+            rows = cursor.fetchall()
+        return {
+            'items': [tuple(row)[:6] for row in rows],
+            'item_count': rows[0]['item_count'] if rows else 0,
+            'total': rows[0]['total'] if rows else 0.0
+        }
+    
     def update_cart_quantity(self, cart_id: int, quantity: int) -> bool:
         """Update quantity of a cart item."""
         if quantity < 1:
@@ -233,6 +792,32 @@ class NuvexaDB:
             logger.error(f"Failed to create order: {str(e)}")
             return None
     
+    def import_orders(self, orders: Iterable[Dict[str, Any]], chunk_size: int = DB_BULK_CHUNK_SIZE) -> int:
+        """Insert orders in one transaction per chunk, e.g. to import order history.
+        
+        Orders are dicts with 'user_id', 'items' and 'total_amount' and
+        optionally 'status' and 'created_at' (UTC, 'YYYY-MM-DD HH:MM:SS').
+        Orders create_order would reject are skipped; returns the number imported.
+        """
+        now = _utc_timestamp()
+        imported = 0
+        try:
+            for chunk in _chunks(orders, chunk_size):
+                rows = [
+                    (order['user_id'], json.dumps(order['items']), order['total_amount'],
+                     order.get('status', 'completed'), order.get('created_at', now))
+                    for order in chunk if order.get('items') and order.get('total_amount', -1) >= 0
+                ]
+                with self.get_cursor() as cursor:
+                    cursor.executemany('''
+                        INSERT INTO orders (user_id, items, total_amount, status, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', rows)
+                imported += len(rows)
+        except Exception as e:
+            logger.error(f"Failed to import orders: {str(e)}")
+        return imported
+    
     def get_user_orders(self, user_id: int, limit: int = 10) -> List[Tuple]:
         """Get user's order history."""
         with self.get_cursor() as cursor:
@@ -264,3 +849,152 @@ class NuvexaDB:
             cursor.execute('SELECT avatar_style FROM users WHERE id = ?', (user_id,))
             result = cursor.fetchone()
             return result[0] if result else 'Stylized Futuristic Human'
+    
+    def get_cached_response(self, cache_key: str, ttl_seconds: float) -> Optional[str]:
+        """Get a cached LLM response if present and not expired, marking it as recently used."""
+        now = time.time()
+        try:
+            with self.get_cursor() as cursor:
+                cursor.execute('''
+                    SELECT response FROM response_cache
+                    WHERE cache_key = ? AND created_at >= ?
+                ''', (cache_key, now - ttl_seconds))
+                result = cursor.fetchone()
+                if not result:
+                    return None
+                cursor.execute('''
+                    UPDATE response_cache SET last_accessed = ?, hit_count = hit_count + 1
+                    WHERE cache_key = ?
+                ''', (now, cache_key))
+                return result[0]
+        except Exception as e:
+            logger.error(f"Failed to read response cache: {str(e)}")
+            return None
+    
+    def put_cached_response(self, cache_key: str, mode: str, model: str, response: str,
+                            ttl_seconds: float, max_entries: int) -> bool:
+        """Store an LLM response, evicting expired and least recently used entries."""
+        if not response:
+            return False
+        
+        now = time.time()
+        try:
+            with self.get_cursor() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO response_cache
+                    (cache_key, mode, model, response, created_at, last_accessed, hit_count)
+                    VALUES (?, ?, ?, ?, ?, ?, 0)
+                ''', (cache_key, mode, model, response, now, now))
+                cursor.execute('DELETE FROM response_cache WHERE created_at < ?', (now - ttl_seconds,))
+                cursor.execute('''
+                    DELETE FROM response_cache WHERE cache_key IN (
+                        SELECT cache_key FROM response_cache
+                        ORDER BY last_accessed DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                ''', (max_entries,))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write response cache: {str(e)}")
+            return False
+    
+    def get_response_cache_stats(self) -> Dict[str, int]:
+        """Get entry count and lifetime hit count of the response cache."""
+        with self.get_cursor() as cursor:
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM response_cache')
+            entries, total_hits = cursor.fetchone()
+            return {'entries': entries, 'total_hits': total_hits}
+    
+    def clear_response_cache(self) -> bool:
+        """Remove all cached LLM responses."""
+        try:
+            with self.get_cursor() as cursor:
+                cursor.execute('DELETE FROM response_cache')
+            return True
+        except Exception as e:
+            logger.error(f"Failed to clear response cache: {str(e)}")
+            return False
+    
+    def record_usage(self, rows: List[Tuple]) -> bool:
+        """Insert usage rows, as queued by UsageRecorder, in one transaction."""
+        try:
+            with self.get_cursor() as cursor:
+                cursor.executemany('''
+                    INSERT INTO usage (user_id, mode, model, prompt_tokens, completion_tokens, cached_tokens,
+                                       ttft, latency, outcome, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to record usage: {str(e)}")
+            return False
+    
+    def _usage_percentiles(self, column: str, since: float) -> Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]:
+        """Nearest-rank p50 and p95 of a usage column for successful calls, by mode and model."""
+        with self.get_cursor() as cursor:
+            cursor.execute(f'''
+                WITH ranked AS (
+                    SELECT mode, model, {column} AS value,
+                           ROW_NUMBER() OVER (PARTITION BY mode, model ORDER BY {column}) AS position,
+                           COUNT(*) OVER (PARTITION BY mode, model) AS total
+                    FROM usage
+                    WHERE created_at >= ? AND outcome = 'ok' AND {column} IS NOT NULL
+                )
+                SELECT mode, model,
+                       MIN(CASE WHEN position >= 0.5 * total THEN value END),
+                       MIN(CASE WHEN position >= 0.95 * total THEN value END)
+                FROM ranked
+                GROUP BY mode, model
+            ''', (since,))
+            return {(row[0], row[1]): (row[2], row[3]) for row in cursor.fetchall()}
+    
+    def get_usage_latency_stats(self, since: float = 0.0) -> List[Dict[str, Any]]:
+        """Calls, errors, p50/p95 latency and time to first token, and tokens per call, by mode and model."""
+        with self.get_cursor() as cursor:
+            cursor.execute('''
+                SELECT mode, model, COUNT(*), SUM(outcome = 'error'),
+                       AVG(COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0))
+                FROM usage
+                WHERE created_at >= ?
+                GROUP BY mode, model
+                ORDER BY mode, COUNT(*) DESC
+            ''', (since,))
+            totals = cursor.fetchall()
+        latency = self._usage_percentiles('latency', since)
+        ttft = self._usage_percentiles('ttft', since)
+        stats = []
+        for mode, model, requests, errors, avg_tokens in totals:
+            latency_p50, latency_p95 = latency.get((mode, model), (None, None))
+            ttft_p50, ttft_p95 = ttft.get((mode, model), (None, None))
+            stats.append({
+                'mode': mode, 'model': model, 'requests': requests, 'errors': errors,
+                'latency_p50': latency_p50, 'latency_p95': latency_p95,
+                'ttft_p50': ttft_p50, 'ttft_p95': ttft_p95, 'avg_tokens': avg_tokens
+            })
+        return stats
+    
+    def get_daily_token_usage(self, since: float = 0.0) -> List[Tuple]:
+        """Calls and prompt, cached and completion tokens per UTC day and mode."""
+        with self.get_cursor() as cursor:
+            cursor.execute('''
+                SELECT date(created_at, 'unixepoch') AS day, mode, COUNT(*),
+                       COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(cached_tokens), 0),
+                       COALESCE(SUM(completion_tokens), 0)
+                FROM usage
+                WHERE created_at >= ?
+                GROUP BY day, mode
+                ORDER BY day, mode
+            ''', (since,))
+            return cursor.fetchall()
+    
+    def get_user_token_usage(self, since: float = 0.0) -> List[Tuple]:
+        """Calls and prompt and completion tokens per user, heaviest first."""
+        with self.get_cursor() as cursor:
+            cursor.execute('''
+                SELECT user_id, COUNT(*), COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0)
+                FROM usage
+                WHERE created_at >= ?
+                GROUP BY user_id
+                ORDER BY SUM(COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0)) DESC
+            ''', (since,))
+            return cursor.fetchall()
@@ -0,0 +1,177 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HedgeStats:
+    """Per-mode counts of hedged requests and of races the hedge won, for tuning thresholds against cost."""
+    
+    def __init__(self):
+        """Initialize empty counters."""
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, mode: str, hedged: bool, hedge_won: bool):
+        """Count one request that could have been hedged."""
+        with self._lock:
+            counts = self._counts.setdefault(mode, {'requests': 0, 'hedged': 0, 'hedge_wins': 0})
+            counts['requests'] += 1
+            counts['hedged'] += hedged
+            counts['hedge_wins'] += hedge_won
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get counts, hedge rate (hedged / requests) and win rate (hedge wins / hedged) per mode."""
+        with self._lock:
+            return {
+                mode: dict(
+                    counts,
+                    hedge_rate=counts['hedged'] / counts['requests'] if counts['requests'] else None,
+                    win_rate=counts['hedge_wins'] / counts['hedged'] if counts['hedged'] else None
+                )
+                for mode, counts in self._counts.items()
+            }
+    
+    def reset(self):
+        """Forget all counts."""
+        with self._lock:
+            self._counts.clear()
+
+# Shared by every assistant in the process
+hedge_stats = HedgeStats()
+
+def _is_first_token(chunk: Any) -> bool:
+    """Check if a streamed chunk carries output, as opposed to the role or usage."""
+    if not getattr(chunk, 'choices', None):
+        return False
+    delta = chunk.choices[0].delta
+    return bool(delta.content or delta.tool_calls)
+
+class _Attempt:
+    """One model's stream in a hedged race, read on its own thread."""
+    
+    def __init__(self, model: str):
+        """Initialize an attempt that hasn't started."""
+        self.model = model
+        self.stop = threading.Event()
+        self.buffered: List[Any] = []
+        self.done = False
+
+_STREAM_END = object()
+
+class _AttemptFailure:
+    """An exception raised by an attempt, carried across the queue."""
+    
+    def __init__(self, error: Exception):
+        """Wrap the error."""
+        self.error = error
+
+def hedged_stream(open_stream: Callable[[str], Iterator[Any]], models: Iterator[str], hedge_after: float,
+                  can_fall_back: Callable[[Exception], bool], mode: str,
+                  stats: Optional[HedgeStats] = None) -> Iterator[Any]:
+    """Stream a completion from the first model, hedging to the next one if the first token is late.
+    
+    If the first model hasn't produced a token `hedge_after` seconds after the
+    request started, the same request goes to the next model as well. The
+    first stream to produce a token (or finish) wins and is yielded; the
+    other is abandoned and closed when its next chunk arrives. An error that
+    `can_fall_back` accepts, before any output, moves on to the next model
+    as an ordinary fallback would.
+    """
+    stats = stats or hedge_stats
+    events: queue.Queue = queue.Queue()
+    attempts: List[_Attempt] = []
+    
+    def pump(attempt: _Attempt):
+        try:
+            stream = open_stream(attempt.model)
+            try:
+                for chunk in stream:
+                    if attempt.stop.is_set():
+                        break
+                    events.put((attempt, chunk))
+            finally:
+                if hasattr(stream, 'close'):
+                    stream.close()
+            events.put((attempt, _STREAM_END))
+        except Exception as e:
+            events.put((attempt, _AttemptFailure(e)))
+    
+    def start(model: str):
+        attempt = _Attempt(model)
+        attempts.append(attempt)
+        threading.Thread(target=pump, args=(attempt,), name="nuvexa-hedged-attempt", daemon=True).start()
+    
+    primary = next(models, None)
+    if primary is None:
+        raise Exception("No models available")
+    start(primary)
+    hedge_at: Optional[float] = time.monotonic() + hedge_after
+    hedged = False
+    last_error: Optional[Exception] = None
+    winner: Optional[_Attempt] = None
+    
+    try:
+        while winner is None:
+            if all(attempt.done for attempt in attempts):
+                stats.record(mode, hedged, False)
+                raise last_error or Exception("No models available")
+            timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+            try:
+                attempt, item = events.get(timeout=timeout)
+            except queue.Empty:
+                hedge_at = None
+                fallback = next(models, None)
+                if fallback:
+                    hedged = True
+                    logger.info(f"No first token from {primary} after {hedge_after:g}s, hedging {mode} request to {fallback}")
+                    start(fallback)
+                continue
+            
+            if isinstance(item, _AttemptFailure):
+                attempt.done = True
+                last_error = item.error
+                if not can_fall_back(item.error):
+                    stats.record(mode, hedged, False)
+                    raise item.error
+                logger.warning(f"Model {attempt.model} failed: {str(item.error)}, trying next...")
+                if all(other.done for other in attempts):
+                    # Nothing else in flight: fall back right away, as without hedging
+                    hedge_at = None
+                    fallback = next(models, None)
+                    if fallback:
+                        start(fallback)
+                continue
+            if item is _STREAM_END:
+                attempt.done = True
+                winner = attempt
+            else:
+                attempt.buffered.append(item)
+                if _is_first_token(item):
+                    winner = attempt
+        
+        hedge_won = hedged and winner is not attempts[0]
+        stats.record(mode, hedged, hedge_won)
+        if hedge_won:
+            logger.info(f"Hedged {mode} request won by {winner.model}")
+        for attempt in attempts:
+            if attempt is not winner:
+                attempt.stop.set()
+        
+        yield from winner.buffered
+        while not winner.done:
+            attempt, item = events.get()
+            if attempt is not winner:
+                continue
+            if item is _STREAM_END:
+                break
+            if isinstance(item, _AttemptFailure):
+                raise item.error
+            yield item
+    finally:
+        # Lets the attempt threads stop early if the consumer went away
+        for attempt in attempts:
+            attempt.stop.set()
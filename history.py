@@ -0,0 +1,34 @@
+from typing import Iterable, List, Optional, Tuple
+from config import MODES, DEFAULT_HISTORY_TOKEN_BUDGET
+
+# Role markers and separators the API adds around every chat message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the token count of a chat message without a tokenizer."""
+    if not text:
+        return MESSAGE_OVERHEAD_TOKENS
+    # ~4 characters per token for English; word count guards against many short words
+    return max(len(text) // 4, len(text.split())) + MESSAGE_OVERHEAD_TOKENS
+
+def get_history_token_budget(mode: str) -> int:
+    """Get the conversation history token budget for a mode."""
+    return MODES.get(mode, {}).get('history_token_budget', DEFAULT_HISTORY_TOKEN_BUDGET)
+
+def select_history(messages: Iterable[Tuple[str, str, Optional[int]]], token_budget: int) -> List[Tuple[str, str]]:
+    """Fill a token budget with (role, content, tokens) messages from newest to oldest.
+    
+    Messages without a cached token count are estimated. The result is in
+    chronological order, ready to pass to NuvexaAssistant.chat.
+    """
+    window = []
+    used = 0
+    for role, content, tokens in reversed(list(messages)):
+        if tokens is None:
+            tokens = estimate_tokens(content)
+        if used + tokens > token_budget:
+            break
+        used += tokens
+        window.append((role, content))
+    window.reverse()
+    return window
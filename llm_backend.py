@@ -0,0 +1,163 @@
+import functools
+import importlib.util
+import threading
+import time
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from typing import Any, Dict, Optional, Protocol, Tuple
+from config import (LLM_BACKEND, LLM_BASE_URL, STUB_SERVER_URL, LLM_CASSETTE,
+                    LLM_RECORD_BACKEND, LLM_REPLAY_SPEED, LLM_MAX_CONNECTIONS,
+                    LLM_MAX_KEEPALIVE_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_CONNECT_TIMEOUT,
+                    LLM_REQUEST_TIMEOUT, LLM_HTTP2, LLM_PREWARM_TIMEOUT)
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LLMBackend(Protocol):
+    """Source of chat completion clients for the assistants.
+    
+    Clients must expose `chat.completions.with_raw_response.create(...)` like
+    the OpenAI SDK, returning a raw response with `headers` and `parse()`.
+    """
+    
+    name: str
+    requires_api_key: bool
+    
+    def create_client(self, api_key: Optional[str]) -> Any:
+        """Create a blocking client."""
+        ...
+    
+    def create_async_client(self, api_key: Optional[str]) -> Any:
+        """Create an asyncio client."""
+        ...
+
+def _http_options() -> Dict[str, Any]:
+    """Connection pool, keep-alive and protocol settings for the HTTP clients under the SDK."""
+    # HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+    http2 = LLM_HTTP2 and importlib.util.find_spec('h2') is not None
+    if LLM_HTTP2 and not http2:
+        logger.warning("HTTP/2 requested but the h2 package is not installed; using HTTP/1.1")
+    return {
+        'limits': httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+        ),
+        'timeout': httpx.Timeout(LLM_REQUEST_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        'http2': http2,
+        'follow_redirects': True
+    }
+
+class OpenAIBackend:
+    """The OpenAI API, or any OpenAI-compatible endpoint via `base_url`."""
+    
+    name = 'openai'
+    requires_api_key = True
+    
+    def __init__(self, base_url: Optional[str] = None):
+        """Initialize the backend with an optional API base URL."""
+        self.base_url = base_url
+    
+    def create_client(self, api_key: Optional[str]) -> Any:
+        """Create a blocking OpenAI client."""
+        # Retries are handled by the rate limit scheduler
+        return OpenAI(api_key=api_key, base_url=self.base_url, max_retries=0,
+                      http_client=httpx.Client(**_http_options()))
+    
+    def create_async_client(self, api_key: Optional[str]) -> Any:
+        """Create an async OpenAI client."""
+        return AsyncOpenAI(api_key=api_key, base_url=self.base_url, max_retries=0,
+                           http_client=httpx.AsyncClient(**_http_options()))
+
+class StubBackend(OpenAIBackend):
+    """The local stub server from stub_server.py; no API key or network needed."""
+    
+    name = 'stub'
+    requires_api_key = False
+    
+    def __init__(self, base_url: Optional[str] = None):
+        """Initialize the backend pointing at a running stub server."""
+        super().__init__(base_url or STUB_SERVER_URL)
+    
+    def create_client(self, api_key: Optional[str]) -> Any:
+        """Create a blocking client for the stub server."""
+        return super().create_client(api_key or 'stub-key')
+    
+    def create_async_client(self, api_key: Optional[str]) -> Any:
+        """Create an async client for the stub server."""
+        return super().create_async_client(api_key or 'stub-key')
+
+BACKENDS = {
+    'openai': OpenAIBackend,
+    'stub': StubBackend
+}
+
+def get_backend(name: Optional[str] = None, base_url: Optional[str] = None) -> LLMBackend:
+    """Get a backend by name, defaulting to the configured one."""
+    name = name or LLM_BACKEND
+    if name in ('record', 'replay'):
+        # Imported here since cassette.py builds on this module
+        from cassette import RecordingBackend, ReplayBackend
+        logger.info(f"Using {name} LLM backend with cassette {LLM_CASSETTE}")
+        if name == 'record':
+            return RecordingBackend(LLM_CASSETTE, get_backend(LLM_RECORD_BACKEND, base_url))
+        return ReplayBackend(LLM_CASSETTE, LLM_REPLAY_SPEED)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}. Available: {', '.join(BACKENDS)}, record, replay")
+    if name != 'openai':
+        logger.info(f"Using {name} LLM backend")
+    return BACKENDS[name](base_url or LLM_BASE_URL)
+
+@functools.lru_cache(maxsize=None)
+def default_backend() -> LLMBackend:
+    """The configured backend, created once per process."""
+    return get_backend()
+
+class SharedClients:
+    """Blocking LLM clients shared process-wide, one per backend and API key.
+    
+    Every assistant (one per Streamlit session) reuses the same client and
+    so the same pool of kept-alive connections, instead of paying a TLS
+    handshake per session and multiplying sockets with users.
+    """
+    
+    def __init__(self):
+        """Initialize an empty client registry."""
+        self._clients: Dict[Tuple[Any, Optional[str]], Any] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, backend: LLMBackend, api_key: Optional[str]) -> Any:
+        """Get the client for a backend and API key, creating it on first use."""
+        key = (backend, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = backend.create_client(api_key)
+                    self._clients[key] = client
+                    logger.info(f"Created shared {backend.name} LLM client")
+        return client
+    
+    def prewarm(self, client: Any) -> Optional[threading.Thread]:
+        """Open a pooled connection in the background, so the first chat skips DNS, TCP and TLS setup."""
+        if not hasattr(client, 'models'):
+            # Cassette clients have no connection to warm
+            return None
+        
+        def warm():
+            start = time.monotonic()
+            try:
+                client.with_options(timeout=LLM_PREWARM_TIMEOUT).models.list()
+                logger.info(f"LLM connection pre-warmed in {(time.monotonic() - start) * 1000:.0f} ms")
+            except Exception as e:
+                # Even a rejected request leaves the connection open in the pool
+                logger.warning(f"LLM connection pre-warm: {str(e)}")
+        
+        thread = threading.Thread(target=warm, name="nuvexa-llm-prewarm", daemon=True)
+        thread.start()
+        return thread
+
+# Shared by every assistant in the process
+shared_clients = SharedClients()
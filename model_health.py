@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Iterator, List, Optional
+from config import MODEL_BREAKER_FAILURE_THRESHOLD, MODEL_BREAKER_COOLDOWN
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Per-model breaker: opens after repeated model errors, probes after a cooldown.
+    
+    Not thread-safe on its own; ModelHealthRegistry serializes access.
+    """
+    
+    def __init__(self, failure_threshold: int = MODEL_BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = MODEL_BREAKER_COOLDOWN):
+        """Initialize a closed breaker."""
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+    
+    def allow_request(self, now: float) -> bool:
+        """Check if a request may go to this model, claiming the probe when half-open."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if now - self.opened_at < self.cooldown_seconds:
+                return False
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+        # Half-open: exactly one probe request at a time
+        if self.probe_in_flight:
+            return False
+        self.probe_in_flight = True
+        return True
+    
+    def record_success(self):
+        """Close the breaker after a successful call."""
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+    
+    def record_failure(self, now: float):
+        """Count a model error, opening the breaker at the threshold or on a failed probe."""
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now
+    
+    def release_probe(self):
+        """Release a probe that ended with an error unrelated to the model."""
+        self.probe_in_flight = False
+
+class _ModelStats:
+    """Request, error and latency counters for one model."""
+    
+    def __init__(self):
+        """Initialize empty counters."""
+        self.requests = 0
+        self.successes = 0
+        self.model_errors = 0
+        self.other_errors = 0
+        self.skipped = 0
+        self.total_latency = 0.0
+        self.latencies = deque(maxlen=200)
+        self.last_error: Optional[str] = None
+
+class ModelHealthRegistry:
+    """Process-wide model health: circuit breakers plus per-model error and latency stats."""
+    
+    def __init__(self, failure_threshold: int = MODEL_BREAKER_FAILURE_THRESHOLD,
+                 cooldown_seconds: float = MODEL_BREAKER_COOLDOWN):
+        """Initialize an empty registry."""
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._stats: Dict[str, _ModelStats] = {}
+        self._lock = threading.Lock()
+    
+    def _entry(self, model: str):
+        """Get or create the breaker and stats of a model. Caller holds the lock."""
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(self.failure_threshold, self.cooldown_seconds)
+            self._stats[model] = _ModelStats()
+        return self._breakers[model], self._stats[model]
+    
+    def allow_request(self, model: str) -> bool:
+        """Check if a model's breaker lets a request through."""
+        with self._lock:
+            breaker, stats = self._entry(model)
+            allowed = breaker.allow_request(time.monotonic())
+            if allowed:
+                stats.requests += 1
+            else:
+                stats.skipped += 1
+            return allowed
+    
+    def iter_models(self, chain: List[str]) -> Iterator[str]:
+        """Yield the models of a fallback chain whose breakers allow a request.
+        
+        Lazy, so a half-open probe is only claimed when the caller actually
+        moves on to that model. If every breaker is open the first model is
+        still tried, so requests are never refused outright.
+        """
+        yielded = False
+        for model in chain:
+            if self.allow_request(model):
+                yielded = True
+                yield model
+        if not yielded and chain:
+            logger.warning(f"All model breakers open, trying {chain[0]} anyway")
+            with self._lock:
+                self._entry(chain[0])[1].requests += 1
+            yield chain[0]
+    
+    def record_success(self, model: str, latency: float):
+        """Record a successful call and its latency in seconds."""
+        with self._lock:
+            breaker, stats = self._entry(model)
+            breaker.record_success()
+            stats.successes += 1
+            stats.total_latency += latency
+            stats.latencies.append(latency)
+    
+    def record_model_error(self, model: str, error: Exception):
+        """Record a model-specific error, which counts towards opening the breaker."""
+        with self._lock:
+            breaker, stats = self._entry(model)
+            was_open = breaker.state == OPEN
+            breaker.record_failure(time.monotonic())
+            stats.model_errors += 1
+            stats.last_error = str(error)[:200]
+            if breaker.state == OPEN and not was_open:
+                logger.warning(f"Circuit breaker opened for model {model}")
+    
+    def record_other_error(self, model: str, error: Exception):
+        """Record an error unrelated to the model (auth, quota, network); the breaker is unaffected."""
+        with self._lock:
+            breaker, stats = self._entry(model)
+            breaker.release_probe()
+            stats.other_errors += 1
+            stats.last_error = str(error)[:200]
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get breaker state and error/latency stats for every model seen so far."""
+        with self._lock:
+            result = {}
+            for model, breaker in self._breakers.items():
+                stats = self._stats[model]
+                latencies = sorted(stats.latencies)
+                result[model] = {
+                    'state': breaker.state,
+                    'consecutive_failures': breaker.consecutive_failures,
+                    'requests': stats.requests,
+                    'successes': stats.successes,
+                    'model_errors': stats.model_errors,
+                    'other_errors': stats.other_errors,
+                    'skipped': stats.skipped,
+                    'avg_latency': stats.total_latency / stats.successes if stats.successes else None,
+                    'p50_latency': latencies[len(latencies) // 2] if latencies else None,
+                    'p95_latency': latencies[int(len(latencies) * 0.95) - 1] if len(latencies) >= 20 else None,
+                    'last_error': stats.last_error
+                }
+            return result
+    
+    def reset(self):
+        """Forget all breaker state and stats."""
+        with self._lock:
+            self._breakers.clear()
+            self._stats.clear()
+
+# Shared by every assistant in the process
+model_health = ModelHealthRegistry()
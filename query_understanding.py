@@ -0,0 +1,230 @@
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Phrases that introduce the thing being shopped for; the query is what follows them
+QUERY_TRIGGERS = (
+    'buy', 'buying', 'purchase', 'purchasing', 'shop for', 'shopping for', 'find', 'look for',
+    'looking for', 'need', 'want', 'get me', 'search for', 'searching for', 'order'
+)
+# Further words that signal shopping intent without introducing a query
+INTENT_WORDS = ('shop', 'shopping', 'ordering')
+# Filler words dropped from queries
+STOP_WORDS = ('a', 'an', 'the', 'some', 'me', 'to', 'please', 'i')
+
+_INTENT_ONLY = frozenset(INTENT_WORDS)
+_SKIP_WORDS = frozenset(STOP_WORDS) | _INTENT_ONLY
+_PUNCTUATION = "\"'.,!?;:()[]{}<>*"
+
+def compile_phrases(phrases: Iterable[str]) -> 're.Pattern[str]':
+    """Compile phrases into one trie-shaped regex that matches whole words.
+    
+    Shared prefixes are factored out ("buy(?:ing)?"), so the regex engine does
+    a single left-to-right scan whose cost doesn't grow with the number of
+    phrases, much like an Aho-Corasick automaton. Spaces in phrases match any
+    whitespace. Matches can start inside a word; callers check the left edge.
+    The phrase is captured, so split() interleaves text and matched phrases.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for char in " ".join(phrase.lower().split()):
+            node = node.setdefault(char, {})
+        node[''] = {}
+    
+    def build(node: Dict[str, Any]) -> str:
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if '' in node:
+            # Greedy, so the longest phrase wins ("looking for" over "look")
+            return f"(?:{body})?"
+        return body
+    
+    # Starting with a plain alternation (no leading \b) lets the regex engine
+    # skip ahead to positions where a phrase's first letter occurs
+    return re.compile('(' + build(trie) + r')\b')
+
+_VOCABULARY = compile_phrases(QUERY_TRIGGERS + INTENT_WORDS)
+
+def _query_words(text: str) -> List[str]:
+    """Split text into words, dropping edge punctuation and filler words."""
+    words = []
+    for token in text.split():
+        # Most filler tokens are caught before stripping
+        if token not in _SKIP_WORDS:
+            word = token.strip(_PUNCTUATION)
+            if word and word not in _SKIP_WORDS:
+                words.append(word)
+    return words
+
+def analyze_query(message: str) -> Tuple[bool, str]:
+    """Detect shopping intent and extract the product query from a message.
+    
+    Returns (is_shopping, query). The query is the text after the last trigger
+    phrase that is followed by something other than filler, so "I need to
+    find a laptop" gives "laptop". Without such a trigger the whole message
+    is the query.
+    """
+    if not message:
+        return False, ""
+    
+    # [text, phrase, text, ..., phrase, text] without a match object per phrase.
+    # Walking back from the last phrase, usually only the text after it is tokenized.
+    parts = _VOCABULARY.split(message.lower())
+    is_shopping = False
+    stop = len(parts)
+    for i in range(len(parts) - 2, 0, -2):
+        before = parts[i - 1]
+        if before and (before[-1].isalnum() or before[-1] == '_'):
+            # Inside a word, e.g. "want" in "unwanted"
+            continue
+        is_shopping = True
+        if parts[i] in _INTENT_ONLY:
+            continue
+        words = _query_words(parts[i + 1] if stop == i + 2 else "".join(parts[i + 1:stop]))
+        if words:
+            return True, " ".join(words)
+        stop = i
+    return is_shopping, message
+
+PRICE_ASC = 'price_asc'
+PRICE_DESC = 'price_desc'
+RATING_DESC = 'rating_desc'
+
+class ProductQuery(NamedTuple):
+    """Structured product search: search terms plus filters and ordering."""
+    terms: Tuple[str, ...] = ()
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    min_rating: Optional[float] = None
+    sources: Tuple[str, ...] = ()
+    sort: Optional[str] = None
+    
+    @property
+    def has_filters(self) -> bool:
+        """Check if any price, rating or source constraint is set."""
+        return (self.min_price is not None or self.max_price is not None
+                or self.min_rating is not None or bool(self.sources))
+
+_AMOUNT = r"\$?\s?(\d+(?:,\d{3})*(?:\.\d+)?)\s*(k\b)?(?:\s*(?:dollars|bucks|usd)\b)?"
+_RATING = r"([0-5](?:\.\d)?)"
+_PRICE_RANGE = re.compile(
+    rf"\b(?:between|from)\s+{_AMOUNT}\s*(?:and|to|-)\s*{_AMOUNT}"
+    rf"|\$(\d+(?:,\d{{3}})*(?:\.\d+)?)\s*(k\b)?\s*(?:-|to)\s*{_AMOUNT}"
+)
+_PRICE_MAX = re.compile(
+    rf"(?:\b(?:under|below|less\s+than|cheaper\s+than|max(?:imum)?|at\s+most|up\s+to|no\s+more\s+than|within)\s+|<=?\s*){_AMOUNT}"
+)
+_PRICE_MIN = re.compile(
+    rf"(?:\b(?:over|above|more\s+than|at\s+least|min(?:imum)?|starting\s+at)\s+|>=?\s*){_AMOUNT}"
+)
+_PRICE_AROUND = re.compile(rf"(?:\b(?:around|about|approximately|roughly)\s+|~\s*){_AMOUNT}")
+_RATING_MIN = re.compile(
+    rf"\b(?:(?:at\s+least|over|above|min(?:imum)?|rated)\s+)?{_RATING}\s*\+?\s*stars?(?:\s*(?:and|&|or)\s*(?:up|above|higher|better|more))?"
+    rf"|\b(?:rated|rating(?:\s+of)?)\s+(?:(?:at\s+least|over|above)\s+|>=?\s*)?{_RATING}(?:\s*\+|\s+or\s+(?:higher|more|better|above))?"
+    rf"|\b{_RATING}\s*\+\s*(?:rating|rated)"
+)
+_SORTS = (
+    (RATING_DESC, re.compile(r"\b(?:best|top|highest)[\s-]+(?:rated|reviewed)|\bhighly[\s-]+rated")),
+    (PRICE_ASC, re.compile(r"\b(?:cheapest|lowest\s+price[ds]?|least\s+expensive|most\s+affordable|budget)\b")),
+    (PRICE_DESC, re.compile(r"\b(?:most\s+expensive|priciest|highest\s+price[ds]?|high[\s-]+end|premium|luxury)\b")),
+    (RATING_DESC, re.compile(r"\bbest\b")),
+)
+# Words that carry no product meaning once constraints are removed
+_TERM_FILLERS = frozenset(STOP_WORDS) | _INTENT_ONLY | frozenset((
+    'for', 'with', 'and', 'or', 'of', 'in', 'on', 'at', 'from', 'by', 'my', 'you', 'can', 'that',
+    'is', 'are', 'any', 'something', 'one', 'ones', 'show', 'get', 'find', 'price', 'priced', 'cost',
+    'costs', 'costing', 'stars', 'star', 'rated', 'rating', 'than', 'less', 'more', 'around',
+    'anything', 'everything', 'stuff', 'things', 'items', 'products'
+))
+
+def _amount(number: str, thousands: Optional[str]) -> float:
+    """Convert a matched amount such as '1,299' or '1.5' with a 'k' suffix to a float."""
+    value = float(number.replace(',', ''))
+    return value * 1000 if thousands else value
+
+def _source_pattern(sources: Iterable[str]) -> Optional['re.Pattern[str]']:
+    """Regex matching known source names as whole words, optionally after 'from', 'at' or 'on'."""
+    names = sorted({source.lower() for source in sources if source}, key=len, reverse=True)
+    if not names:
+        return None
+    alternation = '|'.join(r'\s+'.join(re.escape(word) for word in name.split()) for name in names)
+    return re.compile(rf"(?:\b(?:from|at|on|via)\s+)?\b({alternation})\b")
+
+def parse_product_query(text: str, known_sources: Iterable[str] = ()) -> ProductQuery:
+    """Parse a product request such as "headphones under $300 from Amazon" into a ProductQuery.
+    
+    Price ranges and bounds, minimum ratings, sources (matched against
+    `known_sources`, case-insensitively) and sort hints are recognized and cut
+    out; the remaining meaningful words become the search terms. Sources are
+    returned lowercased.
+    """
+    if not text:
+        return ProductQuery()
+    
+    remaining = text.lower()
+    min_price = max_price = min_rating = None
+    
+    def cut(match: 're.Match[str]') -> str:
+        return remaining[:match.start()] + " " + remaining[match.end():]
+    
+    # Ratings first, so "at least 4 stars" isn't read as a price
+    match = _RATING_MIN.search(remaining)
+    if match:
+        min_rating = float(next(group for group in match.groups() if group is not None))
+        remaining = cut(match)
+    
+    match = _PRICE_RANGE.search(remaining)
+    if match:
+        groups = match.groups()
+        low, high = (groups[0:2], groups[2:4]) if groups[0] is not None else (groups[4:6], groups[6:8])
+        min_price, max_price = sorted((_amount(*low), _amount(*high)))
+        remaining = cut(match)
+    else:
+        match = _PRICE_MAX.search(remaining)
+        if match:
+            max_price = _amount(*match.groups())
+            remaining = cut(match)
+        match = _PRICE_MIN.search(remaining)
+        if match:
+            min_price = _amount(*match.groups())
+            remaining = cut(match)
+        if min_price is None and max_price is None:
+            match = _PRICE_AROUND.search(remaining)
+            if match:
+                target = _amount(*match.groups())
+                min_price, max_price = round(target * 0.8, 2), round(target * 1.2, 2)
+                remaining = cut(match)
+    
+    sources = []
+    pattern = _source_pattern(known_sources)
+    if pattern:
+        for match in pattern.finditer(remaining):
+            source = " ".join(match.group(1).split())
+            if source not in sources:
+                sources.append(source)
+        remaining = pattern.sub(" ", remaining)
+    
+    sort = None
+    for order, sort_pattern in _SORTS:
+        match = sort_pattern.search(remaining)
+        if match:
+            sort = order
+            remaining = cut(match)
+            break
+    
+    terms = []
+    for token in remaining.split():
+        word = token.strip(_PUNCTUATION)
+        if word and word not in _TERM_FILLERS and not word.lstrip('$').replace('.', '', 1).isdigit():
+            terms.append(word)
+    
+    return ProductQuery(tuple(terms), min_price, max_price, min_rating, tuple(sources), sort)
@@ -0,0 +1,233 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional
+from config import (RATE_LIMIT_RPM, RATE_LIMIT_TPM, RATE_LIMIT_MAX_QUEUE_DELAY,
+                    RATE_LIMIT_MAX_RETRIES, RATE_LIMIT_BACKOFF_BASE, RATE_LIMIT_BACKOFF_MAX)
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+def parse_reset_duration(value: str) -> Optional[float]:
+    """Parse an OpenAI reset header such as '20ms', '1s' or '6m0s' into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+class RateLimitQueueFull(Exception):
+    """Raised when a request would have to queue longer than the allowed delay."""
+
+class TokenBucket:
+    """Token bucket that lets reservations go into debt and reports the wait."""
+    
+    def __init__(self, capacity: float, refill_per_second: float):
+        """Initialize a full bucket."""
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        """Add tokens for the time elapsed since the last update."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+    
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount` tokens and return seconds to wait until they are really available."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+        if self.level >= 0:
+            return 0.0
+        return -self.level / self.refill_per_second
+    
+    def cancel(self, amount: float):
+        """Give back a reservation that was not used."""
+        self.level += min(amount, self.capacity)
+    
+    def sync(self, limit: Optional[float], remaining: Optional[float], now: float):
+        """Adopt the server's view of the limit and remaining budget."""
+        self._refill(now)
+        if limit:
+            self.capacity = limit
+            self.refill_per_second = limit / 60.0
+        if remaining is not None:
+            self.level = min(self.level, remaining)
+
+class _ModelLimits:
+    """Request and token buckets for one model."""
+    
+    def __init__(self, rpm: float, tpm: float):
+        """Initialize full buckets for a requests-per-minute and tokens-per-minute budget."""
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+
+class RateLimitScheduler:
+    """Client-side RPM/TPM scheduler with 429/5xx retries for OpenAI calls.
+    
+    Requests reserve budget before they are sent and sleep when the budget is
+    exhausted, instead of failing with a 429. Budgets follow the
+    x-ratelimit-* response headers, and retryable errors back off
+    exponentially with full jitter.
+    """
+    
+    def __init__(self, rpm: float = RATE_LIMIT_RPM, tpm: float = RATE_LIMIT_TPM,
+                 max_queue_delay: float = RATE_LIMIT_MAX_QUEUE_DELAY,
+                 max_retries: int = RATE_LIMIT_MAX_RETRIES,
+                 backoff_base: float = RATE_LIMIT_BACKOFF_BASE,
+                 backoff_max: float = RATE_LIMIT_BACKOFF_MAX):
+        """Initialize the scheduler with default per-model budgets and retry policy."""
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue_delay = max_queue_delay
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._limits: Dict[str, _ModelLimits] = {}
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'queued': 0, 'queue_seconds': 0.0, 'retries': 0, 'rejected': 0}
+    
+    def _model_limits(self, model: str) -> _ModelLimits:
+        """Get or create the buckets of a model. Caller holds the lock."""
+        if model not in self._limits:
+            self._limits[model] = _ModelLimits(self.rpm, self.tpm)
+        return self._limits[model]
+    
+    def reserve(self, model: str, tokens: int) -> float:
+        """Reserve one request and `tokens` tokens, returning how long to wait before sending."""
+        with self._lock:
+            limits = self._model_limits(model)
+            now = time.monotonic()
+            wait = max(limits.requests.reserve(1, now), limits.tokens.reserve(tokens, now))
+            self.stats['requests'] += 1
+            if wait > self.max_queue_delay:
+                limits.requests.cancel(1)
+                limits.tokens.cancel(tokens)
+                self.stats['rejected'] += 1
+                raise RateLimitQueueFull(f"Rate limit exceeded: {model} queue wait would be {wait:.1f}s")
+            if wait > 0:
+                self.stats['queued'] += 1
+                self.stats['queue_seconds'] += wait
+            return wait
+    
+    def update_from_headers(self, model: str, headers: Mapping[str, str]):
+        """Sync a model's budgets with x-ratelimit-* response headers."""
+        def number(name: str) -> Optional[float]:
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+        
+        with self._lock:
+            limits = self._model_limits(model)
+            now = time.monotonic()
+            limits.requests.sync(number('x-ratelimit-limit-requests'), number('x-ratelimit-remaining-requests'), now)
+            limits.tokens.sync(number('x-ratelimit-limit-tokens'), number('x-ratelimit-remaining-tokens'), now)
+    
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Check if an error is a 429 or 5xx worth retrying; quota errors are not."""
+        status = getattr(error, 'status_code', None)
+        if status is None:
+            return False
+        if status == 429:
+            return 'insufficient_quota' not in str(error).lower()
+        return status >= 500
+    
+    def retry_delay(self, error: Exception, attempt: int) -> float:
+        """Backoff before retry `attempt` (0-based), honoring Retry-After hints."""
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None) or {}
+        hinted = None
+        if headers.get('retry-after-ms'):
+            hinted = parse_reset_duration(f"{headers['retry-after-ms']}ms")
+        if hinted is None:
+            hinted = parse_reset_duration(headers.get('retry-after', ''))
+        if hinted is None:
+            hinted = parse_reset_duration(headers.get('x-ratelimit-reset-requests', ''))
+        # Full jitter spreads retries from concurrent sessions apart
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(backoff, min(hinted, self.backoff_max)) if hinted is not None else backoff
+    
+    def _record_retry(self, model: str, error: Exception, attempt: int, delay: float):
+        """Count and log a retry."""
+        with self._lock:
+            self.stats['retries'] += 1
+        logger.warning(f"Retrying {model} in {delay:.2f}s after error (attempt {attempt + 1}): {str(error)[:120]}")
+    
+    def call(self, model: str, tokens: int, send: Callable[[], Any]) -> Any:
+        """Send a raw-response request through the scheduler and return the parsed result."""
+        attempt = 0
+        while True:
+            wait = self.reserve(model, tokens)
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                raw = send()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = self.retry_delay(e, attempt)
+                self._record_retry(model, e, attempt, delay)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.update_from_headers(model, raw.headers)
+            return raw.parse()
+    
+    async def acall(self, model: str, tokens: int, send: Callable[[], Awaitable[Any]]) -> Any:
+        """Async counterpart of call()."""
+        attempt = 0
+        while True:
+            wait = self.reserve(model, tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                raw = await send()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = self.retry_delay(e, attempt)
+                self._record_retry(model, e, attempt, delay)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self.update_from_headers(model, raw.headers)
+            return raw.parse()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Get counters and the current budget levels per model."""
+        with self._lock:
+            now = time.monotonic()
+            models = {}
+            for model, limits in self._limits.items():
+                limits.requests._refill(now)
+                limits.tokens._refill(now)
+                models[model] = {
+                    'rpm_limit': limits.requests.capacity,
+                    'requests_available': limits.requests.level,
+                    'tpm_limit': limits.tokens.capacity,
+                    'tokens_available': limits.tokens.level
+                }
+            return dict(self.stats, models=models)
+    
+    def reset(self):
+        """Forget all budgets and counters."""
+        with self._lock:
+            self._limits.clear()
+            self.stats = {'requests': 0, 'queued': 0, 'queue_seconds': 0.0, 'retries': 0, 'rejected': 0}
+
+# Shared by every assistant in the process
+rate_limiter = RateLimitScheduler()
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from config import MODES, LLM_REQUEST_TIMEOUT, ROUTING_OVERRIDES_FILE, ROUTING_RELOAD_INTERVAL
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class RoutingProfile(NamedTuple):
+    """Models to try in order, plus generation settings, for one mode."""
+    models: Tuple[str, ...]
+    max_tokens: int
+    temperature: float
+    timeout: float
+    # Seconds without a first token from the first model before the request is hedged to the next
+    hedge_after: Optional[float] = None
+
+# Used for modes, or fields, without a routing profile
+DEFAULT_PROFILE = RoutingProfile(("gpt-4o", "gpt-4", "gpt-3.5-turbo"), 800, 0.7, LLM_REQUEST_TIMEOUT)
+
+def build_profile(base: RoutingProfile, fields: Dict[str, Any]) -> RoutingProfile:
+    """Overlay routing fields on a profile, validating them."""
+    models = fields.get('models', base.models)
+    if isinstance(models, str):
+        models = [models]
+    if not models or not all(isinstance(model, str) and model for model in models):
+        raise ValueError(f"Invalid models: {models!r}")
+    hedge_after = fields.get('hedge_after', base.hedge_after)
+    profile = RoutingProfile(
+        models=tuple(models),
+        max_tokens=int(fields.get('max_tokens', base.max_tokens)),
+        temperature=float(fields.get('temperature', base.temperature)),
+        timeout=float(fields.get('timeout', base.timeout)),
+        hedge_after=float(hedge_after) if hedge_after is not None else None
+    )
+    if profile.max_tokens < 1 or not 0 <= profile.temperature <= 2 or profile.timeout <= 0:
+        raise ValueError(f"Invalid routing profile: {profile}")
+    if profile.hedge_after is not None and profile.hedge_after <= 0:
+        raise ValueError(f"Invalid hedge_after: {profile.hedge_after}")
+    return profile
+
+class RoutingTable:
+    """Per-mode routing profiles from MODES, with hot-reloaded overrides from a JSON file."""
+    
+    def __init__(self, overrides_path: Optional[str] = ROUTING_OVERRIDES_FILE,
+                 reload_interval: float = ROUTING_RELOAD_INTERVAL):
+        """Initialize the table; the overrides file is optional and may appear later."""
+        self.overrides_path = overrides_path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._overrides_mtime: Optional[float] = None
+        self._next_check = 0.0
+        self._profiles: Dict[str, RoutingProfile] = self._build({})
+    
+    @staticmethod
+    def _build(overrides: Dict[str, Dict[str, Any]]) -> Dict[str, RoutingProfile]:
+        """Build every mode's profile from MODES plus overrides."""
+        profiles = {}
+        for mode, settings in MODES.items():
+            profile = build_profile(DEFAULT_PROFILE, settings.get('routing', {}))
+            if mode in overrides:
+                profile = build_profile(profile, overrides[mode])
+            profiles[mode] = profile
+        return profiles
+    
+    def reload(self) -> bool:
+        """Re-read the overrides file; keeps the current profiles if it is invalid."""
+        path = self.overrides_path
+        try:
+            mtime = os.path.getmtime(path) if path else None
+        except OSError:
+            mtime = None
+        
+        try:
+            overrides = {}
+            if mtime is not None:
+                with open(path, 'r', encoding='utf-8') as f:
+                    overrides = json.load(f)
+                unknown = set(overrides) - set(MODES)
+                if unknown:
+                    raise ValueError(f"Unknown modes: {', '.join(sorted(unknown))}")
+            profiles = self._build(overrides)
+        except Exception as e:
+            logger.error(f"Failed to load routing overrides from {path}: {str(e)}")
+            with self._lock:
+                # Don't retry a broken file until it changes again
+                self._overrides_mtime = mtime
+            return False
+        
+        with self._lock:
+            changed = profiles != self._profiles
+            self._profiles = profiles
+            self._overrides_mtime = mtime
+        if changed:
+            logger.info(f"Routing profiles reloaded: {profiles}")
+        return True
+    
+    def _check_for_changes(self):
+        """Reload if the overrides file changed, checking at most once per interval."""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            known_mtime = self._overrides_mtime
+        try:
+            mtime = os.path.getmtime(self.overrides_path) if self.overrides_path else None
+        except OSError:
+            mtime = None
+        if mtime != known_mtime:
+            self.reload()
+    
+    def profile(self, mode: str) -> RoutingProfile:
+        """Get the routing profile of a mode."""
+        self._check_for_changes()
+        return self._profiles.get(mode, DEFAULT_PROFILE)
+    
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Get every mode's current profile."""
+        self._check_for_changes()
+        return {mode: profile._asdict() for mode, profile in self._profiles.items()}
+
+# Shared by every assistant in the process
+routing_table = RoutingTable()
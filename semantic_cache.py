@@ -0,0 +1,159 @@
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from typing import Optional, Dict, Any, List
+from config import SEMANTIC_CACHE_DIM, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HashedNgramVectorizer:
+    """Embed text locally as L2-normalized hashed character n-gram counts."""
+    
+    def __init__(self, dim: int = SEMANTIC_CACHE_DIM, ngram_sizes: tuple = (3, 4)):
+        """Initialize the vectorizer with the embedding size and n-gram lengths."""
+        self.dim = dim
+        self.ngram_sizes = ngram_sizes
+    
+    def _features(self, text: str) -> List[str]:
+        """Split normalized text into word and character n-gram features."""
+        # Punctuation rarely changes intent, so only words, numbers and $ are kept
+        normalized = " ".join(re.sub(r"[^\w\s$]", " ", text.lower()).split())
+        padded = f" {normalized} "
+        features = normalized.split()
+        for size in self.ngram_sizes:
+            features.extend(padded[i:i + size] for i in range(len(padded) - size + 1))
+        return features
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Embed text into a unit vector of length `dim`."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(text):
+            # crc32 is stable across processes, unlike the builtin hash()
+            hashed = zlib.crc32(feature.encode('utf-8'))
+            sign = 1.0 if hashed & 0x80000000 else -1.0
+            vector[hashed % self.dim] += sign
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+class _ModeIndex:
+    """Embedding matrix with LRU slot reuse for one mode, grown on demand up to a fixed capacity."""
+    
+    INITIAL_ROWS = 256
+    
+    def __init__(self, dim: int, capacity: int):
+        """Allocate a small embedding matrix and slot bookkeeping."""
+        self.capacity = capacity
+        rows = min(capacity, self.INITIAL_ROWS)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.last_used = np.zeros(rows, dtype=np.float64)
+        self.prompts: List[Optional[str]] = [None] * rows
+        self.responses: List[Optional[str]] = [None] * rows
+        self.size = 0
+    
+    def reserve(self, rows: int) -> None:
+        """Grow the matrix to hold at least `rows` entries, up to the capacity."""
+        rows = min(rows, self.capacity)
+        if rows <= len(self.vectors):
+            return
+        vectors = np.zeros((rows, self.vectors.shape[1]), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        last_used = np.zeros(rows, dtype=np.float64)
+        last_used[:self.size] = self.last_used[:self.size]
+        extra = rows - len(self.vectors)
+        self.vectors = vectors
+        self.last_used = last_used
+        self.prompts.extend([None] * extra)
+        self.responses.extend([None] * extra)
+    
+    def search(self, vector: np.ndarray) -> tuple:
+        """Find the most similar cached prompt, returning (slot, cosine score)."""
+        if self.size == 0:
+            return -1, 0.0
+        # Rows and query are unit vectors, so the dot product is cosine similarity
+        scores = self.vectors[:self.size] @ vector
+        slot = int(np.argmax(scores))
+        return slot, float(scores[slot])
+    
+    def insert(self, vector: np.ndarray, prompt: str, response: str, now: float) -> None:
+        """Store an entry, overwriting the least recently used slot when full."""
+        if self.size == len(self.vectors):
+            # Doubling keeps the copying amortized constant per insert
+            self.reserve(2 * self.size)
+        if self.size < len(self.vectors):
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+        self.vectors[slot] = vector
+        self.last_used[slot] = now
+        self.prompts[slot] = prompt
+        self.responses[slot] = response
+
+class SemanticCache:
+    """In-process near-duplicate prompt cache with one embedding index per mode."""
+    
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+                 vectorizer: Optional[HashedNgramVectorizer] = None):
+        """Initialize the cache with a similarity threshold and per-mode size bound."""
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.vectorizer = vectorizer or HashedNgramVectorizer()
+        self.hits = 0
+        self.misses = 0
+        self._indexes: Dict[str, _ModeIndex] = {}
+        self._lock = threading.Lock()
+    
+    def _get_index(self, mode: str) -> _ModeIndex:
+        """Get or create the index for a mode."""
+        index = self._indexes.get(mode)
+        if index is None:
+            index = _ModeIndex(self.vectorizer.dim, self.max_entries)
+            self._indexes[mode] = index
+        return index
+    
+    def get(self, mode: str, user_message: str) -> Optional[str]:
+        """Get the cached answer for the most similar past prompt above the threshold."""
+        vector = self.vectorizer.embed(user_message)
+        with self._lock:
+            index = self._indexes.get(mode)
+            slot, score = index.search(vector) if index else (-1, 0.0)
+            if slot < 0 or score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            index.last_used[slot] = time.monotonic()
+            logger.info(f"Semantic cache hit in {mode} mode (similarity {score:.3f})")
+            return index.responses[slot]
+    
+    def put(self, mode: str, user_message: str, response: str) -> None:
+        """Cache an answer for a prompt, replacing a near-identical entry if present."""
+        if not user_message or not response:
+            return
+        vector = self.vectorizer.embed(user_message)
+        with self._lock:
+            index = self._get_index(mode)
+            slot, score = index.search(vector)
+            now = time.monotonic()
+            if slot >= 0 and score >= self.threshold:
+                index.responses[slot] = response
+                index.last_used[slot] = now
+            else:
+                index.insert(vector, user_message, response, now)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and per-mode entry counts."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': {mode: index.size for mode, index in self._indexes.items()}
+            }
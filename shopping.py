@@ -1,6 +1,9 @@
+import bisect
+import heapq
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Collection, FrozenSet, Iterable, Optional, Set, Tuple
 import re
+from query_understanding import PRICE_ASC, PRICE_DESC, RATING_DESC, ProductQuery, parse_product_query
 
 class ShoppingEngine:
     """Product search and recommendation engine."""
@@ -81,67 +84,167 @@ class ShoppingEngine:
             'ipad': 'tablet',
             'tablet': 'tablet'
         }
+        
+        self.build_indexes()
     
-    def search_products(self, query: str) -> List[Dict[str, Any]]:
-        """Search for products based on query."""
-        if not query or not query.strip():
-            return []
+    def build_indexes(self):
+        """Index the catalog for structured queries; call again after changing self.products."""
+        self._catalog: List[Dict[str, Any]] = []
+        self._category_ids: Dict[str, FrozenSet[int]] = {}
+        for category, products in self.products.items():
+            start = len(self._catalog)
+            self._catalog.extend(products)
+            self._category_ids[category] = frozenset(range(start, len(self._catalog)))
+        
+        self._price_of = [product['price'] for product in self._catalog]
+        self._rating_of = [product.get('rating', 0) for product in self._catalog]
         
-        query_lower = query.lower().strip()
-        results = []
+        # Product ids ordered by price and by rating, with the sorted values alongside for bisect
+        self._price_order = sorted(range(len(self._catalog)), key=self._price_of.__getitem__)
+        self._prices = [self._price_of[i] for i in self._price_order]
+        self._rating_order = sorted(range(len(self._catalog)), key=self._rating_of.__getitem__)
+        self._ratings = [self._rating_of[i] for i in self._rating_order]
+        
+        # Posting sets: lowercased source, and name/description word, to product ids
+        source_ids: Dict[str, Set[int]] = {}
+        word_ids: Dict[str, Set[int]] = {}
+        for product_id, product in enumerate(self._catalog):
+            if product.get('source'):
+                source_ids.setdefault(product['source'].lower(), set()).add(product_id)
+            for word in re.findall(r'\w+', f"{product['name']} {product['description']}".lower()):
+                word_ids.setdefault(word, set()).add(product_id)
+        self._source_ids = {source: frozenset(ids) for source, ids in source_ids.items()}
+        self._name_ids = {product['name'].lower(): product_id for product_id, product in enumerate(self._catalog)}
+        self._word_ids = {word: frozenset(ids) for word, ids in word_ids.items()}
+        self.sources = sorted({product['source'] for product in self._catalog if product.get('source')})
+    
+    def get_product(self, name: str) -> Optional[Dict[str, Any]]:
+        """Find a product by name, case-insensitively; a unique partial match also counts."""
+        name = " ".join(name.lower().split())
+        if not name:
+            return None
+        product_id = self._name_ids.get(name)
+        if product_id is None:
+            partial = [i for product_name, i in self._name_ids.items() if name in product_name]
+            if len(partial) != 1:
+                return None
+            product_id = partial[0]
+        return self._catalog[product_id]
+    
+    def parse_query(self, query: str) -> ProductQuery:
+        """Parse a search string into a structured query, recognizing this catalog's sources."""
+        return parse_product_query(query, self.sources)
+    
+    def _match_terms(self, terms: Tuple[str, ...]) -> FrozenSet[int]:
+        """Find product ids for search terms: category, then keyword, partial category, and word matches."""
+        query_lower = " ".join(terms)
         
         # Direct category match
-        for category, products in self.products.items():
+        for category, ids in self._category_ids.items():
             if category in query_lower:
-                results.extend(products)
-                break
+                return ids
         
         # Keyword-based search
-        if not results:
-            matched_categories = set()
-            query_words = re.findall(r'\w+', query_lower)
-            
-            for word in query_words:
-                if word in self.keyword_map:
-                    category = self.keyword_map[word]
-                    if category not in matched_categories:
-                        matched_categories.add(category)
-                        results.extend(self.products.get(category, []))
-            
-            # Partial word matching in category names
-            if not results:
-                for category, products in self.products.items():
-                    for word in query_words:
-                        if word in category or category in word:
-                            results.extend(products)
-                            break
-        
-        # If still no results, search product names and descriptions
-        if not results:
-            query_words = set(re.findall(r'\w+', query_lower))
-            for category, products in self.products.items():
-                for product in products:
-                    product_text = f"{product['name']} {product['description']}".lower()
-                    if any(word in product_text for word in query_words if len(word) > 2):
-                        results.append(product)
-        
-        # If no matches, return random recommendations
-        if not results:
-            all_products = []
-            for products in self.products.values():
-                all_products.extend(products)
-            results = random.sample(all_products, min(5, len(all_products)))
-        
-        # Remove duplicates and limit results
-        seen = set()
-        unique_results = []
-        for product in results:
-            product_key = product['name']
-            if product_key not in seen:
-                seen.add(product_key)
-                unique_results.append(product)
-        
-        return unique_results[:10]  # Limit to 10 results
+        categories = {self.keyword_map[word] for word in terms if word in self.keyword_map}
+        
+        # Partial word matching in category names
+        if not categories:
+            categories = {category for category in self._category_ids
+                          if any(word in category or category in word for word in terms)}
+        if categories:
+            return frozenset().union(*(self._category_ids.get(category, ()) for category in categories))
+        
+        # Product names and descriptions, tolerating plurals
+        variants = set()
+        for word in terms:
+            if len(word) > 2:
+                variants.update((word, word + 's', word[:-1] if word.endswith('s') else word))
+        return frozenset().union(*(self._word_ids.get(word, ()) for word in variants))
+    
+    def _rank(self, ids: Collection[int], sort: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        """Pick the first `limit` products with distinct names, in catalog order unless sorted."""
+        catalog = self._catalog
+        if sort == PRICE_ASC:
+            key = lambda i: (catalog[i]['price'], i)
+        elif sort == PRICE_DESC:
+            key = lambda i: (-catalog[i]['price'], i)
+        elif sort == RATING_DESC:
+            key = lambda i: (-catalog[i].get('rating', 0), i)
+        else:
+            key = None
+        
+        def unique(ordered: Iterable[int]) -> List[Dict[str, Any]]:
+            seen = set()
+            results = []
+            for i in ordered:
+                if catalog[i]['name'] not in seen:
+                    seen.add(catalog[i]['name'])
+                    results.append(catalog[i])
+                    if len(results) >= limit:
+                        break
+            return results
+        
+        results = unique(heapq.nsmallest(limit, ids, key=key))
+        if len(results) < limit < len(ids):
+            # Duplicate names were dropped from the top; rank everything
+            results = unique(sorted(ids, key=key))
+        return results
+    
+    def execute_query(self, query: ProductQuery, limit: int = 10) -> List[Dict[str, Any]]:
+        """Run a structured query: match its terms, apply its filters and order the results.
+        
+        Term matches and sources are precomputed id sets, intersected smallest
+        first; price and rating bounds are bisected on the sorted arrays, and a
+        bound's range is only walked when it is the most selective constraint.
+        """
+        matched = self._match_terms(query.terms) if query.terms else None
+        id_sets = []
+        if matched:
+            id_sets.append(matched)
+        if query.sources:
+            id_sets.append(frozenset().union(*(self._source_ids.get(source.lower(), ()) for source in query.sources)))
+        id_sets.sort(key=len)
+        
+        ranges = []
+        min_price = query.min_price if query.min_price is not None else float('-inf')
+        max_price = query.max_price if query.max_price is not None else float('inf')
+        min_rating = query.min_rating if query.min_rating is not None else float('-inf')
+        if query.min_price is not None or query.max_price is not None:
+            low = bisect.bisect_left(self._prices, min_price)
+            ranges.append(self._price_order[low:bisect.bisect_right(self._prices, max_price)])
+        if query.min_rating is not None:
+            ranges.append(self._rating_order[bisect.bisect_left(self._ratings, min_rating):])
+        
+        if not id_sets and not ranges:
+            if query.sort:
+                # "The cheapest", "best rated": rank the whole catalog
+                return self._rank(range(len(self._catalog)), query.sort, limit)
+            # If no matches, return random recommendations
+            return self._rank(random.sample(range(len(self._catalog)), min(5, len(self._catalog))), query.sort, limit)
+        
+        shortest_range = min(ranges, key=len) if ranges else None
+        if not id_sets:
+            candidates = shortest_range
+        elif shortest_range is not None and len(shortest_range) < len(id_sets[0]):
+            # Probe the sets with the range's ids rather than walking the sets
+            candidates = id_sets[0].intersection(shortest_range, *id_sets[1:])
+        else:
+            candidates = id_sets[0].intersection(*id_sets[1:])
+        if ranges:
+            price_of, rating_of = self._price_of, self._rating_of
+            candidates = [i for i in candidates
+                          if min_price <= price_of[i] <= max_price and rating_of[i] >= min_rating]
+        
+        if query.terms and not matched and not query.sort:
+            # Unmatched terms: random recommendations that still meet the constraints
+            candidates = random.sample(sorted(candidates), min(5, len(candidates)))
+        return self._rank(candidates, query.sort, limit)
+    
+    def search_products(self, query: str) -> List[Dict[str, Any]]:
+        """Search for products based on query, honoring price, rating, source and sort constraints in it."""
+        if not query or not query.strip():
+            return []
+        return self.execute_query(self.parse_query(query))
     
     def get_product_recommendations(self, category: str) -> List[Dict[str, Any]]:
         """Get product recommendations for a category."""
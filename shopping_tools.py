@@ -0,0 +1,200 @@
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import SHOPPING_TOOL_WORKERS
+from database import NuvexaDB
+from query_understanding import PRICE_ASC, PRICE_DESC, RATING_DESC, ProductQuery
+from shopping import ShoppingEngine
+from speculative import speculate
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Extra system prompt for shopping turns that can call tools
+TOOLS_SYSTEM_PROMPT = (
+    "You can search the product catalog and manage the user's cart with the provided tools. "
+    "Only recommend products returned by search_products, quoting their exact names, prices, "
+    "ratings and sources. Add items to the cart only when the user asks to buy or add them. "
+    "Call independent tools together in one turn."
+)
+
+SORT_CHOICES = {'cheapest': PRICE_ASC, 'most_expensive': PRICE_DESC, 'best_rated': RATING_DESC}
+
+TOOL_DEFINITIONS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_products",
+            "description": "Search the product catalog. Price, rating and source constraints in the query text are also understood.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "What to search for, e.g. 'wireless headphones'"},
+                    "min_price": {"type": "number", "description": "Lowest price in USD"},
+                    "max_price": {"type": "number", "description": "Highest price in USD"},
+                    "min_rating": {"type": "number", "description": "Lowest rating, from 0 to 5"},
+                    "source": {"type": "string", "description": "Retailer, e.g. 'Amazon'"},
+                    "sort": {"type": "string", "enum": list(SORT_CHOICES)},
+                    "limit": {"type": "integer", "description": "Most results to return (default 5)"}
+                },
+                "required": ["query"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "add_to_cart",
+            "description": "Add a product from search results to the user's cart.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "product_name": {"type": "string", "description": "Exact product name from search results"},
+                    "quantity": {"type": "integer", "description": "How many to add (default 1)"}
+                },
+                "required": ["product_name"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_cart",
+            "description": "Get the items in the user's cart and its total.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    }
+]
+
+# Tools without side effects; others change the cart and run in the order they were called
+READ_ONLY_TOOLS = frozenset({'search_products'})
+
+# Shared by every assistant in the process
+tool_executor = ThreadPoolExecutor(max_workers=SHOPPING_TOOL_WORKERS, thread_name_prefix='nuvexa-shopping-tools')
+
+def _product_summary(product: Dict[str, Any]) -> Dict[str, Any]:
+    """The product fields the model needs to describe a product."""
+    return {
+        "name": product['name'],
+        "price": product['price'],
+        "rating": product.get('rating'),
+        "source": product.get('source'),
+        "description": product.get('description', '')
+    }
+
+class ShoppingTools:
+    """Shopping tools for one user's turn, backed by the product catalog and the user's cart."""
+    
+    def __init__(self, shopping_engine: ShoppingEngine, db: NuvexaDB, user_id: int):
+        """Initialize the tools for a user."""
+        self.shopping_engine = shopping_engine
+        self.db = db
+        self.user_id = user_id
+        # Products returned by this turn's searches, for display next to the answer
+        self.search_results: List[Dict[str, Any]] = []
+        self.cart_changed = False
+        self._lock = threading.Lock()
+        # Searches started before the model asked for them: query -> (limit, future)
+        self._prefetched: Dict[ProductQuery, Tuple[int, Future]] = {}
+        self._handlers: Dict[str, Callable[..., Dict[str, Any]]] = {
+            'search_products': self.search_products,
+            'add_to_cart': self.add_to_cart,
+            'get_cart': self.get_cart
+        }
+    
+    def prefetch(self, query: str, limit: int = 10) -> Future:
+        """Start a search ahead of the model; a search_products call for the same query reuses it."""
+        product_query = self.shopping_engine.parse_query(query)
+        future = speculate(self.shopping_engine.execute_query, product_query, limit)
+        with self._lock:
+            self._prefetched[product_query] = (limit, future)
+        return future
+    
+    def search_products(self, query: str, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                        min_rating: Optional[float] = None, source: Optional[str] = None,
+                        sort: Optional[str] = None, limit: int = 5) -> Dict[str, Any]:
+        """Search the catalog; explicit arguments override constraints parsed from the query."""
+        product_query = self.shopping_engine.parse_query(query)
+        overrides = {
+            'min_price': min_price, 'max_price': max_price, 'min_rating': min_rating,
+            'sources': (source.lower(),) if source else None, 'sort': SORT_CHOICES.get(sort)
+        }
+        product_query = product_query._replace(**{field: value for field, value in overrides.items() if value is not None})
+        limit = max(1, min(int(limit), 10))
+        with self._lock:
+            prefetched = self._prefetched.get(product_query)
+        if prefetched and limit <= prefetched[0]:
+            products = prefetched[1].result()[:limit]
+        else:
+            products = self.shopping_engine.execute_query(product_query, limit)
+        
+        with self._lock:
+            shown = {product['name'] for product in self.search_results}
+            self.search_results.extend(product for product in products if product['name'] not in shown)
+        return {"query": query, "results": [_product_summary(product) for product in products]}
+    
+    def add_to_cart(self, product_name: str, quantity: int = 1) -> Dict[str, Any]:
+        """Add a catalog product to the user's cart."""
+        product = self.shopping_engine.get_product(product_name)
+        if not product:
+            return {"error": f"No product named {product_name!r}. Search first and use an exact product name."}
+        
+        cart_id = self.db.add_to_cart(
+            self.user_id, product['name'], product['price'],
+            product.get('image', ''), product.get('description', ''), int(quantity)
+        )
+        if cart_id is None:
+            return {"error": f"Could not add {product['name']} to the cart."}
+        self.cart_changed = True
+        return {"added": product['name'], "quantity": int(quantity), "price": product['price']}
+    
+    def get_cart(self) -> Dict[str, Any]:
+        """Get the user's cart items and total."""
+        cart = self.db.get_cart_summary(self.user_id)
+        return {
+            "items": [{"name": item[1], "price": item[2], "quantity": item[5]} for item in cart['items']],
+            "total": round(cart['total'], 2)
+        }
+    
+    def call(self, name: str, arguments: str) -> Dict[str, Any]:
+        """Run one tool call; failures are returned to the model as an error."""
+        handler = self._handlers.get(name)
+        if not handler:
+            return {"error": f"Unknown tool: {name}"}
+        try:
+            kwargs = json.loads(arguments) if arguments else {}
+            if not isinstance(kwargs, dict):
+                raise ValueError("Arguments must be a JSON object")
+            return handler(**kwargs)
+        except Exception as e:
+            logger.error(f"Tool {name} failed: {str(e)}")
+            return {"error": f"{name} failed: {str(e)}"}
+    
+    def run(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Run a round of tool calls and return their tool messages in call order.
+        
+        Searches run concurrently with each other and with the cart calls,
+        which run one after another in the order the model made them.
+        """
+        def run_one(tool_call: Dict[str, Any]) -> Dict[str, Any]:
+            return self.call(tool_call['function']['name'], tool_call['function'].get('arguments', ''))
+        
+        searches = [call for call in tool_calls if call['function']['name'] in READ_ONLY_TOOLS]
+        cart_calls = [call for call in tool_calls if call['function']['name'] not in READ_ONLY_TOOLS]
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        if len(tool_calls) == 1:
+            results[tool_calls[0]['id']] = run_one(tool_calls[0])
+        else:
+            futures = {call['id']: tool_executor.submit(run_one, call) for call in searches}
+            for call in cart_calls:
+                results[call['id']] = run_one(call)
+            for call_id, future in futures.items():
+                results[call_id] = future.result()
+        
+        return [
+            {"role": "tool", "tool_call_id": call['id'], "content": json.dumps(results[call['id']], ensure_ascii=False)}
+            for call in tool_calls
+        ]
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """One in-flight upstream call that other callers can wait on."""
+    
+    def __init__(self):
+        """Initialize an unfinished call."""
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+    
+    def wait(self) -> Any:
+        """Block until the leader finishes, then return its result or raise its error."""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class SingleFlight:
+    """Coalesces concurrent identical requests into one upstream call (thread version)."""
+    
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def begin(self, key: str) -> Tuple[bool, _Call]:
+        """Join the call in flight for `key`, or start one. Returns (is_leader, call)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return False, call
+            call = _Call()
+            self._calls[key] = call
+            self.leaders += 1
+            return True, call
+    
+    def finish(self, key: str, call: _Call, result: Any = None, error: Optional[BaseException] = None):
+        """Publish the leader's result or error to every waiter."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.result = result
+        call.error = error
+        call.done.set()
+    
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run `fn` once for all concurrent callers with the same key."""
+        is_leader, call = self.begin(key)
+        if not is_leader:
+            return call.wait()
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, call, error=e)
+            raise
+        self.finish(key, call, result=result)
+        return result
+    
+    def stats(self) -> Dict[str, int]:
+        """Get leader and coalesced call counts."""
+        with self._lock:
+            return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+class AsyncSingleFlight:
+    """Coalesces concurrent identical requests into one upstream call (asyncio version)."""
+    
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+    
+    def begin(self, key: str) -> Tuple[bool, asyncio.Future]:
+        """Join the call in flight for `key`, or start one. Returns (is_leader, future)."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return False, future
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        return True, future
+    
+    def finish(self, key: str, future: asyncio.Future, result: Any = None, error: Optional[BaseException] = None):
+        """Publish the leader's result or error to every waiter."""
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if future.done():
+            return
+        if isinstance(error, asyncio.CancelledError):
+            future.cancel()
+        elif error is not None:
+            future.set_exception(error)
+            # The leader raises the error itself; don't warn if nobody else waited
+            future.exception()
+        else:
+            future.set_result(result)
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `fn` once for all concurrent callers with the same key."""
+        is_leader, future = self.begin(key)
+        if not is_leader:
+            # Shield so a cancelled waiter doesn't cancel the shared call
+            return await asyncio.shield(future)
+        try:
+            result = await fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result=result)
+        return result
+    
+    def stats(self) -> Dict[str, int]:
+        """Get leader and coalesced call counts."""
+        return {'leaders': self.leaders, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+# Shared by every assistant in the process
+single_flight = SingleFlight()
@@ -0,0 +1,78 @@
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator
+from config import SPECULATIVE_WORKERS
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Shared by every session in the process: lookups started ahead of the LLM answer
+speculative_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_WORKERS, thread_name_prefix="nuvexa-speculative")
+
+def speculate(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Start a lookup on the speculative worker pool."""
+    return speculative_executor.submit(fn, *args, **kwargs)
+
+class _StreamFailure:
+    """An exception raised by the stream, carried across the queue."""
+    
+    def __init__(self, error: BaseException):
+        """Wrap the error."""
+        self.error = error
+
+_STREAM_END = object()
+
+def interleave(stream: Iterator[str], pending: Dict[Future, Callable[[Any], None]],
+               poll_interval: float = 0.05) -> Iterator[str]:
+    """Yield a text stream while running callbacks for futures as soon as they finish.
+    
+    The stream is consumed on a worker thread so a slow first token doesn't
+    hold back the callbacks, which run on the calling thread (where UI calls
+    are allowed), between chunks or while waiting for the next one. Futures
+    still running when the stream ends are waited for.
+    """
+    chunks: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    
+    def pump():
+        try:
+            for chunk in stream:
+                if stop.is_set():
+                    break
+                chunks.put(chunk)
+        except BaseException as e:
+            chunks.put(_StreamFailure(e))
+        finally:
+            if hasattr(stream, 'close'):
+                stream.close()
+            chunks.put(_STREAM_END)
+    
+    def run_ready(block: bool = False):
+        for future in list(pending):
+            if block or future.done():
+                callback = pending.pop(future)
+                try:
+                    callback(future.result())
+                except Exception as e:
+                    logger.error(f"Speculative lookup failed: {str(e)}")
+    
+    pending = dict(pending)
+    threading.Thread(target=pump, name="nuvexa-stream-pump", daemon=True).start()
+    try:
+        while True:
+            run_ready()
+            try:
+                item = chunks.get(timeout=poll_interval if pending else None)
+            except queue.Empty:
+                continue
+            if item is _STREAM_END:
+                break
+            if isinstance(item, _StreamFailure):
+                raise item.error
+            yield item
+        run_ready(block=True)
+    finally:
+        # Lets the pump stop early if the consumer went away
+        stop.set()
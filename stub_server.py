@@ -0,0 +1,370 @@
+"""Local OpenAI-compatible stub server for offline load tests and benchmarks.
+
+Speaks POST /v1/chat/completions (plain and SSE streaming) and GET /v1/models,
+with configurable latency, token rate, 429/500 injection and RPM/TPM limits
+reported in x-ratelimit-* headers. GET /stats returns request counters.
+
+Usage:
+    python stub_server.py --port 8765 --ttft lognormal:0.4:0.5 --tokens-per-second 60 --error-429 0.05
+    NUVEXA_LLM_BACKEND=stub streamlit run app.py
+
+Latency and length distributions are written as "fixed:V", "uniform:LO:HI",
+"normal:MEAN:STDDEV", "lognormal:MEDIAN:SIGMA" or "exp:MEAN".
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS = ["gpt-4o", "gpt-4o-mini", "gpt-4", "gpt-3.5-turbo"]
+WORDS = (
+    "the a product price quality great option budget feature plan step build design "
+    "feel support idea order cart search review compare choose fast simple useful "
+    "project code module test data user value good best next time help"
+).split()
+
+Distribution = Callable[[random.Random], float]
+
+def parse_distribution(spec: str) -> Distribution:
+    """Parse a distribution spec such as 'uniform:0.1:0.5' into a sampler of non-negative values."""
+    kind, _, params = spec.partition(':')
+    try:
+        values = [float(v) for v in params.split(':')] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid distribution parameters: {spec}")
+    samplers = {
+        'fixed': (1, lambda rng: values[0]),
+        'uniform': (2, lambda rng: rng.uniform(values[0], values[1])),
+        'normal': (2, lambda rng: rng.gauss(values[0], values[1])),
+        'lognormal': (2, lambda rng: values[0] * math.exp(rng.gauss(0, values[1]))),
+        'exp': (1, lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0)
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Invalid distribution: {spec}")
+    sampler = samplers[kind][1]
+    return lambda rng: max(0.0, sampler(rng))
+
+def _estimate_prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Rough prompt token count, the same heuristic as history.estimate_tokens."""
+    return sum(len(str(message.get('content') or '')) // 4 + 4 for message in messages)
+
+def _format_duration(seconds: float) -> str:
+    """Format seconds the way OpenAI reset headers do, e.g. '1.5s' or '20ms'."""
+    return f"{int(seconds * 1000)}ms" if seconds < 1 else f"{seconds:.3f}s"
+
+class StubSettings:
+    """Behaviour of the stub server."""
+    
+    def __init__(self, ttft: str = "fixed:0.3", tokens_per_second: float = 50.0,
+                 output_tokens: str = "uniform:40:200", error_429_rate: float = 0.0,
+                 error_500_rate: float = 0.0, rpm: int = 0, tpm: int = 0,
+                 models: Optional[List[str]] = None, unavailable_models: Optional[List[str]] = None,
+                 seed: Optional[int] = None):
+        """Initialize settings; rpm/tpm of 0 disable the simulated rate limits."""
+        self.ttft = parse_distribution(ttft)
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = parse_distribution(output_tokens)
+        self.error_429_rate = error_429_rate
+        self.error_500_rate = error_500_rate
+        self.rpm = rpm
+        self.tpm = tpm
+        self.models = models or list(DEFAULT_MODELS)
+        self.unavailable_models = set(unavailable_models or [])
+        self.seed = seed
+
+class _StubState:
+    """Shared random source, rate limit window and counters of a stub server."""
+    
+    def __init__(self, settings: StubSettings):
+        """Initialize an empty state."""
+        self.settings = settings
+        self.rng = random.Random(settings.seed)
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.window_requests = 0
+        self.window_tokens = 0
+        self.stats = {'requests': 0, 'streamed': 0, 'errors_429': 0, 'errors_500': 0,
+                      'errors_404': 0, 'completion_tokens': 0, 'in_flight': 0}
+    
+    def sample(self, distribution: Distribution) -> float:
+        """Draw from a distribution under the lock."""
+        with self.lock:
+            return distribution(self.rng)
+    
+    def admit(self, model: str, tokens: int) -> Tuple[int, Dict[str, str], str]:
+        """Decide a request's fate: (status, rate limit headers, error message)."""
+        settings = self.settings
+        with self.lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start = now
+                self.window_requests = 0
+                self.window_tokens = 0
+            reset = 60 - (now - self.window_start)
+            headers = {}
+            if settings.rpm:
+                headers['x-ratelimit-limit-requests'] = str(settings.rpm)
+                headers['x-ratelimit-remaining-requests'] = str(max(0, settings.rpm - self.window_requests - 1))
+                headers['x-ratelimit-reset-requests'] = _format_duration(reset)
+            if settings.tpm:
+                headers['x-ratelimit-limit-tokens'] = str(settings.tpm)
+                headers['x-ratelimit-remaining-tokens'] = str(max(0, settings.tpm - self.window_tokens - tokens))
+                headers['x-ratelimit-reset-tokens'] = _format_duration(reset)
+            
+            if model in settings.unavailable_models or model not in settings.models:
+                self.stats['errors_404'] += 1
+                return 404, headers, f"The model `{model}` does not exist or you do not have access to it."
+            over_limit = ((settings.rpm and self.window_requests + 1 > settings.rpm)
+                          or (settings.tpm and self.window_tokens + tokens > settings.tpm))
+            if over_limit or self.rng.random() < settings.error_429_rate:
+                self.stats['errors_429'] += 1
+                headers['retry-after-ms'] = str(int((reset if over_limit else 0.2) * 1000))
+                return 429, headers, f"Rate limit reached for {model} on requests per min. Please try again later."
+            if self.rng.random() < settings.error_500_rate:
+                self.stats['errors_500'] += 1
+                return 500, headers, "The server had an error while processing your request. Sorry about that!"
+            self.window_requests += 1
+            self.window_tokens += tokens
+            return 200, headers, ""
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy the counters."""
+        with self.lock:
+            return dict(self.stats)
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Request handler implementing the OpenAI chat completions subset."""
+    
+    protocol_version = 'HTTP/1.1'
+    server: 'StubServer'
+    
+    def log_message(self, format: str, *args: Any):
+        """Keep per-request access logs out of benchmark output."""
+        logger.debug(format % args)
+    
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        """Send a JSON response."""
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error(self, status: int, message: str, headers: Dict[str, str]):
+        """Send an error in the OpenAI error format."""
+        error_types = {
+            404: ('invalid_request_error', 'model_not_found'),
+            429: ('requests', 'rate_limit_exceeded'),
+            500: ('server_error', None)
+        }
+        error_type, code = error_types.get(status, ('invalid_request_error', None))
+        self._send_json(status, {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}, headers)
+    
+    def do_GET(self):
+        """Serve the model list and stats."""
+        if self.path.rstrip('/') == '/v1/models':
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': model, 'object': 'model', 'created': 0, 'owned_by': 'nuvexa-stub'}
+                for model in self.server.state.settings.models
+            ]})
+        elif self.path.rstrip('/') == '/stats':
+            self._send_json(200, self.server.state.snapshot())
+        else:
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+    
+    def do_POST(self):
+        """Serve chat completions."""
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_error(400, "Invalid JSON body", {})
+            return
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_error(400, f"Unsupported path {self.path}", {})
+            return
+        
+        state = self.server.state
+        settings = state.settings
+        model = request.get('model', '')
+        messages = request.get('messages') or []
+        prompt_tokens = _estimate_prompt_tokens(messages)
+        completion_tokens = max(1, int(state.sample(settings.output_tokens)))
+        if request.get('max_tokens'):
+            completion_tokens = min(completion_tokens, int(request['max_tokens']))
+        
+        status, headers, message = state.admit(model, prompt_tokens + completion_tokens)
+        if status != 200:
+            self._send_error(status, message, headers)
+            return
+        
+        with state.lock:
+            state.stats['in_flight'] += 1
+        try:
+            words = self._generate_words(messages, completion_tokens)
+            ttft = state.sample(settings.ttft)
+            if request.get('stream'):
+                self._stream(request, model, words, ttft, headers, prompt_tokens)
+            else:
+                time.sleep(ttft + completion_tokens / settings.tokens_per_second)
+                self._send_json(200, {
+                    'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': ''.join(words)},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens
+                    }
+                }, headers)
+            with state.lock:
+                state.stats['completion_tokens'] += completion_tokens
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("Client disconnected")
+        finally:
+            with state.lock:
+                state.stats['in_flight'] -= 1
+    
+    @staticmethod
+    def _generate_words(messages: List[Dict[str, Any]], count: int) -> List[str]:
+        """Generate filler text, the same for identical prompts so caches behave as with a real model."""
+        last = str(messages[-1].get('content') or '') if messages else ''
+        rng = random.Random(zlib.crc32(last.encode('utf-8')))
+        words = [rng.choice(WORDS) for _ in range(count)]
+        return [words[0].capitalize()] + [f" {word}" for word in words[1:]]
+    
+    def _write_chunk(self, data: bytes):
+        """Write one HTTP/1.1 chunk."""
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+    
+    def _stream(self, request: Dict[str, Any], model: str, words: List[str], ttft: float, headers: Dict[str, str],
+                prompt_tokens: int):
+        """Stream a completion as server-sent events at the configured token rate."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        with self.server.state.lock:
+            self.server.state.stats['streamed'] += 1
+        
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            chunk = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }
+            return f"data: {json.dumps(chunk)}\n\n".encode('utf-8')
+        
+        time.sleep(ttft)
+        self._write_chunk(event({'role': 'assistant', 'content': ''}))
+        start = time.monotonic()
+        interval = 1.0 / self.server.state.settings.tokens_per_second
+        for i, word in enumerate(words):
+            # Pace against the start time so sleep overhead doesn't accumulate
+            delay = start + i * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._write_chunk(event({'content': word}))
+        self._write_chunk(event({}, 'stop'))
+        if (request.get('stream_options') or {}).get('include_usage'):
+            usage = {
+                'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [], 'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': len(words),
+                    'total_tokens': prompt_tokens + len(words)
+                }
+            }
+            self._write_chunk(f"data: {json.dumps(usage)}\n\n".encode('utf-8'))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying the stub state."""
+    
+    daemon_threads = True
+    
+    def __init__(self, settings: StubSettings, host: str = '127.0.0.1', port: int = 8765):
+        """Bind the server; port 0 picks a free port."""
+        super().__init__((host, port), _StubHandler)
+        self.state = _StubState(settings)
+    
+    @property
+    def url(self) -> str:
+        """Base URL to use as the OpenAI client's base_url."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+    
+    def handle_error(self, request: Any, client_address: Any):
+        """Ignore clients dropping idle keep-alive connections."""
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+def start_stub_server(settings: Optional[StubSettings] = None, host: str = '127.0.0.1', port: int = 0) -> StubServer:
+    """Start a stub server on a daemon thread and return it; call shutdown() to stop."""
+    server = StubServer(settings or StubSettings(), host, port)
+    threading.Thread(target=server.serve_forever, name="nuvexa-stub-server", daemon=True).start()
+    logger.info(f"Stub LLM server listening on {server.url}")
+    return server
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ttft', default="fixed:0.3", help="Time to first token distribution (seconds)")
+    parser.add_argument('--tokens-per-second', type=float, default=50.0)
+    parser.add_argument('--output-tokens', default="uniform:40:200", help="Completion length distribution")
+    parser.add_argument('--error-429', type=float, default=0.0, help="Fraction of requests failing with 429")
+    parser.add_argument('--error-500', type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument('--rpm', type=int, default=0, help="Simulated requests per minute limit (0 = none)")
+    parser.add_argument('--tpm', type=int, default=0, help="Simulated tokens per minute limit (0 = none)")
+    parser.add_argument('--models', nargs='+', default=DEFAULT_MODELS)
+    parser.add_argument('--unavailable-models', nargs='*', default=[], help="Models answering 404 model_not_found")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    
+    settings = StubSettings(
+        ttft=args.ttft, tokens_per_second=args.tokens_per_second, output_tokens=args.output_tokens,
+        error_429_rate=args.error_429, error_500_rate=args.error_500, rpm=args.rpm, tpm=args.tpm,
+        models=args.models, unavailable_models=args.unavailable_models, seed=args.seed
+    )
+    server = StubServer(settings, args.host, args.port)
+    logger.info(f"Stub LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Set
+from config import MODES, SUMMARY_TRIGGER_TOKENS, SUMMARY_KEEP_RECENT_TOKENS, SUMMARY_MAX_FOLD_TOKENS
+from database import NuvexaDB
+from assistant import NuvexaAssistant, SUMMARY_ROLE
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def mode_uses_summary(mode: str) -> bool:
+    """Check if a mode keeps a rolling conversation summary."""
+    return MODES.get(mode, {}).get('summarize', False)
+
+def build_summarized_history(db: NuvexaDB, user_id: int, mode: str, token_budget: int) -> List[Tuple[str, str]]:
+    """Build history as the stored summary plus the newest un-summarized turns within budget."""
+    summary, summarized_through_id = db.get_conversation_summary(user_id, mode)
+    recent = db.get_conversation_window(user_id, mode, token_budget, after_id=summarized_through_id)
+    history = [(SUMMARY_ROLE, summary)] if summary else []
+    history.extend((role, content) for role, content, _ in recent)
+    return history
+
+class ConversationSummarizer:
+    """Folds older conversation turns into a stored summary on a background thread."""
+    
+    def __init__(self, db: NuvexaDB, assistant: NuvexaAssistant,
+                 trigger_tokens: int = SUMMARY_TRIGGER_TOKENS,
+                 keep_recent_tokens: int = SUMMARY_KEEP_RECENT_TOKENS,
+                 max_fold_tokens: int = SUMMARY_MAX_FOLD_TOKENS):
+        """Initialize the summarizer with its own database handler and assistant."""
+        self.db = db
+        self.assistant = assistant
+        self.trigger_tokens = trigger_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+        self.max_fold_tokens = max_fold_tokens
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nuvexa-summarizer")
+        self._pending: Set[Tuple[int, str]] = set()
+        self._lock = threading.Lock()
+    
+    def schedule(self, user_id: int, mode: str) -> bool:
+        """Queue a summary check for a conversation without blocking the caller."""
+        if not mode_uses_summary(mode):
+            return False
+        key = (user_id, mode)
+        with self._lock:
+            # One queued check per conversation is enough; it reads the latest tail
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+        self._executor.submit(self._run, user_id, mode)
+        return True
+    
+    def _run(self, user_id: int, mode: str):
+        """Run a summary check, clearing the pending flag afterwards."""
+        try:
+            self.summarize_if_needed(user_id, mode)
+        except Exception as e:
+            logger.error(f"Background summarization failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending.discard((user_id, mode))
+    
+    def summarize_if_needed(self, user_id: int, mode: str) -> bool:
+        """Fold the older part of the un-summarized tail into the summary if it crossed the trigger."""
+        summary, summarized_through_id = self.db.get_conversation_summary(user_id, mode)
+        tail = self.db.get_messages_after(user_id, mode, summarized_through_id)
+        if sum(tokens for _, _, _, tokens in tail) < self.trigger_tokens:
+            return False
+        
+        # Keep the newest turns verbatim; they are sent alongside the summary
+        kept = 0
+        split = len(tail)
+        while split > 0 and kept + tail[split - 1][3] <= self.keep_recent_tokens:
+            kept += tail[split - 1][3]
+            split -= 1
+        
+        # Fold oldest first and in bounded steps so a long backlog catches up incrementally
+        to_fold = []
+        folded = 0
+        for row in tail[:split]:
+            if to_fold and folded + row[3] > self.max_fold_tokens:
+                break
+            to_fold.append(row)
+            folded += row[3]
+        if not to_fold:
+            return False
+        
+        # A view of the shared assistant for this conversation, so the summary uses
+        # its mode's routing profile and its usage is accounted to its user
+        assistant = copy.copy(self.assistant)
+        assistant.current_mode = mode
+        assistant.user_id = user_id
+        new_summary = assistant.summarize_conversation(
+            summary, [(role, message) for _, role, message, _ in to_fold]
+        )
+        if not new_summary:
+            return False
+        saved = self.db.save_conversation_summary(user_id, mode, new_summary, to_fold[-1][0])
+        if saved:
+            logger.info(f"Summarized {len(to_fold)} messages for user {user_id} in {mode} mode")
+        return saved
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the background worker."""
+        self._executor.shutdown(wait=wait)
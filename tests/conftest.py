@@ -0,0 +1,30 @@
+"""Shared fixtures: the repository on sys.path, a stub LLM server, fresh model health and rate limits."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_health import model_health
+from rate_limiter import rate_limiter
+
+@pytest.fixture(autouse=True)
+def fresh_model_health():
+    """Start every test with closed circuit breakers and full rate limit budgets."""
+    model_health.reset()
+    rate_limiter.reset()
+    yield
+    model_health.reset()
+    rate_limiter.reset()
+
+@pytest.fixture
+def stub_server(request):
+    """Fast stub server; tests can pass StubSettings keyword arguments with indirect parametrization."""
+    from stub_server import StubSettings, start_stub_server
+    options = dict(ttft="fixed:0.001", tokens_per_second=100000.0, output_tokens="fixed:8", seed=1)
+    options.update(getattr(request, 'param', None) or {})
+    server = start_stub_server(StubSettings(**options))
+    yield server
+    server.shutdown()
+    server.server_close()
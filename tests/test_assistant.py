@@ -0,0 +1,65 @@
+"""NuvexaAssistant and AsyncNuvexaAssistant against the stub server and recorded sessions of it."""
+import asyncio
+import json
+
+import pytest
+
+from assistant import NuvexaAssistant
+from async_assistant import AsyncNuvexaAssistant, configure_concurrency
+from cassette import RecordingBackend, ReplayBackend
+from config import LLM_MAX_CONCURRENCY
+from llm_backend import StubBackend
+
+EMPTY_RESPONSE = "Error: Empty response from API. Please try again."
+
+@pytest.fixture
+def empty_replay(stub_server, tmp_path):
+    """Replay backend whose recorded answers to "Hello" were emptied, as a model can return them."""
+    path = str(tmp_path / 'empty.jsonl')
+    recorder = RecordingBackend(path, StubBackend(stub_server.url))
+    for hedging in (False, True):
+        assistant = NuvexaAssistant(backend=recorder)
+        assistant.hedging = hedging
+        assistant.chat("Hello")
+    asyncio.run(AsyncNuvexaAssistant(backend=recorder).chat("Hello"))
+    
+    with open(path, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            entry['content'] = None
+            if 'chunks' in entry:
+                entry['chunks'] = []
+            f.write(json.dumps(entry) + "\n")
+    return ReplayBackend(path, speed=0)
+
+@pytest.mark.parametrize('hedging', [False, True])
+def test_chat_reports_empty_completions(empty_replay, hedging):
+    assistant = NuvexaAssistant(backend=empty_replay)
+    assistant.hedging = hedging
+    assert assistant.chat("Hello") == EMPTY_RESPONSE
+
+def test_async_chat_reports_empty_completions(empty_replay):
+    assistant = AsyncNuvexaAssistant(backend=empty_replay)
+    assert asyncio.run(assistant.chat("Hello")) == EMPTY_RESPONSE
+
+@pytest.fixture
+def single_slot():
+    """Allow one in-flight LLM call, so concurrent chats wait on the semaphore."""
+    configure_concurrency(1)
+    yield
+    configure_concurrency(LLM_MAX_CONCURRENCY)
+
+def test_async_assistant_across_event_loops(stub_server, single_slot):
+    async def session(run: int):
+        assistant = AsyncNuvexaAssistant(backend=StubBackend(stub_server.url))
+        assistant.hedging = False
+        prompts = [f"Run {run} question {i}" for i in range(3)]
+        answers = await asyncio.gather(*(assistant.chat(prompt) for prompt in prompts))
+        answers.append("".join([delta async for delta in assistant.chat_stream(prompts[0])]))
+        return answers
+    
+    # Each asyncio.run is a new event loop
+    for run in range(3):
+        answers = asyncio.run(session(run))
+        assert not any(answer.startswith("Error:") for answer in answers)
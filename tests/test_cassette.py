@@ -0,0 +1,92 @@
+"""Recording a stub server session and replaying it gives the same answers."""
+import asyncio
+import json
+
+import pytest
+
+from assistant import NuvexaAssistant
+from async_assistant import AsyncNuvexaAssistant
+from cassette import RecordingBackend, ReplayBackend, ReplayedAPIError
+from llm_backend import StubBackend
+from model_health import OPEN, model_health
+
+PROMPTS = [f"Plan step {i} of my garden project" for i in range(6)]
+
+def run_session(backend) -> list:
+    """Chat through PROMPTS in assistant mode without hedging or caches."""
+    assistant = NuvexaAssistant(backend=backend)
+    assistant.hedging = False
+    return [assistant.chat(prompt) for prompt in PROMPTS]
+
+@pytest.mark.parametrize('stub_server', [{'unavailable_models': ['gpt-4o']}], indirect=True)
+def test_replay_with_model_not_found_fallback(stub_server, tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    recorded = run_session(RecordingBackend(path, StubBackend(stub_server.url)))
+    assert not any(answer.startswith("Error:") for answer in recorded)
+    # gpt-4o answered 404 until its breaker opened, then was skipped
+    assert model_health.snapshot()['gpt-4o']['state'] == OPEN
+    
+    model_health.reset()
+    replay = ReplayBackend(path, speed=0)
+    assert run_session(replay) == recorded
+    assert replay.player.misses == 0
+    assert model_health.snapshot()['gpt-4o']['state'] == OPEN
+
+@pytest.mark.parametrize('stub_server', [{'unavailable_models': ['gpt-4o']}], indirect=True)
+def test_errors_are_recorded_with_their_code(stub_server, tmp_path):
+    path = str(tmp_path / 'errors.jsonl')
+    run_session(RecordingBackend(path, StubBackend(stub_server.url)))
+    with open(path, encoding='utf-8') as f:
+        errors = [json.loads(line) for line in f if '"error"' in line]
+    assert errors and all((entry['status'], entry['code']) == (404, 'model_not_found') for entry in errors)
+
+@pytest.mark.parametrize('status, code, unavailable', [
+    (404, 'model_not_found', True),
+    (404, None, True),
+    (403, None, True),
+    (400, 'context_length_exceeded', False),
+    (429, 'rate_limit_exceeded', False),
+    (500, None, False)
+])
+def test_replayed_error_classification(status, code, unavailable):
+    error = ReplayedAPIError(status, "recorded error", {}, code)
+    assert NuvexaAssistant._is_model_unavailable(error) is unavailable
+
+@pytest.mark.parametrize('cassette', ['session.jsonl', 'session.jsonl.gz'])
+def test_streamed_session_round_trip(stub_server, tmp_path, cassette):
+    path = str(tmp_path / cassette)
+    
+    def stream_session(backend) -> list:
+        assistant = NuvexaAssistant(backend=backend)
+        answers = []
+        for mode, prompt in (('assistant', "Plan my week"), ('shopping', "Find me a lamp"), ('builder', "Build a shed")):
+            assistant.set_mode(mode)
+            answers.append(list(assistant.chat_stream(prompt)))
+        return answers
+    
+    recorded = stream_session(RecordingBackend(path, StubBackend(stub_server.url)))
+    assert all(len(deltas) > 1 for deltas in recorded)
+    replay = ReplayBackend(path, speed=0)
+    assert stream_session(replay) == recorded
+    assert (replay.player.hits, replay.player.misses) == (3, 0)
+
+def test_async_session_round_trip(stub_server, tmp_path):
+    path = str(tmp_path / 'async.jsonl')
+    
+    async def session(backend) -> list:
+        assistant = AsyncNuvexaAssistant(backend=backend)
+        answer = await assistant.chat("Plan my week")
+        deltas = [delta async for delta in assistant.chat_stream("Plan my month")]
+        return [answer, deltas]
+    
+    recorded = asyncio.run(session(RecordingBackend(path, StubBackend(stub_server.url))))
+    assert asyncio.run(session(ReplayBackend(path, speed=0))) == recorded
+
+def test_unrecorded_request_is_a_miss(stub_server, tmp_path):
+    path = str(tmp_path / 'session.jsonl')
+    run_session(RecordingBackend(path, StubBackend(stub_server.url)))
+    replay = ReplayBackend(path, speed=0)
+    assistant = NuvexaAssistant(backend=replay)
+    assistant.hedging = False
+    assert assistant.chat("Something never recorded").startswith("Error: No recorded response")
+    assert replay.player.misses == 1
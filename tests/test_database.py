@@ -0,0 +1,90 @@
+"""NuvexaDB cart storage on a fresh database file per test."""
+import sqlite3
+
+import pytest
+
+import database
+from database import NuvexaDB
+
+@pytest.fixture
+def db(tmp_path):
+    handler = NuvexaDB(str(tmp_path / 'nuvexa.db'), write_behind=False)
+    yield handler
+    handler.close()
+
+@pytest.mark.parametrize('returning', [True, False])
+def test_add_to_cart_merges_quantities(db, monkeypatch, returning):
+    # Without RETURNING (SQLite < 3.35) the id is looked up after the upsert
+    monkeypatch.setattr(database, '_HAS_RETURNING', returning)
+    user_id = db.get_or_create_user("Shopper")
+    first = db.add_to_cart(user_id, "Zico Natural Coconut Water", 16.99)
+    other = db.add_to_cart(user_id, "Apple AirPods Max", 549.00)
+    again = db.add_to_cart(user_id, "Zico Natural Coconut Water", 16.99, quantity=2)
+    assert first == again != other
+    assert sorted((item[1], item[5]) for item in db.get_cart_items(user_id)) == \
+        [("Apple AirPods Max", 1), ("Zico Natural Coconut Water", 3)]
+
+def test_add_to_cart_rejects_invalid_items(db):
+    user_id = db.get_or_create_user("Shopper")
+    assert db.add_to_cart(None, "Zico Natural Coconut Water", 16.99) is None
+    assert db.add_to_cart(user_id, "", 16.99) is None
+    assert db.add_to_cart(user_id, "Zico Natural Coconut Water", -1) is None
+    assert db.add_to_cart(user_id, "Zico Natural Coconut Water", 16.99, quantity=0) is None
+    assert db.get_cart_items(user_id) == []
+
+def test_add_to_cart_many_matches_add_to_cart(db):
+    user_id = db.get_or_create_user("Shopper")
+    items = [{'name': "Product 1", 'price': 10.0}, {'name': "Product 2", 'price': 5.0, 'quantity': 2},
+             {'name': "Product 1", 'price': 10.0, 'quantity': 3}, {'name': "", 'price': 1.0}]
+    assert db.add_to_cart_many(user_id, items, chunk_size=2) == 3
+    assert db.add_to_cart_many(None, items) == 0
+    assert sorted((item[1], item[5]) for item in db.get_cart_items(user_id)) == [("Product 1", 4), ("Product 2", 2)]
+
+def test_migration_merges_duplicate_cart_rows(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    # A cart table from before the unique key, holding one row per add
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE cart (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, product_name TEXT NOT NULL,
+            product_price REAL NOT NULL, product_image TEXT, product_description TEXT,
+            quantity INTEGER DEFAULT 1, added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX idx_cart_user ON cart(user_id)')
+    conn.executemany('INSERT INTO cart (user_id, product_name, product_price, quantity) VALUES (?, ?, ?, ?)', [
+        (1, "Product 1", 10.0, 1), (1, "Product 2", 5.0, 1), (1, "Product 1", 10.0, 2),
+        (2, "Product 1", 10.0, 1), (1, "Product 1", 10.0, 1)
+    ])
+    conn.commit()
+    conn.close()
+    
+    db = NuvexaDB(path, write_behind=False)
+    try:
+        assert sorted((item[0], item[1], item[5]) for item in db.get_cart_items(1)) == \
+            [(1, "Product 1", 4), (2, "Product 2", 1)]
+        assert [(item[1], item[5]) for item in db.get_cart_items(2)] == [("Product 1", 1)]
+        indexes = [row[1] for row in db.conn.execute('PRAGMA index_list(cart)')]
+        assert 'idx_cart_user_product' in indexes and 'idx_cart_user' not in indexes
+        # Adds now merge into the surviving row
+        assert db.add_to_cart(1, "Product 1", 10.0) == 1
+    finally:
+        db.close()
+
+def test_old_sqlite_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'MIN_SQLITE_VERSION', (99, 0, 0))
+    with pytest.raises(RuntimeError, match="needs SQLite 99.0.0"):
+        NuvexaDB(str(tmp_path / 'nuvexa.db'), write_behind=False)
+
+@pytest.mark.parametrize('window_functions', [True, False])
+def test_cart_summary(db, monkeypatch, window_functions):
+    # Without window functions (SQLite < 3.25) the totals are summed in Python
+    monkeypatch.setattr(database, '_HAS_WINDOW_FUNCTIONS', window_functions)
+    user_id = db.get_or_create_user("Shopper")
+    assert db.get_cart_summary(user_id) == {'items': [], 'item_count': 0, 'total': 0.0}
+    db.add_to_cart(user_id, "Product 1", 10.25, quantity=2)
+    db.add_to_cart(user_id, "Product 2", 5.5)
+    summary = db.get_cart_summary(user_id)
+    assert summary['items'] == [tuple(item) for item in db.get_cart_items(user_id)]
+    assert summary['item_count'] == 3
+    assert summary['total'] == pytest.approx(26.0)
@@ -0,0 +1,76 @@
+"""Token-budgeted conversation history, in memory and from the database."""
+import sqlite3
+
+import pytest
+
+from config import DEFAULT_HISTORY_TOKEN_BUDGET, MODES
+from database import NuvexaDB
+from history import MESSAGE_OVERHEAD_TOKENS, estimate_tokens, get_history_token_budget, select_history
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == MESSAGE_OVERHEAD_TOKENS
+    assert estimate_tokens("x" * 400) == 100 + MESSAGE_OVERHEAD_TOKENS
+    # Many short words count one token each
+    assert estimate_tokens("a b c d e f") == 6 + MESSAGE_OVERHEAD_TOKENS
+
+def test_history_token_budget():
+    assert get_history_token_budget('therapist') == MODES['therapist']['history_token_budget']
+    assert get_history_token_budget('unknown') == DEFAULT_HISTORY_TOKEN_BUDGET
+
+def test_select_history_keeps_the_newest_messages_that_fit():
+    messages = [("user", "first", 10), ("assistant", "second", 10), ("user", "third", 10), ("assistant", "fourth", 10)]
+    assert select_history(messages, 30) == [("assistant", "second"), ("user", "third"), ("assistant", "fourth")]
+    assert select_history(messages, 40) == [(role, content) for role, content, _ in messages]
+    assert select_history(messages, 9) == []
+    assert select_history([], 100) == []
+
+def test_select_history_stops_at_the_first_message_that_does_not_fit():
+    # A short older message doesn't skip over a long newer one
+    messages = [("user", "short", 5), ("assistant", "long", 50), ("user", "newest", 10)]
+    assert select_history(messages, 40) == [("user", "newest")]
+
+def test_select_history_estimates_missing_counts():
+    content = "x" * 80
+    messages = [("user", content, None), ("assistant", content, None)]
+    assert select_history(messages, estimate_tokens(content)) == [("assistant", content)]
+
+@pytest.fixture
+def db(tmp_path):
+    handler = NuvexaDB(str(tmp_path / 'nuvexa.db'), write_behind=False)
+    yield handler
+    handler.close()
+
+def test_conversation_window_fills_the_budget_across_pages(db):
+    user_id = db.get_or_create_user("Writer")
+    for i in range(12):
+        db.save_message(user_id, 'builder', f"message {i}", 'user' if i % 2 == 0 else 'assistant')
+    per_message = estimate_tokens("message 0")
+    window = db.get_conversation_window(user_id, 'builder', 5 * per_message, page_size=2)
+    assert [message for _, message, _ in window] == [f"message {i}" for i in range(7, 12)]
+    assert all(tokens == per_message for _, _, tokens in window)
+    assert db.get_conversation_window(user_id, 'therapist', 1000) == []
+
+def test_conversation_window_backfills_legacy_rows(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    # A conversations table from before token counts were stored
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, mode TEXT NOT NULL,
+            message TEXT NOT NULL, role TEXT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.executemany('INSERT INTO conversations (user_id, mode, message, role) VALUES (?, ?, ?, ?)',
+                     [(1, 'builder', "plan the shelves", 'user'), (1, 'builder', "use oak boards", 'assistant')])
+    conn.commit()
+    conn.close()
+    
+    db = NuvexaDB(path, write_behind=False)
+    try:
+        window = db.get_conversation_window(1, 'builder', 1000)
+        assert window == [('user', "plan the shelves", estimate_tokens("plan the shelves")),
+                          ('assistant', "use oak boards", estimate_tokens("use oak boards"))]
+        stored = db.conn.execute('SELECT token_count FROM conversations ORDER BY id').fetchall()
+        assert [row[0] for row in stored] == [tokens for _, _, tokens in window]
+    finally:
+        db.close()
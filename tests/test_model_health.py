@@ -0,0 +1,88 @@
+"""CircuitBreaker state transitions and ModelHealthRegistry fallback chains."""
+import httpx
+import openai
+import pytest
+
+from assistant import NuvexaAssistant
+from llm_backend import StubBackend
+from model_health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ModelHealthRegistry, model_health
+
+def test_breaker_opens_at_the_threshold():
+    breaker = CircuitBreaker(failure_threshold=3, cooldown_seconds=10)
+    for now in (1.0, 2.0):
+        breaker.record_failure(now)
+        assert breaker.state == CLOSED and breaker.allow_request(now)
+    breaker.record_failure(3.0)
+    assert breaker.state == OPEN
+    assert not breaker.allow_request(12.9)
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown_seconds=10)
+    breaker.record_failure(1.0)
+    breaker.record_success()
+    breaker.record_failure(2.0)
+    assert breaker.state == CLOSED and breaker.consecutive_failures == 1
+
+def test_half_open_allows_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=10)
+    breaker.record_failure(0.0)
+    assert breaker.allow_request(10.0)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request(10.1)
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow_request(10.2)
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=5, cooldown_seconds=10)
+    for now in range(5):
+        breaker.record_failure(float(now))
+    assert breaker.allow_request(15.0)
+    breaker.record_failure(15.0)
+    assert breaker.state == OPEN and breaker.opened_at == 15.0
+    assert not breaker.allow_request(24.0)
+
+def test_released_probe_lets_the_next_request_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown_seconds=10)
+    breaker.record_failure(0.0)
+    assert breaker.allow_request(10.0)
+    # The probe failed for a reason unrelated to the model
+    breaker.release_probe()
+    assert breaker.state == HALF_OPEN and breaker.allow_request(10.1)
+
+def test_registry_skips_open_models_but_never_refuses():
+    registry = ModelHealthRegistry(failure_threshold=1, cooldown_seconds=60)
+    registry.record_model_error('gpt-4o', Exception("404"))
+    assert list(registry.iter_models(['gpt-4o', 'gpt-4'])) == ['gpt-4']
+    registry.record_model_error('gpt-4', Exception("404"))
+    assert list(registry.iter_models(['gpt-4o', 'gpt-4'])) == ['gpt-4o']
+    registry.record_other_error('gpt-4o', Exception("timeout"))
+    assert registry.snapshot()['gpt-4o']['other_errors'] == 1
+
+def status_error(cls, status: int, code: str = None) -> Exception:
+    request = httpx.Request('POST', 'http://localhost/v1/chat/completions')
+    body = {'error': {'message': "error", 'code': code}}
+    return cls("error", response=httpx.Response(status, request=request), body=body['error'])
+
+@pytest.mark.parametrize('error, unavailable', [
+    (status_error(openai.NotFoundError, 404, 'model_not_found'), True),
+    (status_error(openai.PermissionDeniedError, 403), True),
+    (status_error(openai.BadRequestError, 400, 'context_length_exceeded'), False),
+    (status_error(openai.BadRequestError, 400, 'model_not_found'), False),
+    (status_error(openai.RateLimitError, 429, 'rate_limit_exceeded'), False),
+    (status_error(openai.InternalServerError, 500), False),
+    (Exception("model overloaded"), False)
+])
+def test_only_model_availability_errors_count(error, unavailable):
+    assert NuvexaAssistant._is_model_unavailable(error) is unavailable
+
+@pytest.mark.parametrize('stub_server', [{'unavailable_models': ['gpt-4o']}], indirect=True)
+def test_unavailable_model_opens_its_breaker(stub_server):
+    assistant = NuvexaAssistant(backend=StubBackend(stub_server.url))
+    assistant.hedging = False
+    for i in range(model_health.failure_threshold + 2):
+        assert not assistant.chat(f"Question {i}").startswith("Error:")
+    health = model_health.snapshot()
+    assert health['gpt-4o']['state'] == OPEN
+    assert health['gpt-4o']['model_errors'] == model_health.failure_threshold
+    assert health['gpt-4o']['skipped'] == 2
+    assert health['gpt-4']['successes'] == model_health.failure_threshold + 2
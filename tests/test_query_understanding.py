@@ -0,0 +1,34 @@
+"""analyze_query intent detection and product query extraction."""
+import pytest
+
+from query_understanding import analyze_query, compile_phrases
+
+@pytest.mark.parametrize('message, expected', [
+    ("I want to buy a laptop", (True, "laptop")),
+    ("I need to find an iPad for drawing", (True, "ipad for drawing")),
+    ("searching for: headphones.", (True, "headphones")),
+    ("please buy me   some\tcoconut water!", (True, "coconut water")),
+    # Stop words are dropped as whole tokens only
+    ("I want an apple", (True, "apple")),
+    ("Looking for a theater headset", (True, "theater headset")),
+    # The last trigger followed by more than filler wins
+    ("Get me the best tablet you can find", (True, "best tablet you can")),
+    # Intent words alone signal shopping but leave the message as the query
+    ("I'm shopping", (True, "I'm shopping")),
+    ("buy a", (True, "buy a")),
+    # Phrases match whole words only
+    ("This is unwanted", (False, "This is unwanted")),
+    ("rebuy", (False, "rebuy")),
+    ("Reorders are slow", (False, "Reorders are slow")),
+    ("What's the weather like today?", (False, "What's the weather like today?")),
+    ("", (False, ""))
+])
+def test_analyze_query(message, expected):
+    assert analyze_query(message) == expected
+
+def test_compile_phrases_matches_whole_words():
+    pattern = compile_phrases(["look for", "looking for", "buy"])
+    assert pattern.split("looking  for shoes") == ["", "looking  for", " shoes"]
+    assert pattern.search("buyer") is None
+    # Left edges are left to the caller
+    assert pattern.search("rebuy") is not None
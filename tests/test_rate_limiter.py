@@ -0,0 +1,109 @@
+"""TokenBucket budgeting and RateLimitScheduler retries."""
+from types import SimpleNamespace
+
+import pytest
+
+from cassette import ReplayedAPIError
+from llm_backend import StubBackend
+from rate_limiter import RateLimitQueueFull, RateLimitScheduler, TokenBucket, parse_reset_duration
+
+def test_token_bucket_goes_into_debt_and_refills():
+    bucket = TokenBucket(capacity=10, refill_per_second=2)
+    now = bucket.updated
+    assert bucket.reserve(8, now) == 0.0
+    # 2 left, so 5 more leave a debt of 3 tokens: 1.5 s at 2 tokens/s
+    assert bucket.reserve(5, now) == pytest.approx(1.5)
+    assert bucket.reserve(1, now + 2.0) == pytest.approx(0.0)
+    assert bucket.level == pytest.approx(0.0)
+
+def test_token_bucket_caps_reservations_and_refills_at_capacity():
+    bucket = TokenBucket(capacity=10, refill_per_second=1)
+    now = bucket.updated
+    # A request larger than the bucket only ever waits for a full bucket
+    assert bucket.reserve(50, now) == 0.0
+    assert bucket.reserve(10, now) == pytest.approx(10.0)
+    bucket.cancel(10)
+    bucket._refill(now + 1000)
+    assert bucket.level == 10
+
+def test_token_bucket_sync_adopts_server_budget():
+    bucket = TokenBucket(capacity=60, refill_per_second=1)
+    bucket.sync(limit=120, remaining=5, now=bucket.updated)
+    assert (bucket.capacity, bucket.refill_per_second, bucket.level) == (120, 2.0, 5)
+    bucket.sync(limit=None, remaining=50, now=bucket.updated)
+    # Remaining never raises the level above the local view
+    assert bucket.level == 5
+
+@pytest.mark.parametrize('value, seconds', [
+    ("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1h2m", 3720.0), ("2.5", 2.5), ("", None), ("soon", None)
+])
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == (pytest.approx(seconds) if seconds is not None else None)
+
+def api_error(status: int, message: str = "error", **headers) -> ReplayedAPIError:
+    return ReplayedAPIError(status, message, {name.replace('_', '-'): value for name, value in headers.items()})
+
+@pytest.mark.parametrize('error, retryable', [
+    (api_error(429, "Rate limit reached"), True),
+    (api_error(429, "You exceeded your current quota: insufficient_quota"), False),
+    (api_error(500), True),
+    (api_error(503), True),
+    (api_error(404), False),
+    (ValueError("no status"), False)
+])
+def test_is_retryable(error, retryable):
+    assert RateLimitScheduler.is_retryable(error) is retryable
+
+def test_retry_delay_backs_off_exponentially_with_jitter():
+    scheduler = RateLimitScheduler(backoff_base=0.5, backoff_max=4.0)
+    error = api_error(500)
+    for attempt, ceiling in enumerate((0.5, 1.0, 2.0, 4.0, 4.0)):
+        delays = [scheduler.retry_delay(error, attempt) for _ in range(200)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert max(delays) > ceiling / 2
+
+@pytest.mark.parametrize('headers, hinted', [
+    ({'retry_after_ms': '1500'}, 1.5),
+    ({'retry_after': '2'}, 2.0),
+    ({'x_ratelimit_reset_requests': '3s'}, 3.0),
+    ({'retry_after': '60'}, 4.0)
+])
+def test_retry_delay_honors_hints_up_to_the_maximum(headers, hinted):
+    scheduler = RateLimitScheduler(backoff_base=0.01, backoff_max=4.0)
+    assert scheduler.retry_delay(api_error(429, **headers), 0) == pytest.approx(hinted)
+
+def test_reserve_rejects_waits_over_the_queue_limit():
+    scheduler = RateLimitScheduler(rpm=60, tpm=1000, max_queue_delay=5.0)
+    assert scheduler.reserve('gpt-4o', 1000) == 0.0
+    with pytest.raises(RateLimitQueueFull):
+        scheduler.reserve('gpt-4o', 1000)
+    assert scheduler.stats['rejected'] == 1
+    # The rejected reservation was given back
+    assert scheduler.reserve('gpt-4o', 40) == pytest.approx(2.4, abs=0.1)
+
+def test_call_retries_until_success():
+    scheduler = RateLimitScheduler(max_retries=2, backoff_base=0.001)
+    errors = [api_error(429), api_error(502)]
+    
+    def send():
+        if errors:
+            raise errors.pop(0)
+        return SimpleNamespace(headers={'x-ratelimit-limit-requests': '120'}, parse=lambda: "ok")
+    
+    assert scheduler.call('gpt-4o', 10, send) == "ok"
+    assert scheduler.stats['retries'] == 2
+    assert scheduler.snapshot()['models']['gpt-4o']['rpm_limit'] == 120
+
+@pytest.mark.parametrize('stub_server', [{'error_429_rate': 0.5}], indirect=True)
+def test_call_retries_stub_server_429s(stub_server):
+    scheduler = RateLimitScheduler(max_retries=20, backoff_base=0.001, backoff_max=0.01)
+    client = StubBackend(stub_server.url).create_client(None)
+    
+    def send():
+        return client.chat.completions.with_raw_response.create(
+            model='gpt-4o-mini', messages=[{'role': 'user', 'content': "Hello"}], max_tokens=20
+        )
+    
+    for _ in range(5):
+        assert scheduler.call('gpt-4o-mini', 30, send).choices[0].message.content
+    assert scheduler.stats['retries'] > 0
@@ -0,0 +1,56 @@
+"""parse_product_query and ShoppingEngine.execute_query on the built-in catalog."""
+import pytest
+
+from query_understanding import PRICE_ASC, PRICE_DESC, RATING_DESC, ProductQuery, parse_product_query
+from shopping import ShoppingEngine
+
+@pytest.fixture(scope='module')
+def engine():
+    return ShoppingEngine()
+
+@pytest.mark.parametrize('text, expected', [
+    ("headphones under $300 from Amazon", ProductQuery(terms=('headphones',), max_price=300.0, sources=('amazon',))),
+    ("laptop between $1,000 and 1.5k", ProductQuery(terms=('laptop',), min_price=1000.0, max_price=1500.0)),
+    ("phone around 1000 dollars", ProductQuery(terms=('phone',), min_price=800.0, max_price=1200.0)),
+    ("tablet at least 4.5 stars", ProductQuery(terms=('tablet',), min_rating=4.5)),
+    ("cheapest coconut water", ProductQuery(terms=('coconut', 'water'), sort=PRICE_ASC)),
+    ("most expensive phone", ProductQuery(terms=('phone',), sort=PRICE_DESC)),
+    ("show me the best rated", ProductQuery(sort=RATING_DESC)),
+    ("", ProductQuery())
+])
+def test_parse_product_query(text, expected):
+    assert parse_product_query(text, ["Amazon", "Apple Store"]) == expected
+
+def test_filters_and_terms(engine):
+    results = engine.execute_query(ProductQuery(terms=('headphones',), max_price=400.0, sources=('amazon',)))
+    assert [product['name'] for product in results] == ['Sony WH-1000XM5 Wireless', 'Sennheiser Momentum 4']
+
+def test_sorted_terms(engine):
+    results = engine.execute_query(ProductQuery(terms=('laptop',), sort=PRICE_ASC))
+    prices = [product['price'] for product in results]
+    assert prices == sorted(prices) and len(prices) == 4
+
+@pytest.mark.parametrize('sort, key', [
+    (PRICE_ASC, lambda product: product['price']),
+    (PRICE_DESC, lambda product: -product['price']),
+    (RATING_DESC, lambda product: -product['rating'])
+])
+def test_sort_without_constraints_ranks_the_whole_catalog(engine, sort, key):
+    catalog = [product for products in engine.products.values() for product in products]
+    expected = sorted(catalog, key=key)[:3]
+    for _ in range(5):
+        assert [key(product) for product in engine.execute_query(ProductQuery(sort=sort), limit=3)] == \
+            [key(product) for product in expected]
+
+def test_sort_with_unmatched_terms_ranks_the_candidates(engine):
+    results = engine.execute_query(engine.parse_query("cheapest unicornium under $1000"), limit=3)
+    assert [product['price'] for product in results] == [12.49, 16.99, 18.99]
+
+def test_unmatched_terms_without_sort_recommend_within_constraints(engine):
+    results = engine.execute_query(ProductQuery(terms=('unicornium',), max_price=30.0))
+    assert 0 < len(results) <= 5 and all(product['price'] <= 30 for product in results)
+
+def test_search_products(engine):
+    assert engine.search_products("  ") == []
+    assert [product['name'] for product in engine.search_products("tablets")] == \
+        ['iPad Pro 12.9" M2', 'Samsung Galaxy Tab S9']
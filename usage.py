@@ -0,0 +1,251 @@
+"""Token usage and latency accounting for every LLM completion.
+
+Each completion attempt's tokens, time to first token, latency and outcome
+go into the usage table through a batched background writer, so recording
+never adds request latency.
+
+Report:
+    python usage.py --days 7
+"""
+import argparse
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from config import DB_NAME, USAGE_TRACKING_ENABLED, USAGE_BATCH_SIZE, USAGE_FLUSH_INTERVAL, USAGE_QUEUE_SIZE
+from database import NuvexaDB
+from history import estimate_tokens
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Outcomes of a completion attempt
+OK = 'ok'
+ERROR = 'error'
+CANCELLED = 'cancelled'
+
+def token_counts(usage: Any) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+    """Prompt, completion and cached prompt tokens from an API usage object; None if it's missing."""
+    if usage is None:
+        return None, None, None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return usage.prompt_tokens, usage.completion_tokens, getattr(details, 'cached_tokens', None) or 0
+
+class UsageRecorder:
+    """Queues usage rows and writes them in batches on a background thread."""
+    
+    def __init__(self, db_name: str = DB_NAME, enabled: bool = USAGE_TRACKING_ENABLED,
+                 batch_size: int = USAGE_BATCH_SIZE, flush_interval: float = USAGE_FLUSH_INTERVAL,
+                 max_queue: int = USAGE_QUEUE_SIZE):
+        """Initialize the recorder; the writer thread starts with the first row."""
+        self.db_name = db_name
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+    
+    def record(self, user_id: Optional[int], mode: str, model: str, prompt_tokens: Optional[int] = None,
+               completion_tokens: Optional[int] = None, cached_tokens: Optional[int] = None,
+               ttft: Optional[float] = None, latency: float = 0.0, outcome: str = OK):
+        """Queue one completion's usage without blocking; rows are dropped if the queue is full."""
+        if not self.enabled:
+            return
+        self._ensure_started()
+        row = (user_id, mode, model, prompt_tokens, completion_tokens, cached_tokens, ttft, latency, outcome, time.time())
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+    
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every row queued so far is written."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    
+    def _ensure_started(self):
+        """Start the writer thread once."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="nuvexa-usage-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+    
+    def _run(self):
+        """Collect rows for up to one flush interval or batch, then write them in one transaction."""
+        db = NuvexaDB(self.db_name)
+        while True:
+            batch = []
+            waiters = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    # A flush writes what's queued right away
+                    deadline = 0
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    remaining = deadline - time.monotonic()
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if batch:
+                if db.record_usage(batch):
+                    self.written += len(batch)
+                else:
+                    with self._lock:
+                        self.dropped += len(batch)
+            for waiter in waiters:
+                waiter.set()
+
+# Shared by every assistant in the process
+usage_recorder = UsageRecorder()
+
+class CompletionTracker:
+    """Timing and token counts of one completion attempt, recorded once when it ends."""
+    
+    def __init__(self, user_id: Optional[int], mode: str, model: str, estimated_prompt_tokens: int,
+                 recorder: Optional[UsageRecorder] = None):
+        """Start timing an attempt; the estimate stands in when the API reports no usage."""
+        self.user_id = user_id
+        self.mode = mode
+        self.model = model
+        self.estimated_prompt_tokens = estimated_prompt_tokens
+        self.recorder = recorder or usage_recorder
+        self.start = time.monotonic()
+        self.ttft: Optional[float] = None
+        self.usage: Any = None
+        self._streamed: List[str] = []
+        self._finished = False
+    
+    def observe(self, chunk: Any):
+        """Note a streamed chunk: the first output token time, text, and the final usage chunk."""
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        delta = chunk.choices[0].delta
+        if self.ttft is None and (delta.content or delta.tool_calls):
+            self.ttft = time.monotonic() - self.start
+        if delta.content:
+            self._streamed.append(delta.content)
+    
+    def finish(self, outcome: str, usage: Any = None):
+        """Record the attempt; later calls are ignored."""
+        if self._finished:
+            return
+        self._finished = True
+        prompt_tokens, completion_tokens, cached_tokens = token_counts(usage or self.usage)
+        if prompt_tokens is None and outcome != ERROR:
+            prompt_tokens = self.estimated_prompt_tokens
+            completion_tokens = estimate_tokens("".join(self._streamed)) if self._streamed else None
+        self.recorder.record(
+            self.user_id, self.mode, self.model, prompt_tokens, completion_tokens, cached_tokens,
+            self.ttft, time.monotonic() - self.start, outcome
+        )
+    
+    def track(self, stream: Iterable[Any]) -> Iterator[Any]:
+        """Pass a stream through, recording it when it ends, fails or is abandoned."""
+        outcome = CANCELLED
+        try:
+            for chunk in stream:
+                self.observe(chunk)
+                yield chunk
+            outcome = OK
+        except Exception:
+            outcome = ERROR
+            raise
+        finally:
+            self.finish(outcome)
+            if hasattr(stream, 'close'):
+                # Releases the connection of a stream abandoned part way
+                stream.close()
+    
+    def atrack(self, stream: Any) -> '_TrackedAsyncStream':
+        """Async counterpart of track()."""
+        return _TrackedAsyncStream(stream, self)
+
+class _TrackedAsyncStream:
+    """Async stream wrapper that feeds a CompletionTracker."""
+    
+    def __init__(self, stream: Any, tracker: CompletionTracker):
+        """Wrap an SDK async stream."""
+        self._stream = stream
+        self._tracker = tracker
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> Any:
+        try:
+            chunk = await self._stream.__anext__()
+        except StopAsyncIteration:
+            self._tracker.finish(OK)
+            raise
+        except Exception:
+            self._tracker.finish(ERROR)
+            raise
+        self._tracker.observe(chunk)
+        return chunk
+    
+    async def close(self):
+        """Record an unfinished stream as cancelled and close it."""
+        self._tracker.finish(CANCELLED)
+        if hasattr(self._stream, 'close'):
+            await self._stream.close()
+
+def _ms(seconds: Optional[float]) -> str:
+    """Format seconds as milliseconds for the report."""
+    return f"{seconds * 1000:8.0f}" if seconds is not None else f"{'-':>8}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Report LLM token usage and latency by mode, model and day.")
+    parser.add_argument('--days', type=int, default=7, help="How many days back to report")
+    parser.add_argument('--db', default=DB_NAME, help="Database file")
+    args = parser.parse_args()
+    
+    db = NuvexaDB(args.db)
+    since = time.time() - args.days * 86400
+    
+    print(f"Latency by mode and model, last {args.days} day(s) (ms)")
+    print(f"{'mode':<10} {'model':<16} {'calls':>6} {'errors':>6} {'p50':>8} {'p95':>8} "
+          f"{'ttft p50':>8} {'ttft p95':>8} {'tokens/call':>11}")
+    for row in db.get_usage_latency_stats(since):
+        print(f"{row['mode']:<10} {row['model']:<16} {row['requests']:>6} {row['errors']:>6} "
+              f"{_ms(row['latency_p50'])} {_ms(row['latency_p95'])} {_ms(row['ttft_p50'])} {_ms(row['ttft_p95'])} "
+              f"{row['avg_tokens'] or 0:>11.0f}")
+    
+    print()
+    print("Tokens per day and mode")
+    print(f"{'day':<10} {'mode':<10} {'calls':>6} {'prompt':>10} {'cached':>10} {'completion':>10}")
+    for day, mode, requests, prompt_tokens, cached_tokens, completion_tokens in db.get_daily_token_usage(since):
+        print(f"{day:<10} {mode:<10} {requests:>6} {prompt_tokens:>10} {cached_tokens:>10} {completion_tokens:>10}")
+    
+    print()
+    print("Tokens per user")
+    print(f"{'user':<8} {'calls':>6} {'prompt':>10} {'completion':>10}")
+    for user_id, requests, prompt_tokens, completion_tokens in db.get_user_token_usage(since):
+        print(f"{str(user_id if user_id is not None else '-'):<8} {requests:>6} {prompt_tokens:>10} {completion_tokens:>10}")
+    db.close()
+
+if __name__ == '__main__':
+    main()